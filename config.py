@@ -23,7 +23,11 @@ DATA_DIRS = {
     'records': 'investment_records', # 投资建议记录保存目录
     'debug': 'debug_logs',          # 调试日志保存目录
     'data': 'data',                  # 市场数据保存目录
-    'reports': 'reports'              # 报告保存目录
+    'reports': 'reports',             # 报告保存目录
+    'cache': 'cache',                 # 分析结果缓存目录
+    'telemetry': 'telemetry',         # AI调用遥测日志目录
+    'replays': 'replays',             # 历史回放（--replay）的建议记录目录
+    'streams': 'streams'              # 流式接收的原始回复和推理过程（不发布，advices目录会发布到文档站）
 }
 
 # 市场情绪指标配置
@@ -35,6 +39,18 @@ MARKET_SENTIMENT = {
     'btc_price_url': 'https://api.binance.com/api/v3/klines',
 }
 
+# 链上指标配置（CoinMetrics，一次请求获取全部资产和指标）
+ONCHAIN_METRICS = {
+    'assets': ['btc'],
+    # CoinMetrics指标名: 保存字段名
+    'metrics': {
+        'CapMVRVCur': 'mvrv',             # MVRV比率
+        'CapRealUSD': 'realized_cap',     # 已实现市值（美元）
+        'AdrActCnt': 'active_addresses',  # 活跃地址数
+        'NVTAdj': 'nvt',                  # NVT比率（调整后链上交易额）
+    }
+}
+
 # DeepSeek AI 配置
 DEEPSEEK_AI = {
     'api_url': os.getenv('DEEPSEEK_API_URL', 'https://api.deepseek.com/v1/chat/completions'),
@@ -43,5 +59,61 @@ DEEPSEEK_AI = {
     'temperature': 0,
     'max_tokens': 16000,
     'top_p': 1.0,
-    'stream': False
+    'stream': True,                  # 异步调用使用SSE流式接收（同步调用始终非流式）
+    'timeout': 600,                  # 单次请求超时（秒），推理模型思考时间较长
+    'stream_idle_timeout': 120,      # 流式接收时两次数据之间的最长间隔（秒）
+    'pool_size': 4,                  # 异步调用的连接池大小
+    'cache_ttl': 24 * 60 * 60,       # 回复缓存有效期（秒），相同请求在有效期内直接返回缓存
+    'cache_max_entries': 64,         # 回复缓存最多保留的条目数
+    'prompt_data_format': 'csv',     # 提示词中市场数据的格式: csv(紧凑，较早数据按周汇总) / json
+    'prompt_daily_days': 60,         # csv格式保留逐日数据的天数，更早的数据按周汇总
+    'prompt_months': 24,             # 提供给AI的历史数据月数（超出token预算时自动缩减）
+    'context_tokens': 65536,         # 模型上下文长度（提示词 + 输出）
+    'prompt_safety_margin': 0.1      # token估算误差的安全余量比例
+}
+
+# 对冲请求配置：超过历史首token延迟的分位数仍无响应时，再发出一个相同的请求，先返回者胜出
+LLM_HEDGE = {
+    'enabled': True,
+    'percentile': 90,                # 触发对冲的历史首token延迟分位数
+    'fallback_model': None,          # 对冲请求使用的模型，None表示与主请求相同
+    'max_hedge_rate': 0.1,           # 最近调用中允许对冲的最大比例
+    'min_samples': 5,                # 历史样本不足时使用default_delay
+    'default_delay': 180,            # 样本不足时的对冲等待时间（秒），None表示样本不足时不对冲
+    'history_size': 100              # 每个接口地址和模型保留的最近延迟样本数
+}
+
+# 历史回放配置（--replay）：按历史日期重新生成AI建议，用于比较提示词和模型版本
+# 每个版本（variant）可指定name、model、temperature，以及其他OpenAI兼容服务商的api_url和api_key_env
+AI_REPLAY = {
+    'max_concurrency': 3,            # 同时进行的请求数上限
+    'step_days': 7,                  # 回放日期的间隔天数
+    'variants': [
+        {'name': 'default'},
+    ]
+}
+
+# 运行时间预算（秒）：整个流程的截止时间，以及各阶段最多可用的时间片（不超过剩余的总时间）
+# AI建议未在时间片内完成时先推送规则建议，AI建议在总截止时间前返回则随后补充推送
+PIPELINE_DEADLINE = {
+    'total': 20 * 60,                # 整个流程，0表示不限时
+    'data_update': 4 * 60,           # 数据采集和重组，超时则使用本地已有数据
+    'ai_advice': 8 * 60              # AI建议
+}
+
+# 大模型价格（美元/百万token），用于遥测日志估算每次调用的费用，未列出的模型不计费用
+LLM_PRICING = {
+    'deepseek-chat': {'input_cache_hit': 0.028, 'input_cache_miss': 0.28, 'output': 0.42},
+    'deepseek-reasoner': {'input_cache_hit': 0.028, 'input_cache_miss': 0.28, 'output': 0.42},
+}
+
+# 多模型集成配置（--ensemble）
+# 成员可指定model、temperature，以及其他OpenAI兼容服务商的api_url和保存密钥的环境变量api_key_env
+AI_ENSEMBLE = {
+    'max_concurrency': 3,            # 同时进行的请求数上限
+    'members': [
+        {'name': 'reasoner', 'model': 'deepseek-reasoner'},
+        {'name': 'chat-t0', 'model': 'deepseek-chat', 'temperature': 0},
+        {'name': 'chat-t07', 'model': 'deepseek-chat', 'temperature': 0.7},
+    ]
 }
@@ -12,11 +12,17 @@ from webhook import send_message_async
 src_dir = os.path.join(os.path.dirname(__file__), 'src')
 sys.path.append(src_dir)
 
-from config import DATA_DIRS
+from config import DATA_DIRS, DEEPSEEK_AI, AI_ENSEMBLE, PIPELINE_DEADLINE
 from src.utils.historical_data import HistoricalDataCollector
 from src.utils.trend_analyzer import TrendAnalyzer
-from src.utils.data_reorganizer import reorganize_data
+from src.utils.backtester import AdviceBacktester
+from src.utils.param_sweep import ParameterSweep
+from src.utils.analysis_cache import AnalysisCache
+from src.utils.data_reorganizer import reorganize_data, load_daily_data
+from src.utils.deadline import Deadline
 from src.ai.advisor import DeepseekAdvisor
+from src.ai.telemetry import LLMTelemetry, summarize, format_summary
+from src.ai.replay import ReplayRunner, format_replay_summary
 
 # 配置日志
 logging.basicConfig(
@@ -32,6 +38,15 @@ logger = logging.getLogger(__name__)
 # 确保reports目录存在
 os.makedirs("reports", exist_ok=True)
 
+# 分析结果缓存：输入数据和分析参数未变化时直接复用上次的分析结果
+analysis_cache = AnalysisCache(cache_dir=os.path.join(DATA_DIRS['cache'], 'analysis'))
+
+def compute_rule_advice(collector, historical_data):
+    """基于TrendAnalyzer规则生成投资建议（附带完整日线K线，用于ATR/VWAP等指标；输入未变化时命中缓存，生成时间更新为本次运行时间）"""
+    analyzer = TrendAnalyzer(historical_data, ohlcv=collector.btc_collector.load_ohlcv("1d"))
+    advice = analysis_cache.get_or_compute(analyzer.fingerprint(), analyzer.generate_investment_advice)
+    return TrendAnalyzer.refresh_generated_at(advice) if advice.get("status") == "success" else advice
+
 async def generate_analysis_report(force_update=False):
     """生成分析报告，基于历史数据提供买入/卖出建议"""
     logger.info("开始生成分析报告...")
@@ -61,11 +76,8 @@ async def generate_analysis_report(force_update=False):
     
     logger.info(f"获取到的历史数据: BTC价格({btc_count}条), MVRV比率({mvrv_count}条), 恐惧贪婪指数({fg_count}条)")
     
-    # 初始化趋势分析器
-    analyzer = TrendAnalyzer(historical_data)
-    
     # 生成投资建议
-    advice = analyzer.generate_investment_advice()
+    advice = compute_rule_advice(collector, historical_data)
     
     if advice.get("status") == "error":
         logger.error(f"生成投资建议失败: {advice.get('message', '未知错误')}")
@@ -93,27 +105,60 @@ async def generate_analysis_report(force_update=False):
     
     return True, report_file
 
-async def get_ai_investment_advice(debug_only=False):
+async def push_rule_based_advice(waited):
+    """AI建议超时时先推送基于本地历史数据的规则建议
+    
+    Args:
+        waited: 已等待AI建议的时间（秒）
+    """
+    collector = HistoricalDataCollector(data_dir=DATA_DIRS['data'])
+    historical_data = collector.load_historical_data()
+    if not historical_data:
+        logger.error("没有本地历史数据，无法生成规则建议")
+        return False
+    
+    advice = compute_rule_advice(collector, historical_data)
+    if advice.get("status") == "error":
+        logger.error(f"生成规则建议失败: {advice.get('message', '未知错误')}")
+        return False
+    
+    overall = advice["overall"]
+    push_message = f"⏱️ AI投资建议未能在{waited:.0f}秒内生成，先推送规则建议（AI建议返回后补充推送）\n\n"
+    push_message += f"综合建议: {overall['action']}（置信度: {overall['confidence']}）\n{overall['reason']}"
+    await send_message_async(push_message)
+    
+    print(f"\nAI建议超时，已先推送规则建议: {overall['action']}（置信度: {overall['confidence']}）")
+    return True
+
+async def get_ai_investment_advice(debug_only=False, use_cache=True, ensemble=False, deadline=None, rows=None):
     """获取AI投资建议（使用DeepSeek R1模型）
     
     Args:
         debug_only: 仅生成提示词用于调试，不调用AI接口
+        use_cache: 是否使用AI回复缓存（相同请求直接返回上次的回复）
+        ensemble: 多模型集成模式，并发请求AI_ENSEMBLE中的全部成员并汇总
+        deadline: 整个流程的截止时间；AI建议最多使用PIPELINE_DEADLINE['ai_advice']秒，
+                  超出时先推送规则建议，AI建议在截止时间前返回则随后补充推送
+        rows: 数据重组步骤返回的按日期数据列表，为空时从daily_data.json加载
     """
     if debug_only:
         print("=== 调试模式: 仅生成提示词，不调用AI ===\n")
     else:
         print("=== AI投资顾问 (DeepSeek R1) ===\n")
     
-    data_file = "data/daily_data.json"
-    if not os.path.exists(data_file):
-        print("错误: 未找到整合后的数据文件，请先运行数据重组工具")
-        return
+    if not rows:
+        rows = load_daily_data(os.path.join(DATA_DIRS['data'], "daily_data.json"))
+        if not rows:
+            print("错误: 未找到整合后的数据文件，请先运行数据重组工具")
+            return
     
-    months = 6
-    print(f"将分析最近{months}个月的数据")
+    months = DEEPSEEK_AI['prompt_months']
+    print(f"将分析最近{months}个月的数据（超出token预算时自动缩减）")
     
     if debug_only:
-        from ai.prompt import get_investment_advice_template, prepare_investment_advice_params, save_prompt_for_debug
+        from ai.prompt import (get_investment_advice_template, prepare_investment_advice_params, save_prompt_for_debug,
+                               compare_encodings, get_investment_advice_system_prompt)
+        from ai.token_budget import TokenBudget
         from ai.deepseek import DeepseekAPI
         
         api = DeepseekAPI.__new__(DeepseekAPI)
@@ -132,15 +177,25 @@ async def get_ai_investment_advice(debug_only=False):
         
         advisor = DeepseekAdvisor.__new__(DeepseekAdvisor)
         advisor.advice_dir = DATA_DIRS['advices']
-        filtered_data = advisor._prepare_data_for_ai(data_file, months)
+        filtered_data = advisor._prepare_data_for_ai(rows, months)
         if not filtered_data:
             print("错误: 准备数据失败")
             return
         
-        data_json = json.dumps(filtered_data, ensure_ascii=False)
+        data_format = DEEPSEEK_AI['prompt_data_format']
         params = prepare_investment_advice_params(last_advice=last_advice)
-        prompt = get_investment_advice_template(**params, data_json=data_json)
+        analog_context = advisor._build_analog_context(filtered_data)
+        fitted = advisor._fit_market_data(filtered_data, data_format, analog_context)
+        if fitted["status"] != "success":
+            print(f"错误: {fitted['message']}")
+            return
+        data_json = fitted["data_text"]
+        encoding_stats = compare_encodings(filtered_data, data_format, DEEPSEEK_AI['prompt_daily_days'])
+        prompt = get_investment_advice_template(**params, data_json=data_json, analog_context=analog_context,
+                                                data_format=data_format)
         prompt_path = save_prompt_for_debug(prompt)
+        token_counts = TokenBudget().measure(prompt, {"市场数据": data_json, "历史相似行情": analog_context,
+                                                      "系统提示词": get_investment_advice_system_prompt(params['total_budget'])})
         
         mvrv_count = sum(1 for item in filtered_data if 'mvrv' in item)
         price_count = sum(1 for item in filtered_data if 'price' in item)
@@ -158,8 +213,17 @@ async def get_ai_investment_advice(debug_only=False):
         print(f"成本基础: {params['last_cost_basis']}")
         print(f"上次操作: {params['last_action']}")
         print(f"提示词字符数: {len(prompt)}")
+        print(f"提示词估算token数: {token_counts['合计']} / 预算{token_counts['预算']}（另预留输出{token_counts['预留输出']}）")
+        for name in ("系统提示词", "模板", "市场数据", "历史相似行情"):
+            print(f"  {name}: {token_counts[name]} tokens")
+        print(f"  （系统提示词为固定前缀，可命中服务端前缀缓存）")
+        print(f"市场数据格式: {data_format}（全部{len(filtered_data)}天编码需{encoding_stats['encoded_tokens']} tokens，"
+              f"JSON格式{encoding_stats['json_tokens']} tokens，节省{encoding_stats['saved_pct']:.0f}%）")
+        if fitted["trimmed"]:
+            print(f"⚠️  超出预算，市场数据已缩减为{fitted['start_date']}起的{fitted['rows']}天（逐日{fitted['daily_days']}天）")
         print(f"提示词包含MVRV说明: {'MVRV' in prompt}")
         print(f"提示词包含AHR999: {'ahr999' in prompt.lower()}")
+        print(f"提示词包含历史相似行情: {bool(analog_context)}")
         print(f"提示词文件: {prompt_path}")
         print(f"{'='*50}")
         
@@ -179,37 +243,55 @@ async def get_ai_investment_advice(debug_only=False):
     retry_delay = 2.0
     
     try:
-        try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            if isinstance(data, list):
-                print("注意: 正在准备数据格式以供AI处理...")
-                wrapped_data = {"responses": data}
-                temp_file = data_file + ".temp"
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(wrapped_data, f, ensure_ascii=False, indent=2)
-                data_file = temp_file
-                print("数据格式已调整，继续处理...")
-        except Exception as e:
-            logger.warning(f"读取数据文件时出错: {str(e)}")
-            print(f"警告: 读取数据文件时出错: {str(e)}，将继续尝试处理")
-        
         print("\n正在获取AI投资建议，请稍候...\n")
         print(f"已配置最大重试次数: {max_retries}，重试间隔: {retry_delay}秒")
         
-        advice = advisor.get_investment_advice(
-            data_file=data_file, 
-            months=months, 
-            max_retries=max_retries, 
-            retry_delay=retry_delay
-        )
+        async def push_tldr(tldr):
+            """流式接收时TL;DR完成后先行推送"""
+            await send_message_async(f"🤖 AI投资顾问摘要（完整建议生成中）\n\n{tldr}")
+        
+        # 异步调用，等待AI响应期间不阻塞事件循环
+        async def request_advice():
+            try:
+                if ensemble:
+                    print(f"集成模式: {', '.join(member['name'] for member in AI_ENSEMBLE['members'])}")
+                    return await advisor.get_ensemble_advice_async(
+                        data=rows,
+                        months=months,
+                        max_retries=max_retries,
+                        retry_delay=retry_delay
+                    )
+                return await advisor.get_investment_advice_async(
+                    data=rows, 
+                    months=months, 
+                    max_retries=max_retries, 
+                    retry_delay=retry_delay,
+                    use_cache=use_cache,
+                    on_tldr=push_tldr
+                )
+            finally:
+                await advisor.api.close()
+        
+        deadline = deadline or Deadline()
+        stage = deadline.slice(PIPELINE_DEADLINE['ai_advice'], "AI建议")
+        ai_task = asyncio.ensure_future(request_advice())
+        fallback_sent = False
+        try:
+            # shield: 时间片用完时不取消AI请求，先推送规则建议再继续等待
+            advice = await stage.run(asyncio.shield(ai_task))
+        except asyncio.TimeoutError:
+            fallback_sent = await push_rule_based_advice(stage.elapsed())
+            try:
+                advice = await deadline.run(ai_task)
+            except asyncio.TimeoutError:
+                print("AI建议未能在总截止时间内返回，已取消")
+                advice = None
         
         if advice:
             print("\n成功获取AI投资建议:")
             print(advice)
             
-            push_message = "🤖 AI投资顾问建议\n\n"
+            push_message = "🤖 AI投资顾问建议（补充，规则建议已先行推送）\n\n" if fallback_sent else "🤖 AI投资顾问建议\n\n"
             push_message += f"{advice}"
             await send_message_async(push_message)
         else:
@@ -234,11 +316,137 @@ async def get_ai_investment_advice(debug_only=False):
         logger.debug(error_details)
         print(f"错误详情已记录到日志文件")
 
-async def update_and_reorganize_data():
-    """执行数据采集和重组（步骤1+2），返回是否成功"""
-    # 1. 更新历史数据
+async def run_backtest(rule="overall", fee_rate=0.001):
+    """基于本地历史数据回测规则建议，不发起网络请求
+    
+    Args:
+        rule: 用于交易的规则 overall/price_based/mvrv_based/fear_greed_based
+        fee_rate: 单边手续费率
+    """
+    collector = HistoricalDataCollector(data_dir=DATA_DIRS['data'])
+    historical_data = collector.load_historical_data()
+    if not historical_data:
+        print("错误: 未找到历史数据，请先运行一次数据采集")
+        return False
+    
+    backtester = AdviceBacktester(historical_data, fee_rate=fee_rate)
+    result = backtester.run(rule=rule)
+    if result.get("status") == "error":
+        logger.error(f"回测失败: {result.get('message', '未知错误')}")
+        print(f"回测失败: {result.get('message', '未知错误')}")
+        return False
+    
+    report = result["formatted_output"]
+    os.makedirs(DATA_DIRS['reports'], exist_ok=True)
+    report_file = f"{DATA_DIRS['reports']}/backtest_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+    with open(report_file, "w", encoding="utf-8") as f:
+        f.write(report)
+    
+    logger.info(f"回测报告已保存到: {report_file}")
+    print("\n" + report)
+    return True
+
+async def run_param_sweep(search="grid", samples=500, objective="sharpe", workers=None,
+                          top=10, rule="overall", fee_rate=0.001):
+    """在进程池中扫描规则阈值与权重，按目标排序并保存结果
+    
+    Args:
+        search: grid（网格搜索）或 random（随机搜索）
+        samples: 随机搜索的参数组合数量
+        objective: 排序目标
+        workers: 进程数，默认使用全部CPU核心
+        top: 报告中展示的最优组合数量
+        rule: 用于交易的规则
+        fee_rate: 单边手续费率
+    """
+    collector = HistoricalDataCollector(data_dir=DATA_DIRS['data'])
+    historical_data = collector.load_historical_data()
+    if not historical_data:
+        print("错误: 未找到历史数据，请先运行一次数据采集")
+        return False
+    
+    sweep = ParameterSweep(historical_data, rule=rule, fee_rate=fee_rate, workers=workers)
+    result = sweep.run(search=search, samples=samples, objective=objective, top=top)
+    if result.get("status") == "error":
+        logger.error(f"参数扫描失败: {result.get('message', '未知错误')}")
+        print(f"参数扫描失败: {result.get('message', '未知错误')}")
+        return False
+    
+    os.makedirs(DATA_DIRS['reports'], exist_ok=True)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    results_file = f"{DATA_DIRS['reports']}/sweep_{timestamp}.json"
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump({k: v for k, v in result.items() if k != "formatted_output"}, f, ensure_ascii=False, indent=2)
+    
+    logger.info(f"参数扫描结果已保存到: {results_file}")
+    print("\n" + result["formatted_output"])
+    return True
+
+async def run_replay(start_date, end_date, name=None, step_days=None, max_concurrency=None, chain=True,
+                     use_cache=True):
+    """按历史日期批量重新生成AI建议（只使用截至各日期的数据），可中断后重新运行继续
+    
+    Args:
+        start_date: 回放起始日期（含）
+        end_date: 回放结束日期（含）
+        name: 回放名称，默认由起止日期生成
+        step_days: 回放日期间隔天数
+        max_concurrency: 同时进行的请求数上限
+        chain: 是否将前一个日期的仓位带入下一个日期
+        use_cache: 是否使用AI回复缓存
+    """
+    rows = load_daily_data(os.path.join(DATA_DIRS['data'], "daily_data.json"))
+    if not rows:
+        print("错误: 未找到整合后的数据文件，请先运行一次数据采集")
+        return False
+    
+    runner = ReplayRunner(rows, start_date, end_date, name=name, step_days=step_days,
+                          max_concurrency=max_concurrency, chain=chain, use_cache=use_cache)
+    result = await runner.run()
+    if result.get("status") == "error":
+        logger.error(f"历史回放失败: {result.get('message', '未知错误')}")
+        print(f"历史回放失败: {result.get('message', '未知错误')}")
+        return False
+    
+    report = format_replay_summary(result)
+    os.makedirs(result["replay_dir"], exist_ok=True)
+    with open(os.path.join(result["replay_dir"], "summary.txt"), "w", encoding="utf-8") as f:
+        f.write(report)
+    
+    print("\n" + report)
+    return not any(variant["failed"] for variant in result["variants"])
+
+def show_telemetry(days=30, by="day", api_url=None):
+    """按天或按周汇总AI调用遥测日志：调用次数、失败、重试、延迟和首token分位数、token和费用
+    
+    Args:
+        days: 汇总最近的天数
+        by: 汇总粒度 day/week
+        api_url: 只汇总该接口地址的调用，默认为配置的DeepSeek接口，"all"表示全部
+    """
+    api_url = api_url or DEEPSEEK_AI['api_url']
+    telemetry = LLMTelemetry()
+    records = telemetry.load(days, api_url=None if api_url == "all" else api_url)
+    if not records:
+        print(f"最近{days}天没有AI调用遥测记录: {telemetry.log_path}（接口: {api_url}）")
+        return False
+    
+    print(f"\nAI调用遥测（最近{days}天，接口: {api_url}，共{len(records)}次调用，延迟单位: 秒）")
+    print(format_summary(summarize(records, by=by)))
+    return True
+
+async def update_and_reorganize_data(deadline=None):
+    """执行数据采集和重组（步骤1+2），返回按日期整合的数据列表（失败时为空列表），供AI建议步骤直接使用
+    
+    Args:
+        deadline: 整个流程的截止时间，数据采集最多使用PIPELINE_DEADLINE['data_update']秒
+    """
+    # 1. 更新历史数据（超出时间片时取消采集，使用本地已有数据继续）
+    stage = (deadline or Deadline()).slice(PIPELINE_DEADLINE['data_update'], "数据采集")
     try:
-        await generate_analysis_report(force_update=False)
+        await stage.run(generate_analysis_report(force_update=False))
+    except asyncio.TimeoutError:
+        print(f"数据采集超出时间预算（{stage.seconds:.0f}秒），使用本地已有数据继续")
     except Exception as e:
         logger.error(f"生成分析报告时出错: {str(e)}")
         print(f"生成分析报告时出错: {str(e)}")
@@ -254,29 +462,33 @@ async def update_and_reorganize_data():
         if not os.path.exists(input_file):
             logger.error(f"输入文件不存在: {input_file}")
             print(f"错误: 输入文件不存在: {input_file}")
-            return False
+            return []
         
         print("正在整合数据为按日期组织的格式...\n")
-        success = reorganize_data(input_file, output_file)
+        rows = reorganize_data(input_file, output_file)
         
-        if success:
+        if rows:
             print(f"数据整合成功！已生成按日期组织的数据文件: {output_file}")
             print(f"数据文件处理完成: {output_file}\n")
         else:
             print("数据整合失败，请检查日志获取详细信息\n")
-        return success
+        return rows
     except Exception as e:
         print(f"数据整合过程中出错: {str(e)}")
         logger.error(f"数据整合过程中出错: {str(e)}")
-        return False
+        return []
 
 
-async def main(debug_mode=False):
+async def main(debug_mode=False, use_cache=True, ensemble=False, deadline_seconds=None):
     """主函数
     
     Args:
         debug_mode: 调试模式，仅采集数据并生成提示词，不调用AI接口
+        use_cache: 是否使用AI回复缓存
+        ensemble: 是否使用多模型集成建议
+        deadline_seconds: 整个流程的时间预算（秒），默认使用PIPELINE_DEADLINE['total']，0表示不限时
     """
+    deadline = Deadline(PIPELINE_DEADLINE['total'] if deadline_seconds is None else deadline_seconds)
     try:
         print("\n====== 加密货币监控系统 ======")
         print("支持分析: BTC价格、MVRV比率和恐惧贪婪指数")
@@ -285,19 +497,19 @@ async def main(debug_mode=False):
         
         print("正在检查数据更新，请稍候...\n")
         
-        await update_and_reorganize_data()
+        rows = await update_and_reorganize_data(deadline)
         
         if debug_mode:
-            await get_ai_investment_advice(debug_only=True)
+            await get_ai_investment_advice(debug_only=True, rows=rows)
         else:
             try:
                 print("正在生成AI投资建议...\n")
-                await get_ai_investment_advice()
+                await get_ai_investment_advice(use_cache=use_cache, ensemble=ensemble, deadline=deadline, rows=rows)
             except Exception as e:
                 logger.error(f"生成AI投资建议过程中出错: {str(e)}")
                 print(f"生成AI投资建议过程中出错: {str(e)}")
         
-        print("\n处理完成，程序退出")
+        print(f"\n处理完成（耗时{deadline.elapsed():.0f}秒），程序退出")
 
     except KeyboardInterrupt:
         print("\n程序被用户中断")
@@ -315,11 +527,69 @@ def parse_args():
     parser = argparse.ArgumentParser(description='CryptoSentinel - BTC投资分析与AI顾问')
     parser.add_argument('--debug', action='store_true',
                         help='调试模式：执行数据采集和重组，生成提示词文件，但不调用AI接口')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='忽略AI回复缓存，总是重新请求DeepSeek')
+    parser.add_argument('--deadline', type=float, default=None,
+                        help='整个流程的时间预算（秒），AI建议超时先推送规则建议（默认: PIPELINE_DEADLINE配置，0为不限时）')
+    parser.add_argument('--ensemble', action='store_true',
+                        help='多模型集成：并发请求多个模型/温度，仓位与止损取中位数、决策投票')
+    parser.add_argument('--backtest', action='store_true',
+                        help='回测模式：基于本地历史数据回测规则建议的收益、回撤和命中率')
+    parser.add_argument('--rule', default='overall',
+                        choices=['overall', 'price_based', 'mvrv_based', 'fear_greed_based'],
+                        help='回测使用的规则（默认: overall）')
+    parser.add_argument('--fee', type=float, default=0.001,
+                        help='回测单边手续费率（默认: 0.001）')
+    parser.add_argument('--sweep', action='store_true',
+                        help='参数扫描模式：并行搜索规则阈值与权重，按目标排序')
+    parser.add_argument('--search', default='grid', choices=['grid', 'random'],
+                        help='参数扫描方式（默认: grid）')
+    parser.add_argument('--samples', type=int, default=500,
+                        help='随机搜索的参数组合数量（默认: 500）')
+    parser.add_argument('--objective', default='sharpe',
+                        choices=['total_return', 'annual_return', 'sharpe', 'calmar', 'hit_rate', 'max_drawdown'],
+                        help='参数扫描的排序目标（默认: sharpe）')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='参数扫描的进程数（默认: CPU核心数）')
+    parser.add_argument('--replay', nargs=2, metavar=('START', 'END'),
+                        help='历史回放：按START至END（YYYY-MM-DD）之间的日期重新生成AI建议，只使用截至各日期的数据')
+    parser.add_argument('--replay-name', default=None,
+                        help='回放名称，相同名称重新运行时跳过已完成的日期（默认: START_END）')
+    parser.add_argument('--step', type=int, default=None,
+                        help='回放日期间隔天数（默认: AI_REPLAY配置）')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='回放同时进行的请求数上限（默认: AI_REPLAY配置）')
+    parser.add_argument('--no-chain', action='store_true',
+                        help='回放时各日期独立生成（均从空仓开始），不串联前一日期的仓位，可全部并发')
+    parser.add_argument('--telemetry', action='store_true',
+                        help='汇总AI调用遥测日志：延迟、首token、token用量、重试和费用的分位数')
+    parser.add_argument('--days', type=int, default=30,
+                        help='遥测汇总的天数（默认: 30）')
+    parser.add_argument('--by', default='day', choices=['day', 'week'],
+                        help='遥测汇总粒度（默认: day）')
+    parser.add_argument('--api-url', default=None,
+                        help='遥测只汇总该接口地址的调用（默认: 配置的DEEPSEEK_API_URL，all表示全部）')
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_args()
-    exit_code = asyncio.run(main(debug_mode=args.debug))
+    if args.replay:
+        success = asyncio.run(run_replay(args.replay[0], args.replay[1], name=args.replay_name,
+                                         step_days=args.step, max_concurrency=args.concurrency,
+                                         chain=not args.no_chain, use_cache=not args.no_cache))
+        sys.exit(0 if success else 1)
+    if args.telemetry:
+        sys.exit(0 if show_telemetry(days=args.days, by=args.by, api_url=args.api_url) else 1)
+    if args.backtest:
+        success = asyncio.run(run_backtest(rule=args.rule, fee_rate=args.fee))
+        sys.exit(0 if success else 1)
+    if args.sweep:
+        success = asyncio.run(run_param_sweep(search=args.search, samples=args.samples,
+                                              objective=args.objective, workers=args.workers,
+                                              rule=args.rule, fee_rate=args.fee))
+        sys.exit(0 if success else 1)
+    exit_code = asyncio.run(main(debug_mode=args.debug, use_cache=not args.no_cache, ensemble=args.ensemble,
+                                 deadline_seconds=args.deadline))
     sys.exit(exit_code)
 
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+本地大模型模拟服务
+在本机提供OpenAI兼容的chat/completions接口，离线测试和压测AI调用链路
+
+用法:
+    # 启动服务，另一个终端中将DEEPSEEK_API_URL指向它后运行main.py
+    python mock-llm-server.py --port 8000 --think-time 5 --token-rate 40 --rate-limit-rate 0.1
+    DEEPSEEK_API_URL=http://127.0.0.1:8000/v1/chat/completions DEEPSEEK_API_KEY=mock python main.py
+
+    # 压测：启动服务并发起200次请求（并发20），输出延迟和token的分位数
+    python mock-llm-server.py --bench 200 --concurrency 20 --think-time 0.5 --error-rate 0.05
+"""
+
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+import tempfile
+
+src_dir = os.path.join(os.path.dirname(__file__), 'src')
+sys.path.append(src_dir)
+
+from ai.mock_server import MockLLMServer
+from ai.deepseek import DeepseekAPI
+from config import DEEPSEEK_AI
+from ai.telemetry import LLMTelemetry, summarize, format_summary
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+async def run_bench(server: MockLLMServer, requests: int, concurrency: int, stream: bool, model: str):
+    """对模拟服务并发发起请求，经由DeepseekAPI（含重试和流式接收）统计延迟分布"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 连接池不小于并发数，否则排队等待连接的时间会计入首token和总延迟
+        api = DeepseekAPI(api_key="mock", api_url=server.api_url,
+                          pool_size=max(concurrency, DEEPSEEK_AI['pool_size']))
+        api.telemetry = LLMTelemetry(os.path.join(tmp_dir, 'bench.jsonl'))
+        semaphore = asyncio.Semaphore(concurrency)
+        messages = [{"role": "system", "content": "你是一名专业的加密货币投资顾问。"},
+                    {"role": "user", "content": "请根据最新数据给出投资建议。"}]
+
+        async def one(i):
+            async with semaphore:
+                return await api.chat_completion_async(messages, model=model, stream=stream, retry_delay=0.5,
+                                                       stream_path=os.path.join(tmp_dir, f"stream_{i}.md"))
+
+        try:
+            results = await asyncio.gather(*[one(i) for i in range(requests)])
+        finally:
+            await api.close()
+
+        failed = sum(1 for result in results if not result)
+        print(f"\n压测完成: {requests}次请求，并发{concurrency}，失败{failed}次，"
+              f"服务端响应统计: {json.dumps(dict(server.stats))}")
+        print(format_summary(summarize(api.telemetry.load())))
+
+
+async def main(args):
+    script = None
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            script = json.load(f)
+    content = None
+    if args.content_file:
+        with open(args.content_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+    server = MockLLMServer(host=args.host, port=0 if args.bench else args.port, think_time=args.think_time,
+                           token_rate=args.token_rate, reasoning_tokens=args.reasoning_tokens, content=content,
+                           script=script, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                           disconnect_rate=args.disconnect_rate, seed=args.seed)
+    async with server:
+        if args.bench:
+            await run_bench(server, args.bench, args.concurrency, not args.no_stream, args.model)
+            return
+        logger.info(f"设置 DEEPSEEK_API_URL={server.api_url} 后运行main.py，按Ctrl+C停止")
+        await asyncio.Event().wait()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='本地大模型模拟服务（OpenAI兼容接口）')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认: 127.0.0.1）')
+    parser.add_argument('--port', type=int, default=8000, help='监听端口（默认: 8000）')
+    parser.add_argument('--think-time', type=float, default=1.0, help='首token前的等待时间，秒（默认: 1.0）')
+    parser.add_argument('--token-rate', type=float, default=50.0, help='输出速率，token/秒，0为不限速（默认: 50）')
+    parser.add_argument('--reasoning-tokens', type=int, default=0, help='每次回复的推理token数（默认: 0）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500错误的比例（默认: 0）')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429限流的比例（默认: 0）')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0, help='流式响应中途断开的比例（默认: 0）')
+    parser.add_argument('--script', help='响应脚本（JSON数组），按顺序逐次使用，如[{"status": 429}, {"think_time": 30}]')
+    parser.add_argument('--content-file', help='固定回复正文的文件，默认为带结构化JSON决策数据的示例建议')
+    parser.add_argument('--seed', type=int, default=None, help='随机数种子')
+    parser.add_argument('--bench', type=int, default=0, help='压测模式：发起的请求数')
+    parser.add_argument('--concurrency', type=int, default=10, help='压测并发数（默认: 10）')
+    parser.add_argument('--model', default='deepseek-reasoner', help='压测请求的模型名（默认: deepseek-reasoner）')
+    parser.add_argument('--no-stream', action='store_true', help='压测使用阻塞（非流式）请求')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        pass
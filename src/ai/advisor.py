@@ -8,20 +8,27 @@ AI顾问模块 - 提供基于大模型的投资建议
 """
 
 import os
-import json
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Union
 
 # 导入DeepseekAPI
 from ai.deepseek import DeepseekAPI
+from ai.prompt import get_investment_advice_template, prepare_investment_advice_params, estimate_tokens
+from ai.token_budget import TokenBudget
+from ai.ensemble import EnsembleRunner, format_ensemble_advice
+from utils.analogs import AnalogFinder
+from utils.data_reorganizer import DailyRow, load_daily_data
 
 # 导入配置
-from config import DATA_DIRS
+from config import DATA_DIRS, DEEPSEEK_AI
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+# 市场数据：已加载的按日期数据列表，或daily_data.json文件路径
+MarketData = Union[str, List[DailyRow]]
+
 class DeepseekAdvisor:
     """DeepSeek顾问类，提供基于DeepSeek大模型的投资建议"""
     
@@ -41,12 +48,12 @@ class DeepseekAdvisor:
         
         logger.info("DeepSeek顾问初始化完成")
     
-    def get_investment_advice(self, data_file: str, months: int = 3, last_record_id: str = None, 
+    def get_investment_advice(self, data: MarketData, months: int = 3, last_record_id: str = None, 
                             debug: bool = False, max_retries: int = 3, retry_delay: float = 2.0, **kwargs) -> Optional[str]:
         """获取投资建议
         
         Args:
-            data_file: 整合后的历史数据文件路径
+            data: 已加载的按日期数据列表（如reorganize_rows的结果），或整合后的数据文件路径
             months: 分析最近几个月的数据
             last_record_id: 上次建议的记录ID，用于连续性建议
             debug: 是否开启调试模式
@@ -57,17 +64,9 @@ class DeepseekAdvisor:
         Returns:
             生成的投资建议文本，如果生成失败则返回None
         """
-        # 整理和筛选数据
-        filtered_data = self._prepare_data_for_ai(data_file, months)
-        if not filtered_data:
-            logger.error("准备AI分析数据失败")
+        data_json = self._prepare_request(data, months, kwargs)
+        if data_json is None:
             return None
-            
-        # 将筛选后的数据转为JSON字符串
-        data_json = json.dumps(filtered_data, ensure_ascii=False)
-        
-        # 调用API生成投资建议
-        logger.info(f"开始生成投资建议，使用最近{months}个月的数据...")
         
         try:
             # 生成并保存投资建议
@@ -79,20 +78,7 @@ class DeepseekAdvisor:
                 retry_delay=retry_delay,
                 **kwargs
             )
-            
-            if result.get("success"):
-                # 获取建议内容和记录ID
-                advice = result.get("advice")
-                
-                # 额外保存一份到AI建议目录
-                self._save_advice_to_file(advice)
-                
-                logger.info(f"成功生成投资建议")
-                return advice
-            else:
-                error = result.get("error", "未知错误")
-                logger.error(f"生成投资建议失败: {error}")
-                return None
+            return self._handle_result(result)
                 
         except Exception as e:
             logger.error(f"调用AI API生成投资建议时出错: {str(e)}")
@@ -100,89 +86,178 @@ class DeepseekAdvisor:
             logger.debug(traceback.format_exc())
             return None
     
-    def _prepare_data_for_ai(self, data_file: str, months: int) -> List[Dict]:
+    async def get_investment_advice_async(self, data: MarketData, months: int = 3, last_record_id: str = None, 
+                                          debug: bool = False, max_retries: int = 3, retry_delay: float = 2.0, **kwargs) -> Optional[str]:
+        """get_investment_advice的异步版本，等待AI响应期间不阻塞事件循环"""
+        data_json = self._prepare_request(data, months, kwargs)
+        if data_json is None:
+            return None
+        
+        try:
+            result = await self.api.generate_and_save_investment_advice_async(
+                data_json=data_json,
+                last_record_id=last_record_id,
+                debug=debug,
+                max_retries=max_retries,
+                retry_delay=retry_delay,
+                **kwargs
+            )
+            return self._handle_result(result)
+        
+        except Exception as e:
+            logger.error(f"调用AI API生成投资建议时出错: {str(e)}")
+            import traceback
+            logger.debug(traceback.format_exc())
+            return None
+    
+    async def get_ensemble_advice_async(self, data: MarketData, months: int = 3, last_record_id: str = None,
+                                        members: List[Dict[str, Any]] = None, max_concurrency: int = None,
+                                        max_retries: int = 2, retry_delay: float = 2.0, **kwargs) -> Optional[str]:
+        """多模型集成建议：同一提示词并发发送给多个成员，汇总仓位、止损和目标价
+        
+        Args:
+            data: 已加载的按日期数据列表，或整合后的数据文件路径
+            months: 分析最近几个月的数据
+            last_record_id: 上次建议的记录ID，用于连续性建议
+            members: 成员配置列表，默认使用AI_ENSEMBLE['members']
+            max_concurrency: 同时进行的请求数上限
+            max_retries: 每个成员的最大重试次数
+            retry_delay: 重试间隔时间（秒）
+            **kwargs: 其他参数传递给API
+            
+        Returns:
+            集成建议文本，如果所有成员均失败则返回None
+        """
+        data_json = self._prepare_request(data, months, kwargs)
+        if data_json is None:
+            return None
+        
+        try:
+            last_advice, last_record_id = self.api._load_last_advice(last_record_id)
+            messages = self.api._build_investment_messages(data_json, last_advice, kwargs)
+            
+            result = await EnsembleRunner(members, max_concurrency).run(
+                messages, max_retries=max_retries, retry_delay=retry_delay, **kwargs)
+            if result["status"] != "success":
+                logger.error(result["message"])
+                return None
+            
+            advice = format_ensemble_advice(result)
+            return self._handle_result(self.api._save_advice_result(advice, data_json, last_record_id, kwargs))
+        
+        except Exception as e:
+            logger.error(f"生成集成投资建议时出错: {str(e)}")
+            import traceback
+            logger.debug(traceback.format_exc())
+            return None
+    
+    def _prepare_request(self, data: MarketData, months: int, kwargs: Dict) -> Optional[str]:
+        """筛选数据并编码为提示词文本，同时将数据格式和历史相似行情加入kwargs
+        
+        Returns:
+            市场数据文本，准备失败时返回None
+        """
+        # 整理和筛选数据（指定current_date时为回放模式，只使用截至当天的数据）
+        filtered_data = self._prepare_data_for_ai(data, months, kwargs.get('current_date'))
+        if not filtered_data:
+            logger.error("准备AI分析数据失败")
+            return None
+            
+        # 检索历史相似行情，附加到提示词
+        analog_context = kwargs.setdefault('analog_context', self._build_analog_context(filtered_data))
+        
+        # 将筛选后的数据编码为紧凑文本（格式由配置决定），超出token预算时自动缩减
+        data_format = kwargs.setdefault('data_format', DEEPSEEK_AI['prompt_data_format'])
+        fitted = self._fit_market_data(filtered_data, data_format, analog_context, kwargs.get('max_tokens'))
+        if fitted["status"] != "success":
+            logger.error(fitted["message"])
+            return None
+        
+        # 调用API生成投资建议
+        logger.info(f"开始生成投资建议，使用{fitted['start_date']}至{fitted['end_date']}的{fitted['rows']}天数据"
+                    f"（约{fitted['data_tokens']} tokens）...")
+        return fitted["data_text"]
+    
+    def _fit_market_data(self, filtered_data: List[Dict], data_format: str, analog_context: str = "",
+                         max_tokens: int = None) -> Dict[str, Any]:
+        """按token预算编码市场数据
+        
+        以不含数据的提示词模板估算固定部分的token数，剩余预算用于市场数据。
+        
+        Args:
+            filtered_data: 按日期升序排列的数据列表
+            data_format: 数据格式，"csv"或"json"
+            analog_context: 历史相似行情文本
+            max_tokens: 为输出预留的token数，默认使用配置
+            
+        Returns:
+            TokenBudget.fit_market_data的结果，另含template_tokens
+        """
+        budget = TokenBudget(max_tokens=max_tokens)
+        template = get_investment_advice_template(**prepare_investment_advice_params(), data_json="",
+                                                  analog_context=analog_context, data_format=data_format)
+        template_tokens = estimate_tokens(template)
+        fitted = budget.fit_market_data(filtered_data, data_format, DEEPSEEK_AI['prompt_daily_days'],
+                                        fixed_tokens=template_tokens)
+        fitted["template_tokens"] = template_tokens
+        return fitted
+    
+    def _handle_result(self, result: Dict[str, Any]) -> Optional[str]:
+        """保存成功生成的建议并返回建议文本"""
+        if result.get("success"):
+            # 获取建议内容和记录ID
+            advice = result.get("advice")
+            
+            # 额外保存一份到AI建议目录
+            self._save_advice_to_file(advice)
+            
+            logger.info(f"成功生成投资建议")
+            return advice
+        else:
+            error = result.get("error", "未知错误")
+            logger.error(f"生成投资建议失败: {error}")
+            return None
+    
+    def _prepare_data_for_ai(self, data: MarketData, months: int, as_of: str = None) -> List[DailyRow]:
         """准备用于AI分析的数据
         
         Args:
-            data_file: 整合后的历史数据文件路径
+            data: 已加载的按日期数据列表（如reorganize_rows的结果），或整合后的数据文件路径
             months: 分析最近几个月的数据
+            as_of: 回放日期（YYYY-MM-DD），指定时只使用截至当天的数据，月数也从该日期往前计算
             
         Returns:
-            筛选后的历史数据列表
+            筛选后的历史数据列表（按日期升序，不修改传入的列表）
         """
+        # 传入文件路径时才从磁盘加载
+        rows = load_daily_data(data) if isinstance(data, str) else data
+        if not rows:
+            logger.error("没有可供AI分析的数据")
+            return []
+        
         try:
-            # 检查文件是否存在
-            if not os.path.exists(data_file):
-                logger.error(f"数据文件不存在: {data_file}")
-                return []
-                
-            # 读取整合后的数据
-            with open(data_file, 'r', encoding='utf-8') as f:
-                file_content = f.read()
-                
-            # 尝试解析JSON数据
-            try:
-                all_data = json.loads(file_content)
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON解析错误: {e}")
-                logger.debug(f"文件内容预览: {file_content[:200]}...")
-                return []
-            
-            # 验证数据类型    
-            if not isinstance(all_data, list):
-                logger.error(f"数据格式错误: 期望列表类型，获取到 {type(all_data).__name__}")
-                # 如果是字典类型，尝试获取数据数组
-                if isinstance(all_data, dict) and 'data' in all_data and isinstance(all_data['data'], list):
-                    all_data = all_data['data']
-                    logger.info("从字典中提取数据数组")
-                else:
-                    # 尝试将JSON字符串再次解析
-                    try:
-                        if isinstance(all_data, str):
-                            all_data = json.loads(all_data)
-                            if isinstance(all_data, list):
-                                logger.info("成功将字符串解析为数据列表")
-                            else:
-                                logger.error("解析后仍不是列表类型")
-                                return []
-                        else:
-                            return []
-                    except:
-                        return []
-            
-            # 验证每个数据项是否为字典
-            if all_data and not all(isinstance(item, dict) for item in all_data):
-                logger.error("数据格式错误: 列表中的项不全是字典类型")
-                return []
+            # 回放模式下只能看到截至as_of当天的数据
+            if as_of:
+                rows = [row for row in rows if row['date'] <= as_of]
             
             # 计算月份起始日期
-            today = datetime.today()
+            today = datetime.strptime(as_of, '%Y-%m-%d') if as_of else datetime.today()
             start_date = (today - timedelta(days=30 * months)).strftime('%Y-%m-%d')
             
             # 筛选指定月份的数据
-            filtered_data = []
-            for item in all_data:
-                if not isinstance(item, dict):
-                    continue
-                    
-                date_str = item.get('date')
-                if not date_str or not isinstance(date_str, str):
-                    continue
-                    
-                if date_str >= start_date:
-                    filtered_data.append(item)
+            filtered_data = [row for row in rows if row['date'] >= start_date]
             
             # 检查是否成功筛选到数据
             if not filtered_data:
                 logger.warning(f"没有找到从 {start_date} 开始的数据")
                 # 如果没有筛选到数据，返回所有数据（但限制数量）
-                filtered_data = all_data[:min(100, len(all_data))]
+                filtered_data = list(rows[:min(100, len(rows))])
                 logger.info(f"返回所有可用数据（最多100条）")
             
             # 按日期升序排序（最旧的在前，最新的在后）
-            filtered_data.sort(key=lambda x: x.get('date', ''), reverse=False)
+            filtered_data.sort(key=lambda x: x['date'])
             
-            logger.info(f"已准备{len(filtered_data)}条数据供AI分析，时间范围: {filtered_data[0]['date'] if filtered_data else 'N/A'} 至 {filtered_data[-1]['date'] if filtered_data else 'N/A'}")
+            logger.info(f"已准备{len(filtered_data)}条数据供AI分析，时间范围: {filtered_data[0]['date']} 至 {filtered_data[-1]['date']}")
             return filtered_data
             
         except Exception as e:
@@ -191,6 +266,24 @@ class DeepseekAdvisor:
             logger.debug(traceback.format_exc())
             return []
     
+    def _build_analog_context(self, daily_data: List[Dict]) -> str:
+        """检索与最新一天最相似的历史日期，生成提示词中的参考文本
+        
+        Args:
+            daily_data: 按日期整合的数据列表
+            
+        Returns:
+            相似行情文本，无法检索时返回空字符串
+        """
+        try:
+            finder = AnalogFinder.from_daily_rows(daily_data)
+            if finder.query()["status"] != "success":
+                return ""
+            return finder.format_analogs()
+        except Exception as e:
+            logger.warning(f"检索历史相似行情出错: {str(e)}")
+            return ""
+    
     def _save_advice_to_file(self, advice: str) -> bool:
         """将投资建议保存到文件
         
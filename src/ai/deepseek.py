@@ -10,41 +10,80 @@ DeepSeek API调用模块 - 提供与DeepSeek R1模型的API交互
 
 import os
 import json
+import random
+import asyncio
 import logging
+import aiohttp
 import requests
 import time
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, List, Optional, Union, Callable
 
 # 导入配置
-from config import DEEPSEEK_AI, DATA_DIRS
+from config import DEEPSEEK_AI, DATA_DIRS, LLM_HEDGE
 
 # 导入提示词模块
 from ai.prompt import (
-    get_investment_advice_template, 
+    get_investment_advice_messages, 
     prepare_investment_advice_params,
     save_prompt_for_debug,
-    extract_json_from_text
+    extract_json_from_text,
+    extract_tldr
 )
+from ai.response_cache import ResponseCache, request_key
+from ai.hedging import HedgePolicy
+from ai.record_store import InvestmentRecordStore
+from ai.telemetry import LLMTelemetry, summarize_usage
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+
+def stream_file_path(suffix: str = "") -> str:
+    """流式回复的默认增量写入文件（DATA_DIRS['streams']，不写入会发布到文档站的AI建议目录）"""
+    os.makedirs(DATA_DIRS['streams'], exist_ok=True)
+    return os.path.join(DATA_DIRS['streams'], f"stream_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.md")
+
 class DeepseekAPI:
     """DeepSeek API接口类，提供与DeepSeek R1模型交互的方法"""
     
-    def __init__(self, api_key: str = None, api_url: str = None):
+    def __init__(self, api_key: str = None, api_url: str = None, pool_size: int = None):
         """初始化DeepSeek API客户端
         
         Args:
             api_key: DeepSeek API密钥，如果为None则尝试从环境变量获取
             api_url: 自定义API URL，如果为None则使用配置中的值
+            pool_size: 异步调用的连接池大小（同时进行的请求数上限），如果为None则使用配置中的值
         """
         self.api_key = api_key or DEEPSEEK_AI['api_key']
         self.api_url = api_url or DEEPSEEK_AI['api_url']
+        self.pool_size = pool_size or DEEPSEEK_AI['pool_size']
         
         if not self.api_key:
             logger.warning("未设置DeepSeek API密钥，请通过环境变量DEEPSEEK_API_KEY或初始化参数提供")
+        
+        # 异步调用复用的连接池会话，首次异步调用时创建
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop = None
+        
+        # 最近一次调用的token用量（含前缀缓存命中数）
+        self.last_usage: Optional[Dict[str, Any]] = None
+        
+        # 每次调用的延迟、token用量、重试次数和费用
+        self.telemetry = LLMTelemetry()
+        
+        # 按历史首token延迟决定何时发出对冲请求；只有正式配置的接口将延迟样本保存到历史文件，
+        # 模拟服务、其他服务商和历史回放（ReplayRunner关闭此项）的样本只保留在本实例内存中，
+        # 对冲比例上限照常生效，但不影响正式调用的对冲时机
+        self.hedge_policy = HedgePolicy()
+        self.record_latency = self.api_url == DEEPSEEK_AI['api_url']
+        
+        # 相同请求（模型、参数和提示词均相同）直接返回缓存的回复
+        self.response_cache = ResponseCache(
+            cache_dir=os.path.join(DATA_DIRS['cache'], 'llm'),
+            ttl=DEEPSEEK_AI['cache_ttl'],
+            max_disk_entries=DEEPSEEK_AI['cache_max_entries']
+        )
     
     def validate_api_key(self) -> bool:
         """验证API密钥是否设置
@@ -84,35 +123,36 @@ class DeepseekAPI:
             logger.error("未设置API密钥，无法调用DeepSeek API")
             return None
         
-        # 准备参数，优先使用传入的参数，否则使用配置中的默认值
-        payload = {
-            "model": model or DEEPSEEK_AI['model'],
-            "messages": messages,
-            "temperature": temperature if temperature is not None else DEEPSEEK_AI['temperature'],
-            "max_tokens": max_tokens if max_tokens is not None else DEEPSEEK_AI['max_tokens'],
-            "top_p": top_p if top_p is not None else DEEPSEEK_AI['top_p'],
-            "stream": stream if stream is not None else DEEPSEEK_AI['stream']
-        }
-        
-        # 添加其他可选参数
-        payload.update(kwargs)
-        
-        # 调用API
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        # 实现重试逻辑
+        payload = self._build_payload(messages, model, temperature, max_tokens, top_p, stream, **kwargs)
+        # 同步接口不支持流式响应
+        payload["stream"] = False
+        call = self.telemetry.start(payload, self.api_url)
+        response = None
+        try:
+            response = self._post_with_retries(payload, max_retries, retry_delay, call)
+        finally:
+            self.telemetry.finish(call, response)
+        return response
+    
+    def _post_with_retries(self, payload: Dict[str, Any], max_retries: int, retry_delay: float,
+                           call: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """同步发送请求并按规则重试，重试次数、HTTP状态码和首字节时间记录到遥测记录call"""
         retries = 0
         while retries <= max_retries:
             try:
                 logger.info(f"正在调用DeepSeek API，模型: {payload['model']}，尝试次数: {retries + 1}/{max_retries + 1}")
-                response = requests.post(self.api_url, headers=headers, json=payload, timeout=600)
+                call["retries"] = retries
+                attempt_start = time.time()
+                response = requests.post(self.api_url, headers=self._headers(), json=payload, timeout=DEEPSEEK_AI['timeout'])
+                call["http"] = response.status_code
+                # elapsed为发出请求到收到响应头的时间
+                call["first_byte"] = round(attempt_start + response.elapsed.total_seconds() - call["start"], 3)
                 
                 if response.status_code == 200:
                     logger.info("DeepSeek API调用成功")
-                    return response.json()
+                    result = response.json()
+                    self.telemetry.mark(call, "first_token")
+                    return result
                 elif response.status_code == 429:  # 速率限制
                     logger.warning(f"API调用受到限制 (429)，等待重试...")
                     retries += 1
@@ -183,6 +223,370 @@ class DeepseekAPI:
         
         return None
     
+    def _build_payload(self, messages: List[Dict[str, str]], model: str = None, temperature: float = None,
+                       max_tokens: int = None, top_p: float = None, stream: bool = None, **kwargs) -> Dict[str, Any]:
+        """准备请求参数，优先使用传入的参数，否则使用配置中的默认值"""
+        payload = {
+            "model": model or DEEPSEEK_AI['model'],
+            "messages": messages,
+            "temperature": temperature if temperature is not None else DEEPSEEK_AI['temperature'],
+            "max_tokens": max_tokens if max_tokens is not None else DEEPSEEK_AI['max_tokens'],
+            "top_p": top_p if top_p is not None else DEEPSEEK_AI['top_p'],
+            "stream": stream if stream is not None else DEEPSEEK_AI['stream']
+        }
+        
+        # 添加其他可选参数
+        payload.update(kwargs)
+        return payload
+    
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+    
+    @staticmethod
+    def _backoff_delay(retries: int, retry_delay: float) -> float:
+        """带随机抖动的指数退避时间，避免多个请求同时重试"""
+        return retry_delay * (2 ** (retries - 1)) * random.uniform(0.5, 1.5)
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """获取复用的aiohttp会话（连接池），事件循环变化或会话关闭时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self._headers(),
+                timeout=aiohttp.ClientTimeout(total=DEEPSEEK_AI['timeout'])
+            )
+            self._session_loop = loop
+        return self._session
+    
+    async def close(self):
+        """关闭异步会话"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def chat_completion_async(self, 
+                                    messages: List[Dict[str, str]], 
+                                    model: str = None,
+                                    temperature: float = None,
+                                    max_tokens: int = None,
+                                    top_p: float = None,
+                                    stream: bool = None,
+                                    max_retries: int = 3,
+                                    retry_delay: float = 2.0,
+                                    on_tldr: Optional[Callable[[str], Any]] = None,
+                                    stream_path: Optional[str] = None,
+                                    on_first_token: Optional[Callable[[], Any]] = None,
+                                    **kwargs) -> Optional[Dict[str, Any]]:
+        """chat_completion的异步版本，等待响应和重试期间不阻塞事件循环
+        
+        重试规则与chat_completion相同：429、5xx、超时和连接错误按指数退避重试，
+        其他4xx错误直接返回None。stream为True时以SSE流式接收，见_read_stream。
+        
+        Args:
+            on_tldr: 流式模式下TL;DR部分完整后调用（可为协程函数），参数为摘要文本
+            stream_path: 流式模式下增量写入回复内容的文件，默认见stream_file_path
+            on_first_token: 收到第一个token时调用（非流式模式下为收到完整响应时）
+            
+        Returns:
+            API响应的JSON数据，如果调用失败则返回None
+        """
+        if not self.validate_api_key():
+            logger.error("未设置API密钥，无法调用DeepSeek API")
+            return None
+        
+        payload = self._build_payload(messages, model, temperature, max_tokens, top_p, stream, **kwargs)
+        session = await self._get_session()
+        
+        request_kwargs = {}
+        if payload["stream"]:
+            # 流式响应总时长不设上限，只限制两次数据之间的间隔
+            request_kwargs["timeout"] = aiohttp.ClientTimeout(total=None, sock_read=DEEPSEEK_AI['stream_idle_timeout'])
+            # 流式响应默认不返回用量，需要显式请求（用于统计前缀缓存命中）
+            payload.setdefault("stream_options", {"include_usage": True})
+            if not stream_path:
+                stream_path = stream_file_path()
+        
+        call = self.telemetry.start(payload, self.api_url)
+        
+        def first_token():
+            self.telemetry.mark(call, "first_token")
+            if on_first_token:
+                on_first_token()
+        
+        response = None
+        status = None
+        try:
+            response = await self._post_with_retries_async(session, payload, request_kwargs, stream_path, on_tldr,
+                                                           first_token, max_retries, retry_delay, call)
+        except asyncio.CancelledError:
+            # 对冲请求中落败的一方被取消
+            status = "cancelled"
+            raise
+        finally:
+            self.telemetry.finish(call, response, status)
+        return response
+    
+    async def _post_with_retries_async(self, session: aiohttp.ClientSession, payload: Dict[str, Any],
+                                       request_kwargs: Dict[str, Any], stream_path: Optional[str],
+                                       on_tldr: Optional[Callable[[str], Any]], on_first_token: Callable[[], Any],
+                                       max_retries: int, retry_delay: float,
+                                       call: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """异步发送请求并按规则重试，重试次数、HTTP状态码和首字节时间记录到遥测记录call"""
+        retries = 0
+        while retries <= max_retries:
+            try:
+                logger.info(f"正在调用DeepSeek API，模型: {payload['model']}，尝试次数: {retries + 1}/{max_retries + 1}")
+                call["retries"] = retries
+                async with session.post(self.api_url, json=payload, **request_kwargs) as response:
+                    call["http"] = response.status
+                    call["first_byte"] = round(time.time() - call["start"], 3)
+                    if response.status == 200:
+                        logger.info("DeepSeek API调用成功")
+                        if payload["stream"]:
+                            return await self._read_stream(response, stream_path, on_tldr, on_first_token)
+                        result = await response.json()
+                        on_first_token()
+                        return result
+                    
+                    error = f"{response.status} - {await response.text()}"
+                    if response.status == 429:
+                        logger.warning("API调用受到限制 (429)，等待重试...")
+                    elif response.status >= 500:
+                        logger.warning(f"服务器错误 ({response.status})，尝试重试...")
+                    else:
+                        # 其他错误（如验证失败、参数错误等）不进行重试
+                        logger.error(f"API调用失败: {error}")
+                        return None
+            except asyncio.TimeoutError:
+                error = "API请求超时"
+                logger.warning("API请求超时，尝试重试...")
+            except aiohttp.ClientError as e:
+                error = f"API连接错误: {str(e)}"
+                logger.warning(f"{error}，尝试重试...")
+            
+            retries += 1
+            if retries > max_retries:
+                logger.error(f"达到最大重试次数，API调用失败: {error}")
+                return None
+            wait_time = self._backoff_delay(retries, retry_delay)
+            logger.info(f"等待 {wait_time:.1f} 秒后重试...")
+            await asyncio.sleep(wait_time)
+        
+        return None
+    
+    async def hedged_completion_async(self, messages: List[Dict[str, str]], max_retries: int = 3,
+                                      retry_delay: float = 2.0, **kwargs) -> Optional[Dict[str, Any]]:
+        """带对冲的chat_completion_async
+        
+        超过历史首token延迟分位数（HedgePolicy.hedge_delay）仍未收到任何token时，
+        再发出一个相同的请求（可改用LLM_HEDGE['fallback_model']），先成功返回的一方胜出，
+        另一方取消。未启用对冲、对冲比例已达上限或主请求及时返回时与chat_completion_async相同。
+        """
+        model = kwargs.get('model') or DEEPSEEK_AI['model']
+        delay = self.hedge_policy.hedge_delay(self.api_url, model) if LLM_HEDGE['enabled'] else None
+        
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        first_token_at: Dict[str, float] = {}
+        primary_token = asyncio.Event()
+        
+        def mark_first_token(name: str, event: asyncio.Event = None):
+            def callback():
+                first_token_at.setdefault(name, loop.time())
+                if event is not None:
+                    event.set()
+            return callback
+        
+        # 两个请求都可能生成TL;DR，只推送一次
+        on_tldr = kwargs.pop('on_tldr', None)
+        if on_tldr:
+            tldr_sent = []
+            user_on_tldr = on_tldr
+            
+            def on_tldr(text):
+                if tldr_sent:
+                    return None
+                tldr_sent.append(text)
+                return user_on_tldr(text)
+        
+        primary = asyncio.ensure_future(self.chat_completion_async(
+            messages, max_retries=max_retries, retry_delay=retry_delay, on_tldr=on_tldr,
+            on_first_token=mark_first_token("primary", primary_token), **kwargs))
+        
+        if delay is not None:
+            token_wait = asyncio.ensure_future(primary_token.wait())
+            try:
+                await asyncio.wait({primary, token_wait}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            except BaseException:
+                # 调用方被取消（如超出截止时间）时，asyncio.wait不会取消它等待的任务，需要显式取消主请求
+                primary.cancel()
+                await asyncio.gather(primary, return_exceptions=True)
+                raise
+            finally:
+                token_wait.cancel()
+        
+        if delay is None or primary.done() or primary_token.is_set():
+            response = await primary
+            if response:
+                self.hedge_policy.record(self.api_url, model, first_token_at.get("primary", loop.time()) - start,
+                                         persist=self.record_latency)
+            return response
+        
+        hedge_model = LLM_HEDGE['fallback_model'] or model
+        logger.warning(f"{delay:.1f}秒内未收到首个token，发出对冲请求（模型: {hedge_model}）")
+        hedge_kwargs = dict(kwargs, model=hedge_model)
+        stream_path = kwargs.get('stream_path') or stream_file_path()
+        os.makedirs(os.path.dirname(stream_path) or ".", exist_ok=True)
+        hedge_kwargs['stream_path'] = os.path.splitext(stream_path)[0] + "_hedge.md"
+        hedge = asyncio.ensure_future(self.chat_completion_async(
+            messages, max_retries=max_retries, retry_delay=retry_delay, on_tldr=on_tldr,
+            on_first_token=mark_first_token("hedge"), **hedge_kwargs))
+        
+        tasks = {primary: "primary", hedge: "hedge"}
+        pending = set(tasks)
+        response = None
+        partial = None
+        winner = None
+        try:
+            while pending and response is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.error(f"{tasks[task]}请求异常: {str(e)}")
+                        continue
+                    if result and result.get("partial"):
+                        # 不完整的回复不算胜出，继续等待另一方
+                        logger.warning(f"{tasks[task]}请求的回复不完整")
+                        partial = partial or result
+                    elif result and response is None:
+                        response, winner = result, tasks[task]
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+        
+        if response:
+            logger.info(f"对冲完成，{'对冲请求' if winner == 'hedge' else '主请求'}先返回，"
+                        f"总耗时{loop.time() - start:.1f}秒")
+            self.hedge_policy.record(self.api_url, model, first_token_at.get(winner, loop.time()) - start,
+                                     hedged=True, persist=self.record_latency)
+        return response or partial
+    
+    async def _read_stream(self, response: aiohttp.ClientResponse, stream_path: str,
+                           on_tldr: Optional[Callable[[str], Any]] = None,
+                           on_first_token: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+        """逐行解析SSE响应，增量写入文件，并组装为与非流式相同结构的响应
+        
+        - delta.content追加写入stream_path，delta.reasoning_content写入同名的_reasoning文件
+        - TL;DR部分完整后立即调用on_tldr，不等待完整回复
+        - 连接中断时保留已收到的内容并标记partial（_extract_content视为失败，内容只保留在文件中）；
+          尚未收到任何内容时抛出异常以便重试
+        
+        Returns:
+            {"choices": [{"message": {...}, "finish_reason": ...}], "usage": ..., "partial": bool}
+        """
+        content_parts: List[str] = []
+        reasoning_parts: List[str] = []
+        finish_reason = None
+        usage = None
+        model = None
+        partial = False
+        tldr_sent = False
+        callbacks = []
+        
+        reasoning_path = os.path.splitext(stream_path)[0] + "_reasoning.md"
+        content_file = open(stream_path, 'a', encoding='utf-8')
+        reasoning_file = open(reasoning_path, 'a', encoding='utf-8')
+        logger.info(f"流式接收AI回复，增量写入: {stream_path}")
+        
+        try:
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').strip()
+                # 空行为事件分隔，冒号开头为keep-alive注释
+                if not line or line.startswith(':') or not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    logger.warning(f"无法解析的SSE数据: {data[:100]}")
+                    continue
+                
+                model = chunk.get("model", model)
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or []:
+                    delta = choice.get("delta") or {}
+                    if delta.get("reasoning_content"):
+                        reasoning_parts.append(delta["reasoning_content"])
+                        reasoning_file.write(delta["reasoning_content"])
+                        reasoning_file.flush()
+                    if delta.get("content"):
+                        content_parts.append(delta["content"])
+                        content_file.write(delta["content"])
+                        content_file.flush()
+                    finish_reason = choice.get("finish_reason") or finish_reason
+                
+                if on_first_token and (content_parts or reasoning_parts):
+                    on_first_token()
+                    on_first_token = None
+                
+                if on_tldr and not tldr_sent and content_parts:
+                    tldr = extract_tldr("".join(content_parts))
+                    if tldr:
+                        tldr_sent = True
+                        logger.info("TL;DR已生成，提前推送")
+                        result = on_tldr(tldr)
+                        if asyncio.iscoroutine(result):
+                            callbacks.append(asyncio.ensure_future(result))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not content_parts and not reasoning_parts:
+                raise
+            partial = True
+            logger.warning(f"流式连接中断，保留已接收的内容（{len(''.join(content_parts))}字）: {str(e)}")
+        finally:
+            content_file.close()
+            reasoning_file.close()
+            if callbacks:
+                await asyncio.gather(*callbacks, return_exceptions=True)
+        
+        if finish_reason is None and not partial:
+            partial = True
+            logger.warning("流式响应未正常结束，保留已接收的内容")
+        
+        return {
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": "".join(content_parts),
+                    "reasoning_content": "".join(reasoning_parts)
+                },
+                "finish_reason": finish_reason
+            }],
+            "usage": usage,
+            "partial": partial,
+            "stream_file": stream_path
+        }
+    
     def generate_text(self, prompt: str, max_retries: int = 3, retry_delay: float = 2.0, **kwargs) -> Optional[str]:
         """使用单一提示词生成文本响应
         
@@ -199,10 +603,25 @@ class DeepseekAPI:
         """
         messages = [{"role": "user", "content": prompt}]
         response = self.chat_completion(messages, max_retries=max_retries, retry_delay=retry_delay, **kwargs)
-        
+        return self._extract_content(response)
+    
+    async def generate_text_async(self, prompt: str, max_retries: int = 3, retry_delay: float = 2.0, **kwargs) -> Optional[str]:
+        """generate_text的异步版本"""
+        messages = [{"role": "user", "content": prompt}]
+        response = await self.chat_completion_async(messages, max_retries=max_retries, retry_delay=retry_delay, **kwargs)
+        return self._extract_content(response)
+    
+    def _extract_content(self, response: Optional[Dict[str, Any]]) -> Optional[str]:
+        """保存原始响应并提取回复文本"""
         if response:
             
             self.save_response_to_file(response)
+            self._record_usage(response)
+            
+            if response.get("partial"):
+                # 不完整的回复不能作为建议使用（结构化决策数据缺失），已接收的内容保留在流式文件中供检查
+                logger.error(f"AI回复不完整（流式连接中断），视为调用失败，已接收的内容见: {response.get('stream_file')}")
+                return None
             
             try:
                 content = response["choices"][0]["message"]["content"]
@@ -213,46 +632,116 @@ class DeepseekAPI:
         
         return None
     
-    def generate_investment_advice(self, data_json: str, last_advice: Dict = None, max_retries: int = 3, retry_delay: float = 2.0, **kwargs) -> Optional[str]:
-        """生成加密货币投资建议
+    def _record_usage(self, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """记录本次调用的token用量和提示词前缀缓存命中情况（每次调用的完整用量见遥测日志）
         
-        Args:
-            data_json: 包含历史价格和指标数据的JSON字符串
-            last_advice: 上次生成的建议，JSON格式，可选
-            max_retries: 最大重试次数
-            retry_delay: 重试间隔时间（秒）
-            **kwargs: 传递给generate_text的其他参数
-            
-        Returns:
-            生成的投资建议文本，如果调用失败则返回None
+        兼容DeepSeek（prompt_cache_hit_tokens/prompt_cache_miss_tokens）和
+        OpenAI（prompt_tokens_details.cached_tokens）两种用量字段。
         """
+        usage = response.get("usage")
+        if not usage:
+            return None
+        
+        summary = summarize_usage(usage)
+        summary["model"] = response.get("model")
+        summary["timestamp"] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.last_usage = summary
+        
+        if summary["prompt_tokens"]:
+            logger.info(f"token用量: 提示词{summary['prompt_tokens']}（缓存命中{summary['cached_tokens']}，"
+                        f"{summary['cache_hit_rate']:.0%}），输出{summary['completion_tokens']}"
+                        f"（其中推理{summary['reasoning_tokens']}）")
+        return summary
+    
+    def _build_investment_messages(self, data_json: str, last_advice: Dict = None, kwargs: Dict = None) -> List[Dict[str, str]]:
+        """生成投资建议消息（固定的系统提示词在前，便于服务端前缀缓存），并从kwargs中取出提示词专用参数"""
+        kwargs = kwargs if kwargs is not None else {}
+        
         # 获取当前日期
         current_date = kwargs.pop('current_date', None)
         if not current_date:
             current_date = datetime.now().strftime('%Y-%m-%d')
         
+        analog_context = kwargs.pop('analog_context', "")
+        data_format = kwargs.pop('data_format', "json")
+        
         # 准备提示词参数
         params = prepare_investment_advice_params(current_date, last_advice)
         
-        # 生成提示词
-        prompt = get_investment_advice_template(
+        # 生成消息
+        messages = get_investment_advice_messages(
             current_date=params["current_date"],
             last_position=params["last_position"],
             last_cost_basis=params["last_cost_basis"],
             last_action=params["last_action"],
-            data_json=data_json
+            data_json=data_json,
+            analog_context=analog_context,
+            data_format=data_format
         )
         
-        save_prompt_for_debug(prompt)
+        save_prompt_for_debug("\n\n".join(message["content"] for message in messages))
+        return messages
+    
+    def _response_cache_key(self, messages: List[Dict[str, str]], kwargs: Dict) -> str:
+        """由实际发送的请求体计算回复缓存键"""
+        request_kwargs = {key: value for key, value in kwargs.items() if key not in ('on_tldr', 'stream_path')}
+        return request_key(self._build_payload(messages, **request_kwargs))
+    
+    def _cache_response(self, cache_key: Optional[str], response: Optional[Dict[str, Any]]) -> Optional[str]:
+        """提取回复文本，完整的回复写入缓存"""
+        content = self._extract_content(response)
+        if cache_key and content and not response.get("partial"):
+            self.response_cache.set_content(cache_key, content, response.get("model"), response.get("usage"))
+        return content
+    
+    def generate_investment_advice(self, data_json: str, last_advice: Dict = None, max_retries: int = 3, retry_delay: float = 2.0,
+                                   use_cache: bool = True, **kwargs) -> Optional[str]:
+        """生成加密货币投资建议
         
-        return self.generate_text(prompt, max_retries=max_retries, retry_delay=retry_delay, **kwargs)
+        Args:
+            data_json: 包含历史价格和指标数据的JSON字符串
+            last_advice: 上次生成的建议，JSON格式，可选
+            max_retries: 最大重试次数
+            retry_delay: 重试间隔时间（秒）
+            use_cache: 是否使用回复缓存，为False时总是请求API（结果仍会写入缓存）
+            **kwargs: 传递给chat_completion的其他参数
+            
+        Returns:
+            生成的投资建议文本，如果调用失败则返回None
+        """
+        messages = self._build_investment_messages(data_json, last_advice, kwargs)
+        
+        cache_key = self._response_cache_key(messages, kwargs)
+        if use_cache:
+            cached = self.response_cache.get_content(cache_key)
+            if cached is not None:
+                return cached
+        
+        response = self.chat_completion(messages, max_retries=max_retries, retry_delay=retry_delay, **kwargs)
+        return self._cache_response(cache_key, response)
     
-    def save_investment_record(self, recommendation: str, data_json: str = None, **kwargs) -> Dict[str, Any]:
+    async def generate_investment_advice_async(self, data_json: str, last_advice: Dict = None, max_retries: int = 3, retry_delay: float = 2.0,
+                                               use_cache: bool = True, **kwargs) -> Optional[str]:
+        """generate_investment_advice的异步版本"""
+        messages = self._build_investment_messages(data_json, last_advice, kwargs)
+        
+        cache_key = self._response_cache_key(messages, kwargs)
+        if use_cache:
+            cached = self.response_cache.get_content(cache_key)
+            if cached is not None:
+                return cached
+        
+        response = await self.hedged_completion_async(messages, max_retries=max_retries, retry_delay=retry_delay, **kwargs)
+        return self._cache_response(cache_key, response)
+    
+    def save_investment_record(self, recommendation: str, data_json: str = None, as_of: str = None,
+                               **kwargs) -> Dict[str, Any]:
         """保存投资建议记录，并解析JSON格式的操作摘要
         
         Args:
             recommendation: 生成的投资建议文本
             data_json: 用于生成建议的市场数据，可选
+            as_of: 回放日期（YYYY-MM-DD），指定时作为记录日期，并写入记录ID以免同一秒保存的记录冲突
             **kwargs: 其他元数据
             
         Returns:
@@ -264,7 +753,7 @@ class DeepseekAPI:
         
         # 创建记录ID
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-        record_id = f"BTI-{timestamp}"
+        record_id = f"BTI-{as_of.replace('-', '')}-{timestamp}" if as_of else f"BTI-{timestamp}"
         
         # 解析JSON操作摘要
         advice_data = extract_json_from_text(recommendation) or {}
@@ -273,7 +762,7 @@ class DeepseekAPI:
         record = {
             "id": record_id,
             "timestamp": timestamp,
-            "date": datetime.now().strftime('%Y-%m-%d'),
+            "date": as_of or datetime.now().strftime('%Y-%m-%d'),
             "recommendation": recommendation,
             "advice_data": advice_data,
             "metadata": kwargs
@@ -293,9 +782,19 @@ class DeepseekAPI:
         with open(filepath, 'w', encoding='utf-8') as f:
             json.dump(record, f, ensure_ascii=False, indent=2)
         
+        # 写入索引，查找最新记录和查询仓位历史时不再扫描目录
+        try:
+            self.record_store(records_dir).add(record, filename)
+        except Exception as e:
+            logger.warning(f"写入记录索引出错: {str(e)}")
+        
         logger.info(f"已保存投资建议记录: {filepath}")
         return {"record_id": record_id, "advice_data": advice_data}
     
+    def record_store(self, records_dir: str = None) -> InvestmentRecordStore:
+        """投资建议记录索引（索引文件不存在时由目录中已有的记录重建）"""
+        return InvestmentRecordStore(records_dir or DATA_DIRS['records'])
+    
     def load_investment_record(self, record_id: str, records_dir: str = None) -> Optional[Dict[str, Any]]:
         """加载投资建议记录
         
@@ -308,25 +807,13 @@ class DeepseekAPI:
         """
         if records_dir is None:
             records_dir = DATA_DIRS['records']
-            
-        filepath = os.path.join(records_dir, f"{record_id}.json")
-        
-        if not os.path.exists(filepath):
-            logger.error(f"找不到记录文件: {filepath}")
-            return None
         
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                record = json.load(f)
-            return record
-        except Exception as e:
-            logger.error(f"加载记录失败: {str(e)}")
-            return None
+        return self.record_store(records_dir).get(record_id)
     
     def load_latest_investment_record(self, records_dir: str = None) -> Optional[Dict[str, Any]]:
         """加载最新的投资建议记录
         
-        通过文件名中的时间戳排序，找到最新的记录文件
+        通过记录索引按时间戳查找最新的记录，只读取这一个记录文件
         
         Args:
             records_dir: 记录目录
@@ -334,26 +821,18 @@ class DeepseekAPI:
         Returns:
             最新的记录数据字典和记录ID，如果没有记录则返回None
         """
-        records_dir = DATA_DIRS['records']
+        records_dir = records_dir or DATA_DIRS['records']
             
         if not os.path.exists(records_dir):
             logger.warning(f"记录目录不存在: {records_dir}")
             return None, None
         
-        # 获取所有BTI开头的文件
         try:
-            files = [f for f in os.listdir(records_dir) if f.startswith('BTI-') and f.endswith('.json')]
-            if not files:
+            record, record_id = self.record_store(records_dir).latest()
+            if not record_id:
                 logger.info(f"目录中没有找到投资建议记录: {records_dir}")
                 return None, None
             
-            # 按文件名排序（基于时间戳）
-            files.sort(reverse=True)
-            latest_file = files[0]
-            record_id = latest_file.split('.')[0]  # 去掉.json后缀
-            
-            # 加载记录
-            record = self.load_investment_record(record_id, records_dir)
             if record:
                 logger.info(f"成功加载最新的投资建议记录: {record_id}")
                 return record, record_id
@@ -378,6 +857,43 @@ class DeepseekAPI:
         Returns:
             包含建议内容、记录ID和结构化建议数据的字典
         """
+        last_advice, last_record_id = self._load_last_advice(last_record_id)
+        
+        # 将重试参数传递给generate_investment_advice
+        advice = self.generate_investment_advice(
+            data_json, 
+            last_advice=last_advice, 
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            **kwargs
+        )
+        
+        return self._save_advice_result(advice, data_json, last_record_id, kwargs)
+    
+    async def generate_and_save_investment_advice_async(self, data_json: str, last_record_id: str = None, debug: bool = False, 
+                                                        max_retries: int = 3, retry_delay: float = 2.0, **kwargs) -> Dict[str, Any]:
+        """generate_and_save_investment_advice的异步版本"""
+        last_advice, last_record_id = self._load_last_advice(last_record_id)
+        
+        advice = await self.generate_investment_advice_async(
+            data_json, 
+            last_advice=last_advice, 
+            max_retries=max_retries,
+            retry_delay=retry_delay,
+            **kwargs
+        )
+        
+        return self._save_advice_result(advice, data_json, last_record_id, kwargs)
+    
+    def _load_last_advice(self, last_record_id: str = None):
+        """加载上次建议的结构化数据
+        
+        Args:
+            last_record_id: 上次建议的记录ID，如果不提供，会自动加载最新记录
+            
+        Returns:
+            (上次建议数据, 上次记录ID)
+        """
         # 尝试加载上次建议
         last_advice = None
         
@@ -403,15 +919,10 @@ class DeepseekAPI:
         else:
             logger.info("没有找到上次记录，将生成首次投资建议")
         
-        # 将重试参数传递给generate_investment_advice
-        advice = self.generate_investment_advice(
-            data_json, 
-            last_advice=last_advice, 
-            max_retries=max_retries,
-            retry_delay=retry_delay,
-            **kwargs
-        )
-        
+        return last_advice, last_record_id
+    
+    def _save_advice_result(self, advice: Optional[str], data_json: str, last_record_id: str, kwargs: Dict) -> Dict[str, Any]:
+        """保存投资建议记录并整理返回结果"""
         if not advice:
             logger.error("生成投资建议失败，即使在重试后")
             return {"success": False, "error": "生成投资建议失败，请检查API连接和配置"}
@@ -0,0 +1,250 @@
+"""
+多模型集成模块 - 将同一提示词并发发送给多个模型并汇总结构化建议
+
+成员可以是不同的模型、温度或服务商（任意OpenAI兼容接口），在并发上限内同时请求，
+总耗时约等于最慢的成员而不是所有成员之和。各成员回复中的JSON决策数据
+由extract_json_from_text解析，数值字段（仓位、止损、目标价）取中位数，
+分类字段（决策关键字、市场状态）按多数投票汇总。
+"""
+
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from ai.deepseek import DeepseekAPI, stream_file_path
+from ai.prompt import extract_json_from_text
+from config import AI_ENSEMBLE, DEEPSEEK_AI
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 取中位数的数值字段
+MEDIAN_FIELDS = ("position", "stop_loss", "target_short", "target_mid", "cost_basis")
+# 多数投票的分类字段
+VOTE_FIELDS = ("decision_keyword", "market_state", "action", "market_cycle")
+
+
+def _to_number(value: Any) -> Optional[float]:
+    """将数值或数字字符串（如"85000"、"$85,000"）转换为浮点数，无法转换时返回None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value.replace('$', '').replace(',', '').strip())
+        except ValueError:
+            return None
+    return None
+
+
+def aggregate_advice(advice_list: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总多个成员的结构化建议
+
+    Args:
+        advice_list: 各成员解析出的JSON决策数据
+
+    Returns:
+        以代表成员（投票胜出且仓位最接近中位数）的决策数据为基础，
+        数值字段替换为中位数、分类字段替换为投票结果，另含agreement（各投票字段的一致比例）
+    """
+    if not advice_list:
+        return {}
+
+    aggregated: Dict[str, Any] = {}
+    agreement: Dict[str, float] = {}
+    for field in VOTE_FIELDS:
+        votes = Counter(advice[field] for advice in advice_list if advice.get(field))
+        if votes:
+            winner, count = votes.most_common(1)[0]
+            aggregated[field] = winner
+            agreement[field] = count / len(advice_list)
+
+    for field in MEDIAN_FIELDS:
+        values = [number for number in (_to_number(advice.get(field)) for advice in advice_list) if number is not None]
+        if values:
+            median = float(np.median(values))
+            aggregated[field] = int(median) if field == "position" and median.is_integer() else round(median, 2)
+
+    result = dict(advice_list[representative_index(advice_list, aggregated)])
+    result.update(aggregated)
+    result["agreement"] = agreement
+    return result
+
+
+def representative_index(advice_list: List[Dict[str, Any]], aggregated: Dict[str, Any]) -> int:
+    """代表成员：决策关键字与投票结果一致，且仓位最接近中位数"""
+    candidates = [i for i, advice in enumerate(advice_list)
+                  if advice.get("decision_keyword") == aggregated.get("decision_keyword")] or list(range(len(advice_list)))
+    position = aggregated.get("position")
+    if position is None:
+        return candidates[0]
+    return min(candidates, key=lambda i: abs((_to_number(advice_list[i].get("position")) or 0) - position))
+
+
+class EnsembleRunner:
+    """并发调用多个模型并汇总结果"""
+
+    def __init__(self, members: List[Dict[str, Any]] = None, max_concurrency: int = None):
+        """初始化集成运行器
+
+        Args:
+            members: 成员配置列表，每项包含name、model，可选temperature、api_url、api_key_env，
+                     默认使用AI_ENSEMBLE['members']
+            max_concurrency: 同时进行的请求数上限，默认使用AI_ENSEMBLE['max_concurrency']
+        """
+        self.members = list(members or AI_ENSEMBLE['members'])
+        self.max_concurrency = max_concurrency or AI_ENSEMBLE['max_concurrency']
+        self._clients: Dict[tuple, DeepseekAPI] = {}
+
+    def _client(self, member: Dict[str, Any]) -> DeepseekAPI:
+        """同一服务商（地址和密钥相同）的成员共用一个客户端和连接池"""
+        api_key = os.getenv(member['api_key_env']) if member.get('api_key_env') else None
+        key = (member.get('api_url'), api_key)
+        if key not in self._clients:
+            self._clients[key] = DeepseekAPI(api_key=api_key, api_url=member.get('api_url'))
+        return self._clients[key]
+
+    async def close(self):
+        """关闭所有客户端的连接池"""
+        for client in self._clients.values():
+            await client.close()
+        self._clients = {}
+
+    async def _run_member(self, member: Dict[str, Any], messages: List[Dict[str, str]],
+                          semaphore: asyncio.Semaphore, max_retries: int, retry_delay: float,
+                          kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """调用单个成员，返回内容、解析后的决策数据和耗时"""
+        name = member.get('name') or member['model']
+        request_kwargs = dict(kwargs, model=member['model'])
+        if member.get('temperature') is not None:
+            request_kwargs['temperature'] = member['temperature']
+        if request_kwargs.get('stream', DEEPSEEK_AI['stream']):
+            # 各成员分别写入自己的流式文件
+            request_kwargs['stream_path'] = stream_file_path(f"_{name}")
+
+        result = {"name": name, "model": member['model'], "temperature": member.get('temperature')}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                client = self._client(member)
+                response = await client.chat_completion_async(messages, max_retries=max_retries,
+                                                              retry_delay=retry_delay, **request_kwargs)
+                content = client._extract_content(response)
+            except Exception as e:
+                logger.error(f"集成成员{name}调用出错: {str(e)}")
+                content = None
+            result["latency"] = time.perf_counter() - start
+
+        advice_data = extract_json_from_text(content) if content else None
+        result.update({
+            "status": "success" if advice_data else "error",
+            "content": content,
+            "advice_data": advice_data or {}
+        })
+        if content and not advice_data:
+            result["message"] = "回复中没有可解析的JSON决策数据"
+        logger.info(f"集成成员{name}完成，耗时{result['latency']:.1f}秒，"
+                    f"决策: {result['advice_data'].get('decision_keyword', 'N/A')}")
+        return result
+
+    async def run(self, messages: List[Dict[str, str]], max_retries: int = 2, retry_delay: float = 2.0,
+                  **kwargs) -> Dict[str, Any]:
+        """并发调用全部成员并汇总
+
+        Args:
+            messages: 发送给每个成员的消息列表
+            max_retries: 每个成员的最大重试次数
+            retry_delay: 重试间隔时间（秒）
+            **kwargs: 传递给chat_completion_async的其他参数
+
+        Returns:
+            包含members（各成员结果）、advice_data（汇总结果）、representative（代表成员）和wall_time的字典
+        """
+        # 多个成员的摘要不逐个推送
+        kwargs = {key: value for key, value in kwargs.items() if key not in ('on_tldr', 'stream_path', 'use_cache')}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        logger.info(f"开始集成调用{len(self.members)}个成员，并发上限{self.max_concurrency}")
+
+        start = time.perf_counter()
+        try:
+            members = await asyncio.gather(*[
+                self._run_member(member, messages, semaphore, max_retries, retry_delay, kwargs)
+                for member in self.members
+            ])
+        finally:
+            await self.close()
+        wall_time = time.perf_counter() - start
+
+        succeeded = [member for member in members if member["status"] == "success"]
+        if not succeeded:
+            return {"status": "error", "message": "所有集成成员均未返回有效建议", "members": members,
+                    "wall_time": wall_time}
+
+        advice_list = [member["advice_data"] for member in succeeded]
+        advice_data = aggregate_advice(advice_list)
+        representative = succeeded[representative_index(advice_list, advice_data)]
+
+        logger.info(f"集成调用完成，成功{len(succeeded)}/{len(members)}，总耗时{wall_time:.1f}秒，"
+                    f"成员耗时之和{sum(member['latency'] for member in members):.1f}秒")
+        return {
+            "status": "success",
+            "members": members,
+            "advice_data": advice_data,
+            "representative": representative["name"],
+            "wall_time": wall_time
+        }
+
+
+def format_ensemble_advice(result: Dict[str, Any]) -> str:
+    """将集成结果整理为建议文本：汇总决策、各成员对比，以及代表成员的完整分析
+
+    末尾附带汇总后的JSON决策数据，保存记录时由extract_json_from_text解析，
+    下次建议的仓位和成本基础以汇总结果为准。
+    """
+    advice = result["advice_data"]
+    members = result["members"]
+    agreement = advice.get("agreement", {})
+
+    lines = ["# 【🤝 多模型集成建议】", ""]
+    lines.append(f"- 决策: {advice.get('decision_keyword', 'N/A')}"
+                 f"（{agreement.get('decision_keyword', 0):.0%}成员一致）")
+    lines.append(f"- 市场状态: {advice.get('market_state', 'N/A')}"
+                 f"（{agreement.get('market_state', 0):.0%}成员一致）")
+    lines.append(f"- 目标仓位(中位数): {advice.get('position', 'N/A')}%")
+    lines.append(f"- 止损(中位数): {advice.get('stop_loss', 'N/A')}")
+    lines.append(f"- 短期/中期目标(中位数): {advice.get('target_short', 'N/A')} / {advice.get('target_mid', 'N/A')}")
+    lines.append("")
+    lines.append("| 成员 | 模型 | 温度 | 决策 | 仓位 | 止损 | 耗时 |")
+    lines.append("| --- | --- | --- | --- | --- | --- | --- |")
+    for member in members:
+        data = member["advice_data"]
+        temperature = "默认" if member.get("temperature") is None else member["temperature"]
+        if member["status"] == "success":
+            lines.append(f"| {member['name']} | {member['model']} | {temperature} | {data.get('decision_keyword', 'N/A')} "
+                         f"| {data.get('position', 'N/A')}% | {data.get('stop_loss', 'N/A')} | {member['latency']:.1f}秒 |")
+        else:
+            lines.append(f"| {member['name']} | {member['model']} | {temperature} | 失败 | - | - | {member['latency']:.1f}秒 |")
+    lines.append("")
+    lines.append(f"总耗时{result['wall_time']:.1f}秒（成员耗时之和{sum(member['latency'] for member in members):.1f}秒）")
+    lines.append("")
+
+    representative = next(member for member in members if member["name"] == result["representative"])
+    lines.append(f"## 代表成员（{representative['name']}）完整分析")
+    lines.append("")
+    # 去掉代表成员自己的JSON块，避免与汇总结果冲突
+    content = re.sub(r'```json\s*\{[\s\S]*?\}\s*```', '', representative["content"]).rstrip()
+    lines.append(content)
+    lines.append("")
+    lines.append("## 集成结构化决策数据")
+    lines.append("```json")
+    lines.append(json.dumps(advice, ensure_ascii=False, indent=2))
+    lines.append("```")
+    return "\n".join(lines)
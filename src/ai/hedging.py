@@ -0,0 +1,98 @@
+"""
+对冲请求模块 - 控制推理模型调用的尾部延迟
+
+推理模型偶尔要排队或思考数分钟。如果请求在历史首token延迟的某个分位数（如p90）
+之后仍未收到任何内容，就再发出一个相同的请求（可改用备用模型），
+先完成的一方胜出，另一方取消。对冲比例受预算上限约束，避免在服务整体变慢时成倍增加请求。
+延迟历史按（接口地址, 模型）分别记录，模拟服务或其他服务商的延迟不影响正式接口的对冲时机。
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from config import DATA_DIRS, LLM_HEDGE
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class HedgePolicy:
+    """按接口地址和模型记录首token延迟，计算对冲等待时间并限制对冲比例"""
+
+    def __init__(self, history_file: str = None, percentile: float = None, max_hedge_rate: float = None,
+                 min_samples: int = None, default_delay: float = None, history_size: int = None):
+        """初始化对冲策略，未指定的参数使用LLM_HEDGE配置
+
+        Args:
+            history_file: 延迟历史保存文件，为None时保存在缓存目录
+            percentile: 触发对冲的历史首token延迟分位数
+            max_hedge_rate: 最近调用中允许对冲的最大比例
+            min_samples: 使用分位数前至少需要的样本数，不足时使用default_delay
+            default_delay: 样本不足时的对冲等待时间（秒），为None时样本不足不对冲
+            history_size: 每个（接口地址, 模型）保留的最近样本数
+        """
+        self.history_file = history_file or os.path.join(DATA_DIRS['cache'], 'llm_latency.json')
+        self.percentile = LLM_HEDGE['percentile'] if percentile is None else percentile
+        self.max_hedge_rate = LLM_HEDGE['max_hedge_rate'] if max_hedge_rate is None else max_hedge_rate
+        self.min_samples = LLM_HEDGE['min_samples'] if min_samples is None else min_samples
+        self.default_delay = LLM_HEDGE['default_delay'] if default_delay is None else default_delay
+        self.history_size = history_size or LLM_HEDGE['history_size']
+        self.history: Dict[str, List[Dict[str, Any]]] = self._load()
+
+    def _load(self) -> Dict[str, List[Dict[str, Any]]]:
+        if not os.path.exists(self.history_file):
+            return {}
+        try:
+            with open(self.history_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"加载延迟历史出错: {str(e)}")
+            return {}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.history_file) or ".", exist_ok=True)
+            tmp_path = self.history_file + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.history, f)
+            os.replace(tmp_path, self.history_file)
+        except Exception as e:
+            logger.warning(f"保存延迟历史出错: {str(e)}")
+
+    @staticmethod
+    def _key(api_url: str, model: str) -> str:
+        return f"{model}@{api_url}"
+
+    def hedge_rate(self, api_url: str, model: str) -> float:
+        """最近调用中发生对冲的比例"""
+        samples = self.history.get(self._key(api_url, model), [])
+        if not samples:
+            return 0.0
+        return sum(1 for sample in samples if sample.get("hedged")) / len(samples)
+
+    def hedge_delay(self, api_url: str, model: str) -> Optional[float]:
+        """本次调用的对冲等待时间（秒），不应对冲时返回None"""
+        samples = self.history.get(self._key(api_url, model), [])
+        if self.hedge_rate(api_url, model) >= self.max_hedge_rate:
+            logger.info(f"{model}最近对冲比例已达上限{self.max_hedge_rate:.0%}，本次不对冲")
+            return None
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return float(np.percentile([sample["ttft"] for sample in samples], self.percentile))
+
+    def record(self, api_url: str, model: str, ttft: float, hedged: bool = False, persist: bool = True):
+        """记录一次调用的首token延迟及是否发生对冲
+
+        persist为False时只记录在本实例的内存中：对冲比例上限仍对本实例的调用生效，
+        但样本不写入延迟历史文件，不影响其他运行的对冲时机。
+        """
+        samples = self.history.setdefault(self._key(api_url, model), [])
+        samples.append({"time": int(time.time()), "ttft": round(ttft, 3), "hedged": hedged})
+        del samples[:-self.history_size]
+        if persist:
+            self._save()
@@ -0,0 +1,278 @@
+"""
+本地大模型模拟服务 - OpenAI兼容的chat/completions接口，用于离线测试和压测
+
+不调用真实API即可测试DeepseekAPI的重试、超时、流式接收、对冲和集成逻辑：
+- 支持阻塞（JSON）和SSE流式两种响应，流式时按token速率逐块输出
+- 默认回复为带TL;DR和结构化JSON决策数据的投资建议，也可指定固定回复或按脚本逐次返回
+- 可配置思考时间（首token前的等待）、token速率、推理token数
+- 可按比例注入429限流、5xx错误和流式连接中断
+- 相同的系统提示词再次出现时按前缀缓存命中计入用量
+"""
+
+import json
+import random
+import asyncio
+import hashlib
+import logging
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from aiohttp import web
+
+from ai.prompt import estimate_tokens, split_tokens
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def canned_advice(date: str = None, position: int = 30) -> str:
+    """生成格式与正式回复相同的模拟投资建议（含TL;DR和结构化JSON决策数据）"""
+    date = date or datetime.now().strftime('%Y-%m-%d')
+    advice_data = {
+        "date": date,
+        "market_state": "震荡市",
+        "decision_keyword": "持有",
+        "position": position,
+        "position_change": "维持0%",
+        "action": "持有",
+        "entry_price": "80000-85000",
+        "stop_loss": 72000,
+        "target_short": 95000,
+        "target_mid": 110000,
+        "cost_basis": 82000,
+        "portfolio": {
+            "total_budget": 1000,
+            "current_invested": position * 10,
+            "available_cash": 1000 - position * 10,
+            "operation_amount": 0
+        },
+        "profit_calculation": {
+            "short_term_profit": 47,
+            "mid_term_profit": 102,
+            "short_term_return_pct": "15.9%",
+            "mid_term_return_pct": "34.1%",
+            "portfolio_return_pct": "4.7%"
+        },
+        "market_cycle": "积累期",
+        "risks": ["模拟风险1", "模拟风险2"],
+        "key_levels": ["72000", "85000", "95000"]
+    }
+    return f"""**TL;DR（核心摘要）**：当前市场状态【震荡市】，投资决策【持有】，关键理由：本地模拟服务返回的示例回复，不代表真实分析。
+
+## 一、市场周期分析
+价格在区间内震荡，MVRV处于中性区域，恐惧贪婪指数中性，判断为积累期的震荡市。
+
+## 二、技术指标解读
+1. 价格趋势：区间震荡，支撑72000，阻力95000
+2. 市场估值：MVRV中性，估值合理
+3. 周期阶段：积累期，指标间无明显背离
+
+## 三、操作建议
+维持{position}%仓位，跌破止损位72000时减仓。
+
+## 四、利润计算
+- 短期目标收益：$95000 (+15.9%)
+- 中期目标收益：$110000 (+34.1%)
+
+## 五、风险分析
+1. 模拟风险1：跌破支撑时按止损执行
+2. 模拟风险2：成交量萎缩时降低仓位
+
+## 六、未来观察指标
+1. 价格72000：跌破则减仓
+2. 价格95000：突破则加仓
+3. 恐惧贪婪指数80：超过则分批止盈
+
+## 七、结构化决策数据
+```json
+{json.dumps(advice_data, ensure_ascii=False, indent=2)}
+```
+"""
+
+
+class MockLLMServer:
+    """OpenAI兼容的本地模拟服务"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8000, think_time: float = 1.0,
+                 token_rate: float = 50.0, reasoning_tokens: int = 0, content: str = None,
+                 script: List[Dict[str, Any]] = None, error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 disconnect_rate: float = 0.0, retry_after: int = 1, chunk_tokens: int = 4, seed: int = None):
+        """初始化模拟服务
+
+        Args:
+            host: 监听地址
+            port: 监听端口，0表示自动分配
+            think_time: 收到请求到输出第一个token的等待时间（秒）
+            token_rate: 输出速率（token/秒），为0时不限速
+            reasoning_tokens: 每次回复的推理token数（流式时以reasoning_content先于正文输出）
+            content: 固定的回复正文，默认为canned_advice()
+            script: 按顺序逐次使用的响应脚本，每项可包含status、content、think_time、token_rate、
+                    disconnect（流式输出一半后断开），用完后按常规配置响应
+            error_rate: 返回500错误的比例
+            rate_limit_rate: 返回429限流的比例
+            disconnect_rate: 流式响应中途断开的比例
+            retry_after: 429响应的Retry-After（秒）
+            chunk_tokens: 流式响应每块包含的token数
+            seed: 随机数种子，便于复现错误注入
+        """
+        self.host = host
+        self.port = port
+        self.think_time = think_time
+        self.token_rate = token_rate
+        self.reasoning_tokens = reasoning_tokens
+        self.content = content
+        self.script = deque(script or [])
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.disconnect_rate = disconnect_rate
+        self.retry_after = retry_after
+        self.chunk_tokens = chunk_tokens
+        self.random = random.Random(seed)
+
+        # 各状态的响应次数（ok/429/500/disconnect）
+        self.stats: Counter = Counter()
+        self._seen_prefixes = set()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def api_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+    async def start(self) -> str:
+        """启动服务，返回chat/completions接口地址"""
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self._handle)
+        app.router.add_post('/chat/completions', self._handle)
+        app.router.add_get('/stats', self._handle_stats)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # 端口为0时取实际分配的端口
+        self.port = self._runner.addresses[0][1]
+        logger.info(f"大模型模拟服务已启动: {self.api_url}")
+        return self.api_url
+
+    async def stop(self):
+        """停止服务"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    def _next_step(self) -> Dict[str, Any]:
+        """本次请求的响应方式：优先使用脚本，否则按错误注入比例随机决定"""
+        if self.script:
+            return dict(self.script.popleft())
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            return {"status": 429}
+        if roll < self.rate_limit_rate + self.error_rate:
+            return {"status": 500}
+        return {"status": 200, "disconnect": self.random.random() < self.disconnect_rate}
+
+    def _usage(self, messages: List[Dict[str, Any]], content: str, reasoning_tokens: int) -> Dict[str, Any]:
+        """估算用量；第一条消息（系统提示词）此前出现过时计为前缀缓存命中"""
+        prompt_tokens = sum(estimate_tokens(message.get("content") or "") for message in messages)
+        cached_tokens = 0
+        if messages:
+            prefix = hashlib.sha256((messages[0].get("content") or "").encode('utf-8')).hexdigest()
+            if prefix in self._seen_prefixes:
+                cached_tokens = estimate_tokens(messages[0].get("content") or "")
+            self._seen_prefixes.add(prefix)
+        completion_tokens = estimate_tokens(content) + reasoning_tokens
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_cache_hit_tokens": cached_tokens,
+            "prompt_cache_miss_tokens": prompt_tokens - cached_tokens,
+            "completion_tokens_details": {"reasoning_tokens": reasoning_tokens},
+        }
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(dict(self.stats))
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        step = self._next_step()
+        status = step.get("status", 200)
+
+        if status == 429:
+            self.stats["429"] += 1
+            return web.json_response({"error": {"message": "Rate limit reached (mock)", "type": "rate_limit"}},
+                                     status=429, headers={"Retry-After": str(self.retry_after)})
+        if status != 200:
+            self.stats[str(status)] += 1
+            return web.json_response({"error": {"message": "Injected server error (mock)", "type": "server_error"}},
+                                     status=status)
+
+        content = step.get("content") or self.content or canned_advice()
+        reasoning_tokens = step.get("reasoning_tokens", self.reasoning_tokens)
+        token_rate = step.get("token_rate", self.token_rate)
+        await asyncio.sleep(step.get("think_time", self.think_time))
+
+        usage = self._usage(payload.get("messages", []), content, reasoning_tokens)
+        model = payload.get("model", "mock")
+        if payload.get("stream"):
+            return await self._stream(request, model, content, reasoning_tokens, token_rate, usage,
+                                      step.get("disconnect", False))
+
+        if token_rate:
+            await asyncio.sleep(usage["completion_tokens"] / token_rate)
+        self.stats["ok"] += 1
+        return web.json_response({
+            "id": f"mock-{self.random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(datetime.now().timestamp()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content,
+                            "reasoning_content": "思考中…" * (reasoning_tokens // self.chunk_tokens) or None},
+                "finish_reason": "stop"
+            }],
+            "usage": usage
+        })
+
+    async def _stream(self, request: web.Request, model: str, content: str, reasoning_tokens: int,
+                      token_rate: float, usage: Dict[str, Any], disconnect: bool) -> web.StreamResponse:
+        """以SSE逐块输出推理内容和正文，disconnect为True时输出一半后断开连接"""
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+
+        async def send(data: Dict[str, Any]):
+            await response.write(f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8'))
+
+        def chunk(delta: Dict[str, Any], finish_reason: str = None) -> Dict[str, Any]:
+            return {"object": "chat.completion.chunk", "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+        pieces = split_tokens(content)
+        chunks = [("reasoning_content", "思考中…")] * (reasoning_tokens // self.chunk_tokens)
+        chunks += [("content", "".join(pieces[i:i + self.chunk_tokens]))
+                   for i in range(0, len(pieces), self.chunk_tokens)]
+        cut_at = len(chunks) // 2 if disconnect else None
+
+        for i, (field, text) in enumerate(chunks):
+            if i == cut_at:
+                self.stats["disconnect"] += 1
+                logger.info("模拟流式连接中断")
+                request.transport.close()
+                return response
+            await send(chunk({field: text}))
+            if token_rate:
+                await asyncio.sleep(self.chunk_tokens / token_rate)
+
+        await send(chunk({}, "stop"))
+        await send({"object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage})
+        await response.write(b"data: [DONE]\n\n")
+        self.stats["ok"] += 1
+        return response
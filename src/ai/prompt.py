@@ -8,9 +8,11 @@
 """
 
 import os
+import re
 import json
+import math
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List, Union
 
 # 导入配置
@@ -19,29 +21,19 @@ from config import DATA_DIRS
 # 设置日志
 logger = logging.getLogger(__name__)
 
-def get_investment_advice_template(current_date: str, last_position: int = 0, 
-                                  last_cost_basis: str = "尚未建仓", 
-                                  last_action: str = "首次建仓建议", 
-                                  data_json: str = "", 
-                                  total_budget: float = 1000.0) -> str:
-    """生成投资建议的提示词模板
+def get_investment_advice_system_prompt(total_budget: float = 1000.0) -> str:
+    """生成投资建议的系统提示词（固定部分）
+    
+    角色、分析原则、输出结构和JSON格式说明每次请求都相同，放在消息最前面，
+    使服务端的前缀缓存（prompt caching）能够命中；只依赖总投资预算。
     
     Args:
-        current_date: 当前日期
-        last_position: 上次仓位百分比
-        last_cost_basis: 上次成本基础
-        last_action: 上次操作描述
-        data_json: 市场数据JSON
         total_budget: 总投资预算（美元）
         
     Returns:
-        格式化后的提示词模板
+        系统提示词
     """
-    # 计算当前已投资金额
-    current_invested = (last_position / 100) * total_budget
-    available_cash = total_budget - current_invested
-    
-    return f"""你是我的专业比特币投资顾问，拥有深厚的加密货币市场分析经验和严谨的风险管理能力。请基于当前市场数据({current_date})提供完整的分析和具体可执行的投资建议。
+    return f"""你是我的专业比特币投资顾问，拥有深厚的加密货币市场分析经验和严谨的风险管理能力。我会在消息中提供当前日期、投资组合状态、上次投资建议和历史市场数据，请基于这些数据提供完整的分析和具体可执行的投资建议。
 
 # TL;DR (核心摘要)
 请在开头提供50字以内的核心摘要，包含：
@@ -49,21 +41,11 @@ def get_investment_advice_template(current_date: str, last_position: int = 0,
 - 投资决策：【加仓/减仓/满仓/清仓/持有】
 - 关键理由：【主要支撑原因】
 
-当前投资组合状态:
+投资约束:
 - 总投资预算：${total_budget:.0f}
-- 当前比特币仓位：{last_position}% (已投资${current_invested:.0f})
-- 可用现金：${available_cash:.0f}
-- 当前成本基础: {last_cost_basis}
 - 风险偏好：中等（愿意承担合理波动，但需控制最大回撤不超过30%）
 - 投资周期：中长期（6-18个月）
 
-上次投资建议: {last_action}
-
-请基于以下历史数据分析市场状况，并给出明确的操作建议：
-
-以下是历史市场数据（JSON格式，按日期从旧到新排列）：
-{data_json}
-
 **数据说明**：
 - 数据按时间顺序从旧到新排列，最后一条是最新数据
 - `price`: BTC价格（美元）
@@ -93,18 +75,18 @@ def get_investment_advice_template(current_date: str, last_position: int = 0,
 4. 获利目标：[短期（1-3个月）和中期（3-6个月）的目标价格，达到后的策略]
 
 ## 四、仓位管理追踪与利润计算
-上次建议：{last_action}
+上次建议：[消息中提供的上次投资建议]
 本次建议：[新建议的核心内容，使用标准决策关键字]
-仓位变化：[执行建议后的仓位百分比变化，从{last_position}%变为多少]
+仓位变化：[执行建议后的仓位百分比变化，从当前仓位变为多少]
 
 资金分配：
-- 当前已投资：${current_invested:.0f} ({last_position}%)
+- 当前已投资：$XXX (XX%)
 - 本次操作金额：$XXX
 - 操作后已投资：$XXX (XX%)
 - 剩余可用现金：$XXX
 
 成本基础计算：
-- 当前成本基础：{last_cost_basis}
+- 当前成本基础：[消息中提供的当前成本基础]
 - 新交易价格：$XXX
 - 操作后平均成本：$XXX
 
@@ -128,7 +110,7 @@ def get_investment_advice_template(current_date: str, last_position: int = 0,
 ## 七、结构化决策数据
 ```json
 {{
-  "date": "{current_date}",
+  "date": "当前日期(YYYY-MM-DD)",
   "market_state": "牛市/熊市/震荡市",
   "decision_keyword": "加仓/减仓/满仓/清仓/持有",
   "position": 数字,
@@ -174,6 +156,96 @@ def get_investment_advice_template(current_date: str, last_position: int = 0,
 13. 所有历史数据比较需具体说明数值和时间点
 """
 
+def get_investment_advice_user_prompt(current_date: str, last_position: int = 0, 
+                                      last_cost_basis: str = "尚未建仓", 
+                                      last_action: str = "首次建仓建议", 
+                                      data_json: str = "", 
+                                      total_budget: float = 1000.0,
+                                      analog_context: str = "",
+                                      data_format: str = "json") -> str:
+    """生成投资建议的用户消息（每次请求变化的部分：日期、仓位和市场数据）
+    
+    参数同get_investment_advice_template
+    
+    Returns:
+        用户消息文本
+    """
+    # 计算当前已投资金额
+    current_invested = (last_position / 100) * total_budget
+    available_cash = total_budget - current_invested
+    
+    data_description = DATA_FORMAT_DESCRIPTIONS.get(data_format, DATA_FORMAT_DESCRIPTIONS["json"])
+    
+    analog_section = ""
+    if analog_context:
+        analog_section = f"""
+以下是与当前市场状态（MVRV、恐惧贪婪指数、30日涨跌幅、30日波动率）最相似的历史日期及其后续价格表现，仅作参考：
+{analog_context}
+"""
+    
+    return f"""当前日期: {current_date}
+
+当前投资组合状态:
+- 总投资预算：${total_budget:.0f}
+- 当前比特币仓位：{last_position}% (已投资${current_invested:.0f})
+- 可用现金：${available_cash:.0f}
+- 当前成本基础: {last_cost_basis}
+
+上次投资建议: {last_action}
+
+{data_description}
+{data_json}
+{analog_section}
+请基于以上数据({current_date})，按照要求的结构提供完整的分析和具体可执行的投资建议。
+"""
+
+def get_investment_advice_messages(current_date: str, last_position: int = 0, 
+                                   last_cost_basis: str = "尚未建仓", 
+                                   last_action: str = "首次建仓建议", 
+                                   data_json: str = "", 
+                                   total_budget: float = 1000.0,
+                                   analog_context: str = "",
+                                   data_format: str = "json") -> List[Dict[str, str]]:
+    """生成投资建议的消息列表：固定的系统提示词在前，变化的日期、仓位和市场数据在后
+    
+    参数同get_investment_advice_template
+    
+    Returns:
+        [{"role": "system", ...}, {"role": "user", ...}]
+    """
+    return [
+        {"role": "system", "content": get_investment_advice_system_prompt(total_budget)},
+        {"role": "user", "content": get_investment_advice_user_prompt(
+            current_date, last_position, last_cost_basis, last_action, data_json,
+            total_budget, analog_context, data_format)}
+    ]
+
+def get_investment_advice_template(current_date: str, last_position: int = 0, 
+                                  last_cost_basis: str = "尚未建仓", 
+                                  last_action: str = "首次建仓建议", 
+                                  data_json: str = "", 
+                                  total_budget: float = 1000.0,
+                                  analog_context: str = "",
+                                  data_format: str = "json") -> str:
+    """生成投资建议的完整提示词文本（系统提示词 + 用户消息），用于调试保存和token估算
+    
+    Args:
+        current_date: 当前日期
+        last_position: 上次仓位百分比
+        last_cost_basis: 上次成本基础
+        last_action: 上次操作描述
+        data_json: 市场数据文本（encode_market_data的输出）
+        total_budget: 总投资预算（美元）
+        analog_context: 历史相似行情及其后续表现（AnalogFinder.format_analogs的输出），可选
+        data_format: 市场数据格式，"json"或"csv"
+        
+    Returns:
+        格式化后的提示词文本
+    """
+    messages = get_investment_advice_messages(current_date, last_position, last_cost_basis, last_action,
+                                              data_json, total_budget, analog_context, data_format)
+    return "\n\n".join(message["content"] for message in messages)
+
 def prepare_investment_advice_params(current_date: Optional[str] = None, 
                                    last_advice: Optional[Dict] = None,
                                    total_budget: float = 1000.0) -> Dict[str, Any]:
@@ -306,4 +378,200 @@ def extract_json_from_text(text: str) -> Optional[Dict]:
         return json.loads(json_str)
     except json.JSONDecodeError as e:
         logger.error(f"解析JSON失败: {str(e)}")
-        return None 
\ No newline at end of file
+        return None 
+
+def extract_tldr(text: str) -> Optional[str]:
+    """从（可能仍在生成中的）回复文本中提取TL;DR核心摘要
+    
+    只有摘要之后已经出现下一个标题（#开头）、分隔线或加粗的章节标题时，
+    才认为摘要已完整，用于流式接收时提前推送。
+    
+    Args:
+        text: 回复文本
+        
+    Returns:
+        摘要文本，摘要尚未完整或不存在时返回None
+    """
+    import re
+    
+    marker = re.search(r'TL;?DR', text, re.IGNORECASE)
+    if not marker:
+        return None
+    
+    line_end = text.find('\n', marker.end())
+    if line_end < 0:
+        return None
+    
+    next_section = re.compile(r'^\s*(#|---|\*\*[一二三四五六七八九十]+、)', re.MULTILINE).search(text, line_end + 1)
+    if not next_section:
+        return None
+    
+    summary = text[marker.end():next_section.start()]
+    summary = re.sub(r'^\s*\**\s*[（(]核心摘要[)）]', '', summary)
+    summary = summary.lstrip('*:： \n').strip()
+    return summary or None
+
+# 提示词中各数据字段保留的小数位数（未列出的数值字段保留4位）
+MARKET_DATA_PRECISION = {
+    "price": 0,
+    "mvrv": 3,
+    "fear_greed_value": 0,
+}
+
+# 周线汇总时各字段的聚合方式：price展开为收盘/最低/最高价，mean为周均值，其余取周末值
+WEEKLY_AGGREGATION = {
+    "fear_greed_value": "mean",
+}
+
+# 不同数据格式在提示词中的说明
+DATA_FORMAT_DESCRIPTIONS = {
+    "json": "以下是历史市场数据（JSON格式，按日期从旧到新排列）：",
+    "csv": "以下是历史市场数据（CSV格式，首行为列名，按日期从旧到新排列；较早的数据按周汇总，"
+           "week为周起始日，close/low/high为周收盘价/最低价/最高价，fear_greed_value为周均值，其余指标为周末值；"
+           "最近的数据为逐日数据，空值表示当日缺失）：",
+}
+
+
+def _format_number(value: Any, digits: int) -> str:
+    """按精度格式化数值，去掉多余的0"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    text = f"{float(value):.{digits}f}"
+    if digits > 0:
+        text = text.rstrip('0').rstrip('.')
+    return text
+
+
+def _data_fields(rows: List[Dict[str, Any]]) -> List[str]:
+    """数据中出现过的数值字段，已知字段在前"""
+    present = []
+    for row in rows:
+        for key, value in row.items():
+            if key != "date" and key not in present and isinstance(value, (int, float)) and not isinstance(value, bool):
+                present.append(key)
+    known = [key for key in MARKET_DATA_PRECISION if key in present]
+    return known + [key for key in present if key not in MARKET_DATA_PRECISION]
+
+
+def _weekly_rows(rows: List[Dict[str, Any]], fields: List[str]) -> List[List[Any]]:
+    """按自然周（周一起始）汇总日线数据"""
+    weeks: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        day = datetime.strptime(row["date"], '%Y-%m-%d')
+        week_start = (day - timedelta(days=day.weekday())).strftime('%Y-%m-%d')
+        weeks.setdefault(week_start, []).append(row)
+
+    result = []
+    for week_start in sorted(weeks):
+        week = weeks[week_start]
+        line = [week_start]
+        for field in fields:
+            values = [row[field] for row in week if row.get(field) is not None]
+            digits = MARKET_DATA_PRECISION.get(field, 4)
+            if field == "price":
+                line += [_format_number(values[-1], digits) if values else "",
+                         _format_number(min(values), digits) if values else "",
+                         _format_number(max(values), digits) if values else ""]
+            elif WEEKLY_AGGREGATION.get(field) == "mean":
+                line.append(_format_number(sum(values) / len(values), digits) if values else "")
+            else:
+                line.append(_format_number(values[-1], digits) if values else "")
+        result.append(line)
+    return result
+
+
+def encode_market_data(rows: List[Dict[str, Any]], fmt: str = "csv", daily_days: int = 60) -> str:
+    """将按日期整合的市场数据编码为提示词文本
+
+    csv格式每个字段名只出现一次，数值按MARKET_DATA_PRECISION取整，
+    最近daily_days天保留逐日数据，更早的数据按周汇总，同样的token预算可以容纳更长的历史。
+
+    Args:
+        rows: 按日期整合的数据列表（包含date字段）
+        fmt: "csv"为紧凑格式，"json"为原始JSON
+        daily_days: 保留逐日数据的天数，为None时全部逐日输出
+
+    Returns:
+        编码后的数据文本
+    """
+    if fmt == "json":
+        return json.dumps(rows, ensure_ascii=False)
+    if fmt != "csv":
+        raise ValueError(f"不支持的数据格式: {fmt}")
+
+    rows = sorted((row for row in rows if row.get("date")), key=lambda row: row["date"])
+    if not rows:
+        return ""
+
+    fields = _data_fields(rows)
+    daily = rows
+    weekly = []
+    if daily_days is not None and len(rows) > daily_days:
+        cutoff = (datetime.strptime(rows[-1]["date"], '%Y-%m-%d') - timedelta(days=daily_days - 1)).strftime('%Y-%m-%d')
+        weekly = [row for row in rows if row["date"] < cutoff]
+        daily = [row for row in rows if row["date"] >= cutoff]
+
+    lines = []
+    if weekly:
+        weekly_header = ["week"] + [column for field in fields
+                                    for column in (["close", "low", "high"] if field == "price" else [field])]
+        lines.append(f"# 周线汇总（{weekly[0]['date']} ~ {weekly[-1]['date']}）")
+        lines.append(",".join(weekly_header))
+        lines += [",".join(line) for line in _weekly_rows(weekly, fields)]
+        lines.append(f"# 日线（{daily[0]['date']} ~ {daily[-1]['date']}）")
+
+    lines.append(",".join(["date"] + fields))
+    for row in daily:
+        lines.append(",".join([row["date"]] + [_format_number(row.get(field), MARKET_DATA_PRECISION.get(field, 4))
+                                               for field in fields]))
+    return "\n".join(lines)
+
+
+_TOKEN_PATTERN = re.compile(r'[一-鿿]|[0-9]+|[A-Za-z]+|\s+|.', re.DOTALL)
+
+
+def split_tokens(text: str) -> List[str]:
+    """将文本切分为估算token时使用的片段（单个汉字、连续数字、英文单词、空白或单个符号），拼接后与原文相同"""
+    return _TOKEN_PATTERN.findall(text)
+
+
+def estimate_tokens(text: str) -> int:
+    """离线估算文本的token数（近似DeepSeek分词器，误差约±15%）
+
+    汉字约0.6个token，连续数字每3位1个token，英文单词每4个字母1个token，
+    换行1个token，其余空白并入相邻token，标点符号各1个token。
+    """
+    tokens = 0.0
+    for piece in split_tokens(text):
+        first = piece[0]
+        if '一' <= first <= '鿿':
+            tokens += 0.6
+        elif first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isascii() and first.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif first.isspace():
+            tokens += piece.count('\n')
+        else:
+            tokens += 1
+    return int(math.ceil(tokens))
+
+
+def compare_encodings(rows: List[Dict[str, Any]], fmt: str = "csv", daily_days: int = 60) -> Dict[str, Any]:
+    """比较紧凑格式与原始JSON的token数
+
+    Returns:
+        包含json_tokens、encoded_tokens、saved_tokens和saved_pct的字典
+    """
+    json_tokens = estimate_tokens(encode_market_data(rows, "json"))
+    encoded_tokens = estimate_tokens(encode_market_data(rows, fmt, daily_days))
+    saved = json_tokens - encoded_tokens
+    return {
+        "format": fmt,
+        "json_tokens": json_tokens,
+        "encoded_tokens": encoded_tokens,
+        "saved_tokens": saved,
+        "saved_pct": saved / json_tokens * 100 if json_tokens else 0.0
+    }
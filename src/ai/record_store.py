@@ -0,0 +1,195 @@
+"""
+投资建议记录索引模块 - 为investment_records目录建立SQLite索引
+
+每条记录仍以BTI-时间戳.json单独保存（完整建议文本），同时把记录ID、日期和
+解析出的advice_data关键字段写入同目录下的index.sqlite。查找最新记录、
+按日期范围查询、查看仓位/成本基础变化都走索引，不再扫描整个目录、逐个打开文件。
+"""
+
+import os
+import json
+import sqlite3
+import logging
+from contextlib import closing
+from typing import Dict, Any, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.sqlite"
+
+# 从advice_data中索引的字段: 列名 -> 类型
+INDEXED_FIELDS = {
+    "decision_keyword": "TEXT",
+    "market_state": "TEXT",
+    "action": "TEXT",
+    "position": "REAL",
+    "cost_basis": "REAL",
+    "stop_loss": "REAL",
+    "target_short": "REAL",
+    "target_mid": "REAL",
+}
+
+
+def _to_real(value: Any) -> Optional[float]:
+    """数值或数字字符串转换为浮点数，"尚未建仓"等非数值返回None"""
+    if isinstance(value, bool) or value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace('$', '').replace(',', '').replace('%', '').strip())
+    except ValueError:
+        return None
+
+
+class InvestmentRecordStore:
+    """投资建议记录的SQLite索引"""
+
+    def __init__(self, records_dir: str):
+        """初始化索引，索引文件不存在时由目录中已有的记录重建
+
+        Args:
+            records_dir: 记录目录
+        """
+        self.records_dir = records_dir
+        self.index_path = os.path.join(records_dir, INDEX_FILE)
+        os.makedirs(records_dir, exist_ok=True)
+
+        is_new = not os.path.exists(self.index_path)
+        self._create_schema()
+        if is_new:
+            self.rebuild()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.index_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _create_schema(self):
+        columns = ",\n".join(f"{name} {kind}" for name, kind in INDEXED_FIELDS.items())
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS records (
+                    id TEXT PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    {columns},
+                    advice_data TEXT,
+                    path TEXT NOT NULL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_records_timestamp ON records(timestamp)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_records_date ON records(date)")
+
+    def _row(self, record: Dict[str, Any], path: str) -> Tuple:
+        advice_data = record.get("advice_data") or {}
+        values = [advice_data.get(name) if kind == "TEXT" else _to_real(advice_data.get(name))
+                  for name, kind in INDEXED_FIELDS.items()]
+        return (record["id"], record["timestamp"], record["date"], *values,
+                json.dumps(advice_data, ensure_ascii=False), path)
+
+    def add(self, record: Dict[str, Any], path: str):
+        """索引一条已保存的记录（相同ID覆盖）"""
+        placeholders = ", ".join("?" * (len(INDEXED_FIELDS) + 5))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(f"INSERT OR REPLACE INTO records VALUES ({placeholders})", self._row(record, path))
+
+    def rebuild(self) -> int:
+        """扫描目录重建索引，返回索引的记录数"""
+        rows = []
+        for filename in sorted(os.listdir(self.records_dir)):
+            if not (filename.startswith('BTI-') and filename.endswith('.json')):
+                continue
+            path = os.path.join(self.records_dir, filename)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+                rows.append(self._row(record, filename))
+            except Exception as e:
+                logger.warning(f"索引记录{filename}出错: {str(e)}")
+
+        placeholders = ", ".join("?" * (len(INDEXED_FIELDS) + 5))
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM records")
+            conn.executemany(f"INSERT OR REPLACE INTO records VALUES ({placeholders})", rows)
+        logger.info(f"已重建投资建议记录索引，共{len(rows)}条")
+        return len(rows)
+
+    def _load_file(self, path: str) -> Optional[Dict[str, Any]]:
+        filepath = path if os.path.isabs(path) else os.path.join(self.records_dir, path)
+        if not os.path.exists(filepath):
+            logger.error(f"找不到记录文件: {filepath}")
+            return None
+        try:
+            with open(filepath, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"加载记录失败: {str(e)}")
+            return None
+
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """按记录ID加载完整记录"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT path FROM records WHERE id = ?", (record_id,)).fetchone()
+        return self._load_file(row["path"] if row else f"{record_id}.json")
+
+    def latest_id(self) -> Optional[str]:
+        """最新记录的ID"""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id FROM records ORDER BY timestamp DESC LIMIT 1").fetchone()
+        return row["id"] if row else None
+
+    def latest(self) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """最新的完整记录和记录ID"""
+        record_id = self.latest_id()
+        if not record_id:
+            return None, None
+        record = self.get(record_id)
+        return (record, record_id) if record else (None, None)
+
+    def query(self, start_date: str = None, end_date: str = None, limit: int = None) -> List[Dict[str, Any]]:
+        """按日期范围查询索引字段（按时间升序，不读取记录文件）
+
+        Args:
+            start_date: 起始日期（含），YYYY-MM-DD
+            end_date: 结束日期（含），YYYY-MM-DD
+            limit: 只返回最近的条数
+
+        Returns:
+            包含id、timestamp、date、索引字段和advice_data的字典列表
+        """
+        conditions, params = [], []
+        if start_date:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        sql = f"SELECT * FROM records {where} ORDER BY timestamp DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(sql, params).fetchall()
+
+        result = []
+        for row in reversed(rows):
+            item = {key: row[key] for key in row.keys() if key != "path"}
+            item["advice_data"] = json.loads(item["advice_data"] or "{}")
+            result.append(item)
+        return result
+
+    def position_history(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
+        """仓位和成本基础随时间的变化（每天取当天最后一条记录）"""
+        latest_per_day: Dict[str, Dict[str, Any]] = {}
+        for item in self.query(start_date, end_date):
+            latest_per_day[item["date"]] = {
+                "date": item["date"],
+                "id": item["id"],
+                "decision_keyword": item["decision_keyword"],
+                "position": item["position"],
+                "cost_basis": item["cost_basis"],
+            }
+        return list(latest_per_day.values())
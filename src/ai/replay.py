@@ -0,0 +1,214 @@
+"""
+历史回放模块 - 按历史日期批量重新生成AI建议（as-of模式）
+
+每个回放日期的提示词只使用截至当天的数据（DeepseekAdvisor._prepare_data_for_ai的as_of），
+提示词中的日期为回放日期，上次仓位和成本基础来自同一版本前一个回放日期的建议，
+用于比较不同提示词、模型或温度在同一段行情中的决策。
+
+- 每个版本（variant）的记录保存在replays/<回放名称>/<版本名称>/，由InvestmentRecordStore索引
+- 索引同时作为检查点：重新运行同一回放时跳过已完成的日期，从中断处继续
+- AI调用遥测写入replays/<回放名称>/llm_calls.jsonl，与日常运行的遥测日志分开
+- 串联仓位时同一版本的日期按顺序执行，不同版本并发；不串联时所有日期并发，并发数受上限约束
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from ai.advisor import DeepseekAdvisor, MarketData
+from ai.record_store import InvestmentRecordStore
+from ai.telemetry import LLMTelemetry
+from config import AI_REPLAY, DATA_DIRS, DEEPSEEK_AI
+from utils.data_reorganizer import load_daily_data
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def replay_dates(start_date: str, end_date: str, step_days: int = 1, available: List[str] = None) -> List[str]:
+    """起止日期（含）之间每隔step_days天的日期，指定available时只保留有数据的日期"""
+    day = datetime.strptime(start_date, '%Y-%m-%d')
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    dates = []
+    while day <= end:
+        dates.append(day.strftime('%Y-%m-%d'))
+        day += timedelta(days=step_days)
+    if available is not None:
+        available = set(available)
+        dates = [date for date in dates if date in available]
+    return dates
+
+
+class ReplayRunner:
+    """按历史日期批量重新生成AI建议，支持断点续跑"""
+
+    def __init__(self, data: MarketData, start_date: str, end_date: str, name: str = None,
+                 variants: List[Dict[str, Any]] = None, step_days: int = None, max_concurrency: int = None,
+                 chain: bool = True, months: int = None, use_cache: bool = True,
+                 max_retries: int = 2, retry_delay: float = 2.0):
+        """初始化回放
+
+        Args:
+            data: 按日期整合的历史数据列表，或整合后的数据文件路径（只读取一次，所有日期和版本共用）
+            start_date: 回放起始日期（含），YYYY-MM-DD
+            end_date: 回放结束日期（含），YYYY-MM-DD
+            name: 回放名称（记录目录名），默认由起止日期生成
+            variants: 版本配置列表，默认使用AI_REPLAY['variants']
+            step_days: 回放日期间隔天数，默认使用AI_REPLAY['step_days']
+            max_concurrency: 同时进行的请求数上限，默认使用AI_REPLAY['max_concurrency']
+            chain: 是否将前一个回放日期的仓位和成本基础带入下一个日期
+            months: 每个日期提供给AI的历史数据月数，默认使用DEEPSEEK_AI['prompt_months']
+            use_cache: 是否使用AI回复缓存
+            max_retries: 每次请求的最大重试次数
+            retry_delay: 重试间隔时间（秒）
+        """
+        self.rows = load_daily_data(data) if isinstance(data, str) else list(data)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.name = name or f"{start_date}_{end_date}"
+        self.variants = list(variants or AI_REPLAY['variants'])
+        self.step_days = step_days or AI_REPLAY['step_days']
+        self.max_concurrency = max_concurrency or AI_REPLAY['max_concurrency']
+        self.chain = chain
+        self.months = months or DEEPSEEK_AI['prompt_months']
+        self.use_cache = use_cache
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.replay_dir = os.path.join(DATA_DIRS['replays'], self.name)
+
+    def records_dir(self, variant: Dict[str, Any]) -> str:
+        return os.path.join(self.replay_dir, variant['name'])
+
+    def _available_dates(self) -> List[str]:
+        """历史数据中有数据的日期"""
+        return [row['date'] for row in self.rows]
+
+    def _advisor(self, variant: Dict[str, Any]) -> DeepseekAdvisor:
+        api_key = os.getenv(variant['api_key_env']) if variant.get('api_key_env') else None
+        advisor = DeepseekAdvisor(api_key=api_key, api_url=variant.get('api_url'))
+        # 回放的批量请求不写入对冲延迟历史文件，以免影响正式运行的对冲时机（对冲比例上限仍按本次回放的调用计算）
+        advisor.api.record_latency = False
+        # 遥测写入本次回放目录，不混入日常运行的延迟和费用统计
+        advisor.api.telemetry = LLMTelemetry(os.path.join(self.replay_dir, 'llm_calls.jsonl'))
+        return advisor
+
+    async def _run_date(self, advisor: DeepseekAdvisor, variant: Dict[str, Any], date: str,
+                        last_advice: Optional[Dict[str, Any]], semaphore: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+        """生成并保存一个回放日期的建议，返回结构化决策数据，失败时返回None"""
+        # 回放不需要提前推送摘要，使用非流式请求
+        kwargs = {'current_date': date, 'stream': False}
+        if variant.get('model'):
+            kwargs['model'] = variant['model']
+        if variant.get('temperature') is not None:
+            kwargs['temperature'] = variant['temperature']
+
+        # 数据准备（按日期过滤、检索相似行情、token预算）在线程中执行，不阻塞其他版本的请求
+        loop = asyncio.get_running_loop()
+        data_json = await loop.run_in_executor(None, advisor._prepare_request, self.rows, self.months, kwargs)
+        if data_json is None:
+            return None
+
+        async with semaphore:
+            advice = await advisor.api.generate_investment_advice_async(
+                data_json, last_advice=last_advice, max_retries=self.max_retries, retry_delay=self.retry_delay,
+                use_cache=self.use_cache, **kwargs)
+        if not advice:
+            return None
+
+        result = advisor.api.save_investment_record(advice, as_of=date, records_dir=self.records_dir(variant),
+                                                    replay=self.name, variant=variant)
+        logger.info(f"回放{variant['name']} {date}: {result['advice_data'].get('decision_keyword', 'N/A')}，"
+                    f"仓位{result['advice_data'].get('position', 'N/A')}%")
+        return result["advice_data"]
+
+    async def _run_variant(self, variant: Dict[str, Any], dates: List[str],
+                           semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """回放一个版本：跳过已有记录的日期，串联模式下按顺序执行，遇到失败即停止（下次从该日期继续）"""
+        store = InvestmentRecordStore(self.records_dir(variant))
+        done = {row["date"]: row["advice_data"] for row in store.query(end_date=self.end_date)}
+        pending = [date for date in dates if date not in done]
+        summary = {"name": variant['name'], "total": len(dates), "resumed": len(dates) - len(pending),
+                   "completed": 0, "failed": []}
+        if not pending:
+            return summary
+
+        advisor = self._advisor(variant)
+        try:
+            if self.chain:
+                # 起点仓位：本回放中早于第一个待执行日期的最近一条记录
+                earlier = [date for date in done if date < pending[0]]
+                last_advice = done[max(earlier)] if earlier else None
+                for date in dates:
+                    if date in done:
+                        last_advice = done[date]
+                        continue
+                    advice_data = await self._run_date(advisor, variant, date, last_advice, semaphore)
+                    if advice_data is None:
+                        summary["failed"].append(date)
+                        logger.error(f"回放{variant['name']}在{date}失败，停止串联，重新运行时从该日期继续")
+                        break
+                    summary["completed"] += 1
+                    last_advice = advice_data
+            else:
+                results = await asyncio.gather(*[
+                    self._run_date(advisor, variant, date, None, semaphore) for date in pending
+                ])
+                summary["completed"] = sum(1 for result in results if result is not None)
+                summary["failed"] = [date for date, result in zip(pending, results) if result is None]
+        finally:
+            await advisor.api.close()
+        return summary
+
+    async def run(self) -> Dict[str, Any]:
+        """执行回放
+
+        Returns:
+            包含dates、variants（各版本的完成/续跑/失败统计）和history（各版本每个日期的决策和仓位）的字典
+        """
+        dates = replay_dates(self.start_date, self.end_date, self.step_days, self._available_dates())
+        if not dates:
+            return {"status": "error", "message": f"{self.start_date}至{self.end_date}之间没有可回放的数据"}
+
+        logger.info(f"开始回放{self.name}: {len(dates)}个日期 × {len(self.variants)}个版本，"
+                    f"并发上限{self.max_concurrency}，{'串联' if self.chain else '不串联'}仓位")
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        variants = await asyncio.gather(*[self._run_variant(variant, dates, semaphore) for variant in self.variants])
+
+        history = {variant['name']: InvestmentRecordStore(self.records_dir(variant)).position_history(
+                       self.start_date, self.end_date) for variant in self.variants}
+        return {
+            "status": "success",
+            "name": self.name,
+            "dates": dates,
+            "variants": variants,
+            "history": history,
+            "replay_dir": self.replay_dir
+        }
+
+
+def format_replay_summary(result: Dict[str, Any]) -> str:
+    """将回放结果整理为文本：各版本的完成情况，以及每个日期各版本的决策和仓位对比"""
+    names = [variant["name"] for variant in result["variants"]]
+    lines = [f"=============== 历史回放 {result['name']} ===============", ""]
+    for variant in result["variants"]:
+        failed = f"，失败: {', '.join(variant['failed'])}" if variant["failed"] else ""
+        lines.append(f"{variant['name']}: 共{variant['total']}个日期，本次完成{variant['completed']}，"
+                     f"此前已完成{variant['resumed']}{failed}")
+    lines.append("")
+
+    by_date = {name: {row["date"]: row for row in result["history"].get(name, [])} for name in names}
+    lines.append("日期        " + "".join(f"{name:>20}" for name in names))
+    for date in result["dates"]:
+        cells = []
+        for name in names:
+            row = by_date[name].get(date)
+            if row and row["position"] is not None:
+                cells.append(f"{row['decision_keyword'] or '-'} {row['position']:g}%")
+            else:
+                cells.append(row["decision_keyword"] or "-" if row else "-")
+        lines.append(f"{date}  " + "".join(f"{cell:>20}" for cell in cells))
+    lines.append("")
+    lines.append(f"记录目录: {result['replay_dir']}")
+    return "\n".join(lines)
@@ -0,0 +1,86 @@
+"""
+AI响应缓存模块 - 按请求内容寻址缓存大模型的回复
+
+同一天用相同的daily_data.json和上次记录重复运行时，发送给DeepSeek的提示词完全相同，
+推理模型却要再思考数分钟并重新计费。本模块以"模型 + 请求参数 + 完整提示词"的
+SHA-256指纹作为键，在磁盘上缓存回复文本，带过期时间和条目数上限，
+相同请求直接从磁盘返回。
+"""
+
+import os
+import copy
+import time
+import logging
+from typing import Dict, Any, Optional
+
+from utils.analysis_cache import AnalysisCache, fingerprint
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 缓存条目格式变化时递增，使旧缓存失效
+RESPONSE_CACHE_VERSION = 1
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """由请求体计算缓存键（stream和stream_options只影响传输方式，不参与计算）"""
+    payload = {key: value for key, value in payload.items() if key not in ("stream", "stream_options")}
+    return fingerprint(RESPONSE_CACHE_VERSION, payload)
+
+
+class ResponseCache(AnalysisCache):
+    """带过期时间的AI回复缓存（内存LRU + 磁盘，按最近访问时间淘汰）"""
+
+    def __init__(self, cache_dir: str = "cache/llm", ttl: float = 24 * 60 * 60,
+                 max_memory_entries: int = 8, max_disk_entries: int = 64):
+        """初始化缓存
+
+        Args:
+            cache_dir: 磁盘缓存目录
+            ttl: 缓存有效期（秒），为0或None时不过期
+            max_memory_entries: 内存中保留的最大条目数
+            max_disk_entries: 磁盘上保留的最大条目数
+        """
+        super().__init__(cache_dir, max_memory_entries, max_disk_entries)
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存，过期的条目删除后视为未命中"""
+        value = self._lookup(key)
+        if value is not None and self.ttl and time.time() - value.get("created_at", 0) > self.ttl:
+            self.invalidate(key)
+            logger.info(f"AI回复缓存已过期: {key[:12]}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def invalidate(self, key: str):
+        """删除指定条目"""
+        self._memory.pop(key, None)
+        if self.cache_dir:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def get_content(self, key: str) -> Optional[str]:
+        """读取缓存的回复文本"""
+        value = self.get(key)
+        if value is None:
+            return None
+        logger.info(f"AI回复缓存命中: {key[:12]}（{value.get('model', '')}，"
+                    f"生成于{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(value.get('created_at', 0)))}）")
+        return value.get("content")
+
+    def set_content(self, key: str, content: str, model: str = None, usage: Dict[str, Any] = None):
+        """写入回复文本"""
+        self.set(key, {
+            "content": content,
+            "model": model,
+            "usage": usage or {},
+            "created_at": time.time()
+        })
@@ -0,0 +1,208 @@
+"""
+AI调用遥测模块 - 记录每次大模型请求的延迟、token用量、重试次数和费用
+
+每次请求追加一行紧凑JSON到遥测日志（只追加、不改写），字段包括：
+开始时间、接口地址、首字节/首token/结束相对开始的秒数、HTTP状态码、重试次数、
+提示词/输出/推理/缓存命中token数和按LLM_PRICING估算的费用。
+summarize按天或按周汇总延迟、token和费用的分位数，观察其随时间和提示词规模的变化。
+load可按接口地址过滤，模拟服务、其他服务商的调用不混入正式接口的统计；历史回放写入各自回放目录下的日志。
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from config import DATA_DIRS, LLM_PRICING
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def summarize_usage(usage: Dict[str, Any]) -> Dict[str, Any]:
+    """统一不同服务商的token用量字段
+
+    Returns:
+        包含prompt_tokens、completion_tokens、reasoning_tokens、cached_tokens、cache_hit_rate的字典
+    """
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    if "prompt_cache_hit_tokens" in usage:
+        cached_tokens = usage.get("prompt_cache_hit_tokens") or 0
+    else:
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": usage.get("completion_tokens") or 0,
+        "reasoning_tokens": (usage.get("completion_tokens_details") or {}).get("reasoning_tokens") or 0,
+        "cached_tokens": cached_tokens,
+        "cache_hit_rate": cached_tokens / prompt_tokens if prompt_tokens else 0.0
+    }
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> Optional[float]:
+    """按LLM_PRICING（美元/百万token）估算费用，未配置价格的模型返回None"""
+    pricing = LLM_PRICING.get(model)
+    if not pricing:
+        return None
+    cost = (cached_tokens * pricing['input_cache_hit']
+            + (prompt_tokens - cached_tokens) * pricing['input_cache_miss']
+            + completion_tokens * pricing['output']) / 1_000_000
+    return round(cost, 6)
+
+
+class LLMTelemetry:
+    """大模型调用遥测日志"""
+
+    def __init__(self, log_path: str = None):
+        """初始化遥测日志
+
+        Args:
+            log_path: 日志文件路径，默认为DATA_DIRS['telemetry']/llm_calls.jsonl
+        """
+        self.log_path = log_path or os.path.join(DATA_DIRS['telemetry'], 'llm_calls.jsonl')
+
+    def start(self, payload: Dict[str, Any], api_url: str = None) -> Dict[str, Any]:
+        """开始记录一次调用，返回在请求过程中逐步填写的记录"""
+        return {
+            "start": round(time.time(), 3),
+            "api_url": api_url,
+            "model": payload.get("model"),
+            "stream": bool(payload.get("stream")),
+            "prompt_chars": sum(len(message.get("content") or "") for message in payload.get("messages", [])),
+            "retries": 0,
+            "http": None,
+        }
+
+    @staticmethod
+    def mark(call: Dict[str, Any], field: str):
+        """记录某个时间点（相对开始的秒数），只记录第一次"""
+        if field not in call:
+            call[field] = round(time.time() - call["start"], 3)
+
+    def finish(self, call: Dict[str, Any], response: Optional[Dict[str, Any]], status: str = None):
+        """补全用量和耗时并追加到日志
+
+        Args:
+            call: start返回的记录
+            response: API响应，失败时为None
+            status: 调用状态，默认根据响应判断（ok/partial/error）
+        """
+        call["end"] = round(time.time() - call["start"], 3)
+        if status is None:
+            status = "error" if not response else ("partial" if response.get("partial") else "ok")
+        call["status"] = status
+
+        usage = summarize_usage((response or {}).get("usage") or {})
+        call.update({
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "reasoning_tokens": usage["reasoning_tokens"],
+            "cached_tokens": usage["cached_tokens"],
+            "cost": estimate_cost(call["model"], usage["prompt_tokens"], usage["cached_tokens"], usage["completion_tokens"]),
+        })
+
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(call, separators=(',', ':')) + "\n")
+        except Exception as e:
+            logger.warning(f"写入AI调用遥测日志出错: {str(e)}")
+
+    def load(self, days: int = None, api_url: str = None) -> List[Dict[str, Any]]:
+        """读取遥测记录
+
+        Args:
+            days: 指定时只返回最近days天的记录
+            api_url: 指定时只返回该接口地址的记录（未记录接口地址的旧记录视为该地址）
+        """
+        if not os.path.exists(self.log_path):
+            return []
+
+        since = time.time() - days * 24 * 60 * 60 if days else 0
+        records = []
+        with open(self.log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("start", 0) < since:
+                    continue
+                if api_url and record.get("api_url", api_url) != api_url:
+                    continue
+                records.append(record)
+        return records
+
+
+def _percentiles(values: List[float], percentiles=(50, 90, 99)) -> Dict[str, Optional[float]]:
+    values = [value for value in values if value is not None]
+    if not values:
+        return {f"p{p}": None for p in percentiles}
+    result = np.percentile(values, percentiles)
+    return {f"p{p}": float(value) for p, value in zip(percentiles, result)}
+
+
+def _period(timestamp: float, by: str) -> str:
+    day = datetime.fromtimestamp(timestamp)
+    if by == "week":
+        day -= timedelta(days=day.weekday())
+    return day.strftime('%Y-%m-%d')
+
+
+def summarize(records: List[Dict[str, Any]], by: str = "day") -> List[Dict[str, Any]]:
+    """按天或按周汇总遥测记录，最后一行为全部记录的汇总
+
+    Returns:
+        每个时间段包含calls、errors、retries、latency/ttft/prompt_tokens/reasoning_tokens的分位数、
+        cache_hit_rate和cost的字典列表
+    """
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault(_period(record["start"], by), []).append(record)
+
+    def summarize_group(period: str, group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        succeeded = [record for record in group if record.get("status") in ("ok", "partial")]
+        prompt_tokens = sum(record.get("prompt_tokens") or 0 for record in succeeded)
+        cached_tokens = sum(record.get("cached_tokens") or 0 for record in succeeded)
+        costs = [record["cost"] for record in succeeded if record.get("cost") is not None]
+        return {
+            "period": period,
+            "calls": len(group),
+            "errors": sum(1 for record in group if record.get("status") == "error"),
+            "retries": sum(record.get("retries") or 0 for record in group),
+            "latency": _percentiles([record.get("end") for record in succeeded]),
+            "ttft": _percentiles([record.get("first_token") for record in succeeded]),
+            "prompt_tokens": _percentiles([record.get("prompt_tokens") for record in succeeded], (50,)),
+            "reasoning_tokens": _percentiles([record.get("reasoning_tokens") for record in succeeded], (50,)),
+            "cache_hit_rate": cached_tokens / prompt_tokens if prompt_tokens else None,
+            "cost": sum(costs) if costs else None,
+        }
+
+    rows = [summarize_group(period, groups[period]) for period in sorted(groups)]
+    if records:
+        rows.append(summarize_group("全部", records))
+    return rows
+
+
+def format_summary(rows: List[Dict[str, Any]]) -> str:
+    """将汇总结果格式化为文本表格"""
+    def fmt(value, pattern="{:.1f}"):
+        return "-" if value is None else pattern.format(value)
+
+    header = (f"{'时间段':<12}{'调用':>6}{'失败':>6}{'重试':>6}{'延迟p50':>10}{'p90':>9}{'p99':>9}"
+              f"{'首token p50':>12}{'p90':>9}{'提示词p50':>11}{'推理p50':>10}{'缓存命中':>10}{'费用$':>10}")
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['period']:<12}{row['calls']:>6}{row['errors']:>6}{row['retries']:>6}"
+            f"{fmt(row['latency']['p50']):>10}{fmt(row['latency']['p90']):>9}{fmt(row['latency']['p99']):>9}"
+            f"{fmt(row['ttft']['p50']):>12}{fmt(row['ttft']['p90']):>9}"
+            f"{fmt(row['prompt_tokens']['p50'], '{:.0f}'):>11}{fmt(row['reasoning_tokens']['p50'], '{:.0f}'):>10}"
+            f"{fmt(row['cache_hit_rate'], '{:.0%}'):>10}{fmt(row['cost'], '{:.4f}'):>10}"
+        )
+    return "\n".join(lines)
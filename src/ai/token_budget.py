@@ -0,0 +1,128 @@
+"""
+提示词token预算模块 - 保证提示词不超过模型上下文
+
+模型上下文 = 提示词 + 输出（max_tokens，推理模型的思考过程也计入其中）。
+本模块用离线的token估算（prompt.estimate_tokens）计算模板、市场数据等各部分的token数，
+市场数据超出预算时依次缩短逐日数据的天数（更早的数据按周汇总）、从最早的数据开始截断，
+直到整个提示词能放进预算。
+"""
+
+import logging
+from typing import Dict, Any, List, Optional
+
+from ai.prompt import encode_market_data, estimate_tokens
+from config import DEEPSEEK_AI
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class TokenBudget:
+    """按模型上下文和输出预留计算提示词预算，并裁剪市场数据以适配预算"""
+
+    def __init__(self, context_tokens: int = None, max_tokens: int = None,
+                 safety_margin: float = None, min_daily_days: int = 14):
+        """初始化token预算
+
+        Args:
+            context_tokens: 模型上下文长度，默认使用DEEPSEEK_AI['context_tokens']
+            max_tokens: 为输出预留的token数，默认使用DEEPSEEK_AI['max_tokens']
+            safety_margin: 估算误差的安全余量比例，默认使用DEEPSEEK_AI['prompt_safety_margin']
+            min_daily_days: 缩减逐日数据时至少保留的天数
+        """
+        self.context_tokens = context_tokens or DEEPSEEK_AI['context_tokens']
+        self.max_tokens = max_tokens or DEEPSEEK_AI['max_tokens']
+        self.safety_margin = DEEPSEEK_AI['prompt_safety_margin'] if safety_margin is None else safety_margin
+        self.min_daily_days = min_daily_days
+
+    @property
+    def prompt_budget(self) -> int:
+        """提示词可用的token数（扣除输出预留和安全余量）"""
+        return int((self.context_tokens - self.max_tokens) * (1 - self.safety_margin))
+
+    def measure(self, prompt: str, sections: Dict[str, str]) -> Dict[str, int]:
+        """计算提示词各部分的token数
+
+        Args:
+            prompt: 完整的提示词
+            sections: {部分名称: 提示词中该部分的文本}
+
+        Returns:
+            {"模板": 其余部分的token数, 部分名称: token数, ...}，另含"合计"、"预留输出"和"预算"
+        """
+        total = estimate_tokens(prompt)
+        counts = {name: estimate_tokens(text or "") for name, text in sections.items()}
+        counts = {"模板": total - sum(counts.values()), **counts}
+        counts["合计"] = total
+        counts["预留输出"] = self.max_tokens
+        counts["预算"] = self.prompt_budget
+        return counts
+
+    def fit_market_data(self, rows: List[Dict[str, Any]], fmt: str = "csv", daily_days: Optional[int] = 60,
+                        fixed_tokens: int = 0) -> Dict[str, Any]:
+        """编码市场数据，超出预算时缩减逐日天数、截断最早的数据
+
+        Args:
+            rows: 按日期升序排列的数据列表
+            fmt: 数据格式，"csv"或"json"
+            daily_days: 逐日数据的天数（仅csv格式）
+            fixed_tokens: 提示词中数据以外部分（模板、历史相似行情等）的token数
+
+        Returns:
+            包含data_text、data_tokens、rows、daily_days、trimmed等字段的字典，
+            预算不足以容纳任何数据时status为error
+        """
+        available = self.prompt_budget - fixed_tokens
+        result = {
+            "status": "success",
+            "budget": self.prompt_budget,
+            "available": available,
+            "trimmed": False,
+        }
+
+        def encode(start: int, days: Optional[int]) -> str:
+            return encode_market_data(rows[start:], fmt, days)
+
+        text = encode(0, daily_days)
+        tokens = estimate_tokens(text)
+
+        # 先缩短逐日数据，把更多日期并入周线汇总
+        if fmt == "csv":
+            while tokens > available and daily_days is not None and daily_days > self.min_daily_days:
+                daily_days = max(self.min_daily_days, daily_days // 2)
+                text = encode(0, daily_days)
+                tokens = estimate_tokens(text)
+                result["trimmed"] = True
+
+        # 仍然超出时从最早的数据开始截断（二分查找能放下的最早起点）
+        start = 0
+        if tokens > available:
+            result["trimmed"] = True
+            low, high = 1, len(rows)
+            while low < high:
+                mid = (low + high) // 2
+                if estimate_tokens(encode(mid, daily_days)) <= available:
+                    high = mid
+                else:
+                    low = mid + 1
+            start = low
+            text = encode(start, daily_days) if start < len(rows) else ""
+            tokens = estimate_tokens(text)
+
+        kept = rows[start:]
+        if not kept:
+            result.update({"status": "error", "message": f"提示词预算不足: 数据以外部分已占用{fixed_tokens} tokens，预算{self.prompt_budget}"})
+            return result
+
+        result.update({
+            "data_text": text,
+            "data_tokens": tokens,
+            "rows": len(kept),
+            "start_date": kept[0].get("date"),
+            "end_date": kept[-1].get("date"),
+            "daily_days": daily_days,
+        })
+        if result["trimmed"]:
+            logger.warning(f"市场数据超出提示词预算，已缩减为{kept[0].get('date')}起的{len(kept)}天"
+                           f"（逐日{daily_days}天），数据{tokens} tokens，可用{available} tokens")
+        return result
@@ -4,16 +4,22 @@
 - BTC价格数据收集器
 - MVRV（已实现市值比率）数据收集器
 - 恐惧与贪婪指数数据收集器
+- 链上指标（CoinMetrics多指标批量）数据收集器
+- 多交易所共识价格收集器
 """
 
 from collectors.base_collector import BaseDataCollector
 from collectors.btc_price_collector import BTCPriceCollector
 from collectors.mvrv_collector import MVRVCollector
 from collectors.fear_greed_collector import FearGreedCollector
+from collectors.onchain_collector import OnChainCollector
+from collectors.consensus_price_collector import ConsensusPriceCollector
 
 __all__ = [
     'BaseDataCollector',
     'BTCPriceCollector',
     'MVRVCollector',
-    'FearGreedCollector'
+    'FearGreedCollector',
+    'OnChainCollector',
+    'ConsensusPriceCollector'
 ] 
\ No newline at end of file
@@ -1,9 +1,8 @@
 from collectors.base_collector import BaseDataCollector
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
+from collectors.btc_price_collector import BTCPriceCollector
 import time
-import random
-import numpy as np
 from config import MARKET_SENTIMENT, PROXY_URL, USE_PROXY
 
 logger = logging.getLogger(__name__)
@@ -15,12 +14,15 @@ class AHR999Collector(BaseDataCollector):
         """初始化AHR999指数数据收集器"""
         super().__init__(data_dir, PROXY_URL, USE_PROXY)
         self.ahr999_history_file = "ahr999_history.json"
+        self.btc_price_file = "btc_price_history.json"
         self.api_url = MARKET_SENTIMENT['ahr999_url']
     
     async def get_ahr999_history(self, days=365, keep_extra_data=False):
         """
         获取AHR999指数历史数据
         
+        由BTC日线价格本地计算，本地计算失败时才请求第三方接口。
+        
         参数:
             days: 获取的天数
             keep_extra_data: 是否保留额外数据（BTC价格、MA200和比率）
@@ -43,7 +45,17 @@ class AHR999Collector(BaseDataCollector):
             except Exception as e:
                 logger.error(f"检查AHR999数据时间出错: {str(e)}")
         
-        # 尝试从API获取数据
+        # 由价格历史本地计算
+        try:
+            ahr999_history = await self._compute_from_price_history(days, keep_extra_data)
+            if ahr999_history:
+                logger.info(f"已由价格历史计算AHR999指数，条目数: {len(ahr999_history)}")
+                self.save_to_json(ahr999_history, self.ahr999_history_file)
+                return ahr999_history
+        except Exception as e:
+            logger.error(f"本地计算AHR999指数出错: {str(e)}")
+        
+        # 本地计算失败时才请求第三方接口
         try:
             # 使用代理
             data = await self.fetch_data(self.api_url, use_proxy=True)
@@ -96,63 +108,39 @@ class AHR999Collector(BaseDataCollector):
                 return ahr999_history
             else:
                 logger.error("获取AHR999历史数据失败或数据格式不正确")
-                # 如果API获取失败，生成模拟数据
-                return self.generate_mock_ahr999_data(days)
+                return ahr_data or []
         except Exception as e:
             logger.error(f"获取AHR999历史数据异常: {str(e)}")
-            
-            # 如果API获取失败，生成模拟数据
-            return self.generate_mock_ahr999_data(days)
+            return ahr_data or []
     
-    def generate_mock_ahr999_data(self, days=365):
-        """生成模拟的AHR999指数历史数据"""
-        logger.info(f"生成{days}天的模拟AHR999指数历史数据")
-        
-        # 确保随机数生成是确定的
-        random.seed(42)
-        np.random.seed(42)
+    async def _compute_from_price_history(self, days, keep_extra_data=False):
+        """由BTC日线价格本地计算AHR999
         
-        # 生成模拟数据
-        start_date = datetime.now()
-        ahr999_history = []
-        
-        # 使用正弦波模拟市场周期，加上随机波动
-        base_value = 1.0  # 起始值
-        cycle_length = 365 * 4  # 4年周期
-        amplitude = 0.8  # 波动幅度
-        
-        for i in range(days):
-            date = start_date - timedelta(days=i)
-            timestamp = int(date.timestamp())
-            date_str = date.strftime('%Y-%m-%d')
-            
-            # 基础周期值
-            cycle_position = (i % cycle_length) / cycle_length * 2 * np.pi
-            cycle_value = base_value + amplitude * np.sin(cycle_position)
-            
-            # 添加随机波动
-            random_factor = 1.0 + random.uniform(-0.1, 0.1)  # ±10%随机波动
-            ahr999_value = max(0.1, min(3.0, cycle_value * random_factor))  # 限制在合理范围内
-            
-            # 添加一些小趋势
-            if i % 30 < 15:  # 每月前半部分小幅上涨
-                trend_factor = 1.0 + random.uniform(0, 0.02)  # 0-2%上涨
-            else:  # 每月后半部分小幅下跌
-                trend_factor = 1.0 - random.uniform(0, 0.02)  # 0-2%下跌
-            
-            ahr999_value *= trend_factor
-            
-            # 生成数据点
-            ahr999_history.append({
-                "timestamp": timestamp,
-                "date": date_str,
-                "ahr999": round(ahr999_value, 4)
-            })
+        优先使用本地保存的btc_price_history.json，不足days+199天时
+        从Binance补齐日线K线。
+        """
+        from utils.ahr999 import AHR999Calculator, DCA_WINDOW
         
-        # 排序，最新的日期在前面
-        ahr999_history.sort(key=lambda x: x["timestamp"], reverse=True)
+        required = days + DCA_WINDOW - 1
+        price_history = self.load_from_json(self.btc_price_file) or []
         
-        # 保存到文件
-        self.save_to_json(ahr999_history, self.ahr999_history_file)
+        if len(price_history) < required:
+            logger.info(f"本地BTC价格数据不足{required}天，从Binance获取日线数据...")
+            start_time = int((time.time() - required * 24 * 60 * 60) * 1000)
+            klines = await BTCPriceCollector(self.data_dir).get_klines("1d", start_time=start_time)
+            fetched = [
+                {
+                    "date": datetime.fromtimestamp(int(item[0]) / 1000).strftime('%Y-%m-%d'),
+                    "price": float(item[4])
+                }
+                for item in klines if len(item) >= 5
+            ]
+            # 同一日期以本地数据为准
+            known_dates = {item.get("date") for item in price_history}
+            price_history = price_history + [item for item in fetched if item["date"] not in known_dates]
         
-        return ahr999_history 
\ No newline at end of file
+        calculator = AHR999Calculator.from_price_history(price_history)
+        ahr999_history = calculator.to_history(days=days, keep_extra_data=keep_extra_data)
+        if not ahr999_history:
+            logger.warning(f"BTC价格数据不足{DCA_WINDOW}天，无法本地计算AHR999")
+        return ahr999_history
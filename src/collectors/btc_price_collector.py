@@ -14,6 +14,7 @@ class BTCPriceCollector(BaseDataCollector):
         """初始化BTC价格数据收集器"""
         super().__init__(data_dir, PROXY_URL, USE_PROXY)
         self.btc_history_file = "btc_price_history.json"
+        self.ohlcv_file_template = "btc_ohlcv_{interval}.npy"
         self.api_url = MARKET_SENTIMENT['btc_price_url']
     
     async def get_price_history(self, days=180):
@@ -75,12 +76,104 @@ class BTCPriceCollector(BaseDataCollector):
                 # 保存到文件
                 self.save_to_json(btc_history, self.btc_history_file)
                 
+                # 完整K线另存为结构化数组
+                self.save_ohlcv(data, "1d")
+                
                 return btc_history
             else:
                 logger.error("获取BTC价格历史数据失败")
-                # 尝试从本地加载旧数据
-                return self.load_from_json(self.btc_history_file) or []
+                return await self._fallback_price_history(days)
         except Exception as e:
             logger.error(f"获取BTC价格历史数据异常: {str(e)}")
-            # 尝试从本地加载旧数据
-            return self.load_from_json(self.btc_history_file) or [] 
\ No newline at end of file
+            return await self._fallback_price_history(days)
+    
+    async def _fallback_price_history(self, days):
+        """Binance不可用时改用其他交易所的共识价格，仍失败时从本地加载旧数据"""
+        from collectors.consensus_price_collector import ConsensusPriceCollector, DEFAULT_VENUES, BinanceVenue
+        
+        venues = [venue() for venue in DEFAULT_VENUES if venue is not BinanceVenue]
+        btc_history = await ConsensusPriceCollector(self.data_dir, venues=venues).get_consensus_history("1d", days)
+        if btc_history:
+            logger.info(f"使用多交易所共识价格，共{len(btc_history)}条")
+            self.save_to_json(btc_history, self.btc_history_file)
+            return btc_history
+        
+        # 尝试从本地加载旧数据
+        return self.load_from_json(self.btc_history_file) or []
+    
+    async def get_klines(self, interval="1h", start_time=None, end_time=None, limit=1000, max_pages=50):
+        """获取任意周期的原始K线数据（用于多周期重采样）
+        
+        Binance单次最多返回1000条，指定start_time时按开盘时间向后翻页。
+        
+        Args:
+            interval: K线周期，如 1m/5m/1h/4h/1d
+            start_time: 起始开盘时间（毫秒），为None时只取最近limit条
+            end_time: 截止时间（毫秒）
+            limit: 每页条数，最多1000
+            max_pages: 最多翻页次数
+            
+        Returns:
+            Binance原始K线列表（按开盘时间升序），失败时返回空列表
+        """
+        logger.info(f"正在获取{interval}周期的BTC K线数据...")
+        
+        params = {
+            "symbol": "BTCUSDT",
+            "interval": interval,
+            "limit": min(limit, 1000)
+        }
+        if end_time is not None:
+            params["endTime"] = int(end_time)
+        
+        klines = []
+        next_start = start_time
+        for _ in range(max_pages):
+            page_params = dict(params)
+            if next_start is not None:
+                page_params["startTime"] = int(next_start)
+            
+            data = await self.fetch_data(self.api_url, page_params, use_proxy=True)
+            if not data:
+                logger.info("使用代理获取K线数据失败，尝试不使用代理...")
+                data = await self.fetch_data(self.api_url, page_params, use_proxy=False)
+            
+            if not data or not isinstance(data, list):
+                logger.error(f"获取{interval}周期K线数据失败")
+                break
+            
+            klines.extend(data)
+            
+            # 未指定起始时间或已取完时不再翻页
+            if start_time is None or len(data) < page_params["limit"]:
+                break
+            next_start = int(data[-1][0]) + 1
+        
+        logger.info(f"成功获取到{len(klines)}条{interval}周期K线数据")
+        if klines:
+            self.save_ohlcv(klines, interval)
+        return klines
+    
+    def save_ohlcv(self, klines, interval="1d"):
+        """将原始K线合并到该周期的结构化数组文件（btc_ohlcv_{interval}.npy）
+        
+        Args:
+            klines: Binance原始K线列表
+            interval: K线周期
+            
+        Returns:
+            合并后的结构化数组
+        """
+        from utils.ohlcv import klines_to_records, merge_records, save_records
+        
+        records = merge_records(self.load_ohlcv(interval), klines_to_records(klines))
+        file_path = os.path.join(self.data_dir, self.ohlcv_file_template.format(interval=interval))
+        if save_records(records, file_path):
+            logger.info(f"K线数据已保存到: {file_path}，共{len(records)}根")
+        return records
+    
+    def load_ohlcv(self, interval="1d"):
+        """加载该周期的完整K线（结构化数组，按开盘时间升序，字段见utils.ohlcv.KLINE_DTYPE）"""
+        from utils.ohlcv import load_records
+        
+        return load_records(os.path.join(self.data_dir, self.ohlcv_file_template.format(interval=interval))) 
\ No newline at end of file
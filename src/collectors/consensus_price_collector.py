@@ -0,0 +1,283 @@
+from collectors.base_collector import BaseDataCollector
+import asyncio
+import logging
+from datetime import datetime
+import numpy as np
+from config import PROXY_URL, USE_PROXY
+
+logger = logging.getLogger(__name__)
+
+# K线周期（毫秒），用于对齐各交易所的开盘时间
+INTERVAL_MS = {
+    "1h": 60 * 60 * 1000,
+    "4h": 4 * 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+
+class PriceVenue:
+    """交易所K线数据源，子类提供请求参数和解析方法
+
+    fetch返回统一格式的K线列表: [{"open_time": 毫秒, "close": 收盘价, "volume": BTC成交量}, ...]
+    """
+
+    name = "base"
+    url = ""
+    intervals = {}
+
+    def build_params(self, interval, limit):
+        raise NotImplementedError
+
+    def parse(self, data):
+        raise NotImplementedError
+
+    async def fetch(self, collector, interval="1d", limit=180):
+        """通过收集器请求K线（先代理后直连），失败时返回空列表"""
+        if interval not in self.intervals:
+            logger.warning(f"{self.name}不支持{interval}周期")
+            return []
+
+        params = self.build_params(interval, limit)
+        data = await collector.fetch_data(self.url, params, use_proxy=True)
+        if not data:
+            data = await collector.fetch_data(self.url, params, use_proxy=False)
+        if not data:
+            return []
+
+        try:
+            return self.parse(data)
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            logger.error(f"解析{self.name} K线数据出错: {str(e)}")
+            return []
+
+
+class BinanceVenue(PriceVenue):
+    name = "binance"
+    url = "https://api.binance.com/api/v3/klines"
+    intervals = {"1h": "1h", "4h": "4h", "1d": "1d"}
+
+    def build_params(self, interval, limit):
+        return {"symbol": "BTCUSDT", "interval": self.intervals[interval], "limit": min(limit, 1000)}
+
+    def parse(self, data):
+        return [{"open_time": int(row[0]), "close": float(row[4]), "volume": float(row[5])} for row in data]
+
+
+class OKXVenue(PriceVenue):
+    name = "okx"
+    url = "https://www.okx.com/api/v5/market/candles"
+    intervals = {"1h": "1H", "4h": "4H", "1d": "1Dutc"}
+
+    def build_params(self, interval, limit):
+        return {"instId": "BTC-USDT", "bar": self.intervals[interval], "limit": str(min(limit, 300))}
+
+    def parse(self, data):
+        # [ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm]，最新的在前
+        return [{"open_time": int(row[0]), "close": float(row[4]), "volume": float(row[5])} for row in data["data"]]
+
+
+class BybitVenue(PriceVenue):
+    name = "bybit"
+    url = "https://api.bybit.com/v5/market/kline"
+    intervals = {"1h": "60", "4h": "240", "1d": "D"}
+
+    def build_params(self, interval, limit):
+        return {"category": "spot", "symbol": "BTCUSDT", "interval": self.intervals[interval], "limit": str(min(limit, 1000))}
+
+    def parse(self, data):
+        # [startTime, o, h, l, c, volume, turnover]，最新的在前
+        return [{"open_time": int(row[0]), "close": float(row[4]), "volume": float(row[5])} for row in data["result"]["list"]]
+
+
+class CoinbaseVenue(PriceVenue):
+    name = "coinbase"
+    url = "https://api.exchange.coinbase.com/products/BTC-USD/candles"
+    intervals = {"1h": 3600, "1d": 86400}
+
+    def build_params(self, interval, limit):
+        # 不指定时间范围时返回最近300根
+        return {"granularity": str(self.intervals[interval])}
+
+    def parse(self, data):
+        # [time(秒), low, high, open, close, volume]，最新的在前
+        return [{"open_time": int(row[0]) * 1000, "close": float(row[4]), "volume": float(row[5])} for row in data]
+
+
+class KrakenVenue(PriceVenue):
+    name = "kraken"
+    url = "https://api.kraken.com/0/public/OHLC"
+    intervals = {"1h": 60, "4h": 240, "1d": 1440}
+
+    def build_params(self, interval, limit):
+        return {"pair": "XBTUSD", "interval": str(self.intervals[interval])}
+
+    def parse(self, data):
+        # {"result": {"XXBTZUSD": [[time(秒), o, h, l, c, vwap, volume, count], ...], "last": ...}}
+        rows = next(value for key, value in data["result"].items() if key != "last")
+        return [{"open_time": int(row[0]) * 1000, "close": float(row[4]), "volume": float(row[6])} for row in rows]
+
+
+class StaticVenue(PriceVenue):
+    """本地替身数据源：直接返回给定的K线（可选延迟），用于测试或离线运行"""
+
+    def __init__(self, name, klines, delay=0.0):
+        self.name = name
+        self.klines = list(klines)
+        self.delay = delay
+        self.intervals = {interval: interval for interval in INTERVAL_MS}
+
+    async def fetch(self, collector, interval="1d", limit=180):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.klines[-limit:]
+
+
+DEFAULT_VENUES = [BinanceVenue, OKXVenue, BybitVenue, CoinbaseVenue, KrakenVenue]
+
+
+def combine_klines(venue_klines, interval="1d", method="vwap", max_deviation=0.02):
+    """合并各交易所K线，剔除偏离中位数过大的报价后计算共识价格
+
+    参数:
+        venue_klines: {交易所名称: 统一格式的K线列表}
+        interval: K线周期，用于对齐开盘时间
+        method: "vwap"为成交量加权平均，"median"为中位数
+        max_deviation: 相对中位数的最大偏离比例，超过视为异常报价
+
+    返回:
+        btc_price格式的记录列表（最新的在前），sources为参与计算的交易所数量
+    """
+    period = INTERVAL_MS[interval]
+    names = [name for name, klines in venue_klines.items() if klines]
+    if not names:
+        return []
+
+    buckets = sorted({row["open_time"] // period * period for name in names for row in venue_klines[name]})
+    index = {bucket: i for i, bucket in enumerate(buckets)}
+
+    closes = np.full((len(buckets), len(names)), np.nan)
+    volumes = np.zeros((len(buckets), len(names)))
+    for j, name in enumerate(names):
+        for row in venue_klines[name]:
+            i = index[row["open_time"] // period * period]
+            closes[i, j] = row["close"]
+            volumes[i, j] = row["volume"]
+
+    median = np.nanmedian(closes, axis=1)
+    with np.errstate(invalid="ignore"):
+        valid = ~np.isnan(closes) & (np.abs(closes / median[:, None] - 1) <= max_deviation)
+
+    rejected = int((~valid & ~np.isnan(closes)).sum())
+    if rejected:
+        logger.warning(f"共识价格剔除了{rejected}个偏离中位数超过{max_deviation:.0%}的报价")
+
+    if method == "median":
+        price = np.nanmedian(np.where(valid, closes, np.nan), axis=1)
+    else:
+        weights = np.where(valid, volumes, 0.0)
+        total = weights.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            weighted = (np.where(valid, closes, 0.0) * weights).sum(axis=1) / total
+        # 成交量缺失时退化为中位数
+        price = np.where(total > 0, weighted, np.nanmedian(np.where(valid, closes, np.nan), axis=1))
+
+    sources = valid.sum(axis=1)
+    history = []
+    for bucket, value, count in zip(buckets[::-1], price[::-1], sources[::-1]):
+        if count == 0:
+            continue
+        history.append({
+            "timestamp": int(bucket),
+            "date": datetime.fromtimestamp(bucket / 1000).strftime('%Y-%m-%d' if interval == "1d" else '%Y-%m-%d %H:%M'),
+            "price": round(float(value), 2),
+            "sources": int(count)
+        })
+    return history
+
+
+class ConsensusPriceCollector(BaseDataCollector):
+    """多交易所共识价格收集器
+
+    并发请求多个交易所的公开K线接口，达到法定数量（quorum）的交易所返回后
+    立即计算共识价格，不等待最慢的交易所。
+    """
+
+    def __init__(self, data_dir="data", venues=None, quorum=None, timeout=20.0):
+        """初始化共识价格收集器
+
+        参数:
+            venues: PriceVenue实例列表，默认使用DEFAULT_VENUES
+            quorum: 需要成功返回的交易所数量，默认为过半数
+            timeout: 等待交易所返回的最长时间（秒），超时后使用已返回的数据
+        """
+        super().__init__(data_dir, PROXY_URL, USE_PROXY)
+        self.venues = list(venues) if venues is not None else [venue() for venue in DEFAULT_VENUES]
+        self.quorum = quorum or len(self.venues) // 2 + 1
+        self.timeout = timeout
+        self.consensus_file = "btc_price_consensus.json"
+
+    async def gather_quorum(self, interval="1d", limit=180):
+        """并发请求所有交易所，达到quorum或超时后返回已成功的结果
+
+        返回:
+            {交易所名称: K线列表}
+        """
+        tasks = {
+            asyncio.ensure_future(venue.fetch(self, interval, limit)): venue.name
+            for venue in self.venues
+        }
+        results = {}
+        pending = set(tasks)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.timeout
+
+        try:
+            while pending and len(results) < self.quorum:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    logger.warning(f"等待交易所返回超时，已返回{len(results)}个")
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    try:
+                        klines = task.result()
+                    except Exception as e:
+                        logger.error(f"获取{name} K线数据异常: {str(e)}")
+                        continue
+                    if klines:
+                        results[name] = klines
+                        logger.info(f"{name}返回{len(klines)}条K线")
+        finally:
+            # 达到法定数量后不再等待较慢的交易所
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        return results
+
+    async def get_consensus_history(self, interval="1d", limit=180, method="vwap", max_deviation=0.02):
+        """获取共识价格历史数据（btc_price格式，最新的在前）
+
+        参数:
+            interval: K线周期
+            limit: 每个交易所请求的K线数量
+            method: "vwap"或"median"
+            max_deviation: 异常报价的最大偏离比例
+        """
+        logger.info(f"正在从{len(self.venues)}个交易所获取共识价格（quorum={self.quorum}）...")
+        venue_klines = await self.gather_quorum(interval, limit)
+
+        if not venue_klines:
+            logger.error("所有交易所均未返回价格数据")
+            return []
+        if len(venue_klines) < self.quorum:
+            logger.warning(f"仅有{len(venue_klines)}个交易所返回数据，低于quorum={self.quorum}")
+
+        history = combine_klines(venue_klines, interval, method, max_deviation)[:limit]
+        logger.info(f"已计算{len(history)}条共识价格，来源: {', '.join(venue_klines)}")
+
+        if history and interval == "1d":
+            self.save_to_json(history, self.consensus_file)
+        return history
@@ -0,0 +1,152 @@
+from collectors.base_collector import BaseDataCollector
+import logging
+from datetime import datetime, timedelta
+import time
+from config import MARKET_SENTIMENT, ONCHAIN_METRICS, PROXY_URL, USE_PROXY
+
+logger = logging.getLogger(__name__)
+
+
+class OnChainCollector(BaseDataCollector):
+    """链上指标历史数据收集器
+
+    数据源: CoinMetrics Community API (免费, 无需API Key)
+    一次分页请求同时获取多个资产的多个指标（metrics与assets均为逗号分隔），
+    再按资产和指标拆分为独立的序列分别保存，新增指标不会增加请求次数。
+    """
+
+    def __init__(self, data_dir="data", assets=None, metrics=None):
+        """初始化链上指标收集器
+
+        参数:
+            assets: 资产列表，默认使用ONCHAIN_METRICS['assets']
+            metrics: {CoinMetrics指标名: 保存字段名}，默认使用ONCHAIN_METRICS['metrics']
+        """
+        super().__init__(data_dir, PROXY_URL, USE_PROXY)
+        self.api_url = MARKET_SENTIMENT['mvrv_url']
+        self.assets = list(assets or ONCHAIN_METRICS['assets'])
+        self.metrics = dict(metrics or ONCHAIN_METRICS['metrics'])
+        self.page_size = 1000
+
+    def history_file(self, asset, key):
+        """某个资产某个指标的保存文件名（BTC的MVRV沿用mvrv_history.json）"""
+        if asset == 'btc' and key == 'mvrv':
+            return "mvrv_history.json"
+        return f"onchain_{asset}_{key}_history.json"
+
+    def load_cached_history(self):
+        """从本地文件加载全部序列，返回({资产: {字段: 序列}}, 是否全部在24小时内更新过)"""
+        history = {}
+        fresh = True
+        for asset in self.assets:
+            history[asset] = {}
+            for key in self.metrics.values():
+                series = self.load_from_json(self.history_file(asset, key)) or []
+                history[asset][key] = series
+                timestamps = [item.get("timestamp") for item in series if isinstance(item.get("timestamp"), (int, float))]
+                if not timestamps or (int(time.time()) - max(timestamps)) >= 24 * 60 * 60:
+                    fresh = False
+        return history, fresh
+
+    async def get_onchain_history(self, days=365):
+        """获取全部资产、全部指标的历史数据
+
+        返回:
+            {资产: {字段名: [{timestamp, date, 字段名: 数值}, ...]}}，每条序列最新的在前
+        """
+        logger.info(f"正在获取链上指标历史数据: {', '.join(self.metrics)} ({', '.join(self.assets)})...")
+
+        cached, fresh = self.load_cached_history()
+        if fresh:
+            logger.info("使用缓存的链上指标历史数据")
+            return cached
+
+        try:
+            start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+            raw_data = await self._fetch_all_pages(start_date)
+
+            if raw_data:
+                history = self._split_series(raw_data)
+                logger.info(f"成功获取到链上指标数据，行数: {len(raw_data)}，"
+                            + ", ".join(f"{asset}.{key}: {len(series)}条"
+                                        for asset, metrics in history.items() for key, series in metrics.items()))
+                for asset, metrics in history.items():
+                    for key, series in metrics.items():
+                        if series:
+                            self.save_to_json(series, self.history_file(asset, key))
+                        else:
+                            # 没有返回数据的指标保留旧数据
+                            metrics[key] = cached.get(asset, {}).get(key, [])
+                return history
+            else:
+                logger.error("获取链上指标历史数据失败或数据为空，使用本地旧数据")
+                return cached
+
+        except Exception as e:
+            logger.error(f"获取链上指标历史数据异常: {str(e)}")
+            return cached
+
+    async def _fetch_all_pages(self, start_date):
+        """按next_page_token翻页获取全部数据行"""
+        params = {
+            'assets': ','.join(self.assets),
+            'metrics': ','.join(self.metrics),
+            'frequency': '1d',
+            'page_size': str(self.page_size),
+            'start_time': start_date,
+            # 社区版不提供的指标/资产跳过，而不是让整个请求失败
+            'ignore_forbidden_errors': 'true',
+            'ignore_unsupported_errors': 'true'
+        }
+
+        all_data = []
+        current_params = params.copy()
+        while True:
+            data = await self.fetch_data(self.api_url, params=current_params, use_proxy=False)
+
+            if not data and self.use_proxy:
+                logger.info("直连获取链上指标数据失败，尝试使用代理...")
+                data = await self.fetch_data(self.api_url, params=current_params, use_proxy=True)
+
+            if not data or 'data' not in data:
+                break
+
+            all_data.extend(data['data'])
+
+            if data.get('next_page_token'):
+                current_params = dict(params, next_page_token=data['next_page_token'])
+            else:
+                break
+
+        return all_data
+
+    def _split_series(self, raw_data):
+        """将CoinMetrics的宽表数据行拆分为按资产、按指标的序列"""
+        history = {asset: {key: [] for key in self.metrics.values()} for asset in self.assets}
+        for item in raw_data:
+            try:
+                asset = item.get('asset')
+                time_str = item.get('time', '')
+                if asset not in history or not time_str:
+                    continue
+
+                dt = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
+                date_str = dt.strftime('%Y-%m-%d')
+                timestamp = int(dt.timestamp())
+
+                for metric, key in self.metrics.items():
+                    value = item.get(metric)
+                    if value is None:
+                        continue
+                    history[asset][key].append({
+                        "timestamp": timestamp,
+                        "date": date_str,
+                        key: round(float(value), 6)
+                    })
+            except (ValueError, TypeError) as e:
+                logger.error(f"解析链上指标数据出错: {str(e)}, 数据: {item}")
+
+        for metrics in history.values():
+            for series in metrics.values():
+                series.sort(key=lambda x: x["timestamp"], reverse=True)
+        return history
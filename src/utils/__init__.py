@@ -7,5 +7,15 @@ This package contains utility modules for data processing, storage, and manipula
 # Import utility modules to make them accessible from the utils package
 from utils.data_store import DataStore
 from utils.historical_data import HistoricalDataCollector
-from utils.data_reorganizer import reorganize_by_date, load_historical_data, save_daily_data
-from utils.trend_analyzer import TrendAnalyzer 
\ No newline at end of file
+from utils.data_reorganizer import (reorganize_by_date, reorganize_rows, load_historical_data, save_daily_data,
+                                    load_daily_data, DailyRow)
+from utils.trend_analyzer import TrendAnalyzer
+from utils.backtester import AdviceBacktester
+from utils.param_sweep import ParameterSweep
+from utils.resampler import TimeframeResampler
+from utils.cross_asset import CrossAssetAnalyzer
+from utils.analysis_cache import AnalysisCache
+from utils.regimes import RegimeLabeller
+from utils.analogs import AnalogFinder
+from utils.ahr999 import AHR999Calculator
+from utils.ohlcv import KLINE_DTYPE, klines_to_records, summarize_indicators 
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""
+AHR999指数计算模块 - 由BTC日线价格本地计算AHR999
+
+AHR999 = (价格 / 200日定投成本) × (价格 / 指数增长估值)
+- 200日定投成本：最近200天价格的几何平均数
+- 指数增长估值：10^(5.84 × log10(币龄天数) - 17.01)，币龄从创世区块日(2009-01-03)起算
+
+对数价格的累积和一次给出全部窗口的几何平均，整段历史只需一次numpy计算；
+追加新日期时只计算新增部分，不再依赖第三方接口。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+GENESIS_DATE = "2009-01-03"
+DCA_WINDOW = 200
+VALUATION_SLOPE = 5.84
+VALUATION_INTERCEPT = -17.01
+
+
+def coin_age_days(dates: List[str]) -> np.ndarray:
+    """日期距创世区块日的天数"""
+    days = np.array(dates, dtype="datetime64[D]") - np.datetime64(GENESIS_DATE)
+    return days.astype(np.int64)
+
+
+def growth_valuation(dates: List[str]) -> np.ndarray:
+    """指数增长估值（对数回归拟合价格）"""
+    return 10 ** (VALUATION_SLOPE * np.log10(coin_age_days(dates)) + VALUATION_INTERCEPT)
+
+
+def compute_ahr999(dates: List[str], prices: np.ndarray, window: int = DCA_WINDOW) -> Dict[str, np.ndarray]:
+    """一次性计算整段AHR999序列
+
+    Args:
+        dates: 升序、逐日连续的日期列表
+        prices: 与dates对应的收盘价
+        window: 定投成本窗口天数
+
+    Returns:
+        包含dca_cost、valuation、ahr999的数组字典，不足窗口的位置为NaN
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    log_cumsum = np.concatenate([[0.0], np.cumsum(np.log(prices))])
+    return _compute_tail(dates, prices, log_cumsum, 0, window)
+
+
+def _compute_tail(dates: List[str], prices: np.ndarray, log_cumsum: np.ndarray,
+                  start: int, window: int) -> Dict[str, np.ndarray]:
+    """计算从start开始的各项指标，log_cumsum[i]为前i个对数价格之和"""
+    n = len(prices)
+    dca_cost = np.full(n - start, np.nan)
+    first = max(start, window - 1)
+    if first < n:
+        end = np.arange(first + 1, n + 1)
+        dca_cost[first - start:] = np.exp((log_cumsum[end] - log_cumsum[end - window]) / window)
+
+    valuation = growth_valuation(dates[start:])
+    tail_prices = prices[start:]
+    return {
+        "dca_cost": dca_cost,
+        "valuation": valuation,
+        "ahr999": (tail_prices / dca_cost) * (tail_prices / valuation),
+    }
+
+
+class AHR999Calculator:
+    """支持增量更新的AHR999计算器"""
+
+    def __init__(self, window: int = DCA_WINDOW):
+        """初始化计算器
+
+        Args:
+            window: 定投成本窗口天数
+        """
+        self.window = window
+        self.dates: List[str] = []
+        self.prices = np.empty(0, dtype=np.float64)
+        self._log_cumsum = np.zeros(1, dtype=np.float64)
+        self.values = {key: np.empty(0, dtype=np.float64) for key in ("dca_cost", "valuation", "ahr999")}
+
+    @classmethod
+    def from_price_history(cls, price_history: List[Dict[str, Any]], window: int = DCA_WINDOW) -> "AHR999Calculator":
+        """由btc_price历史记录（任意顺序）构建"""
+        calculator = cls(window)
+        calculator.update(price_history)
+        return calculator
+
+    def update(self, price_history: List[Dict[str, Any]]) -> int:
+        """追加晚于已有数据的新日期，只计算新增部分
+
+        Args:
+            price_history: btc_price格式的记录列表，包含date和price
+
+        Returns:
+            新增的天数
+        """
+        by_date = {
+            item["date"]: float(item["price"])
+            for item in price_history
+            if item.get("date") and item.get("price") is not None
+        }
+        new_dates = sorted(d for d in by_date if not self.dates or d > self.dates[-1])
+        if not new_dates:
+            return 0
+
+        start = len(self.dates)
+        new_prices = np.array([by_date[d] for d in new_dates], dtype=np.float64)
+        self.dates.extend(new_dates)
+        self.prices = np.concatenate([self.prices, new_prices])
+        self._log_cumsum = np.concatenate([self._log_cumsum, self._log_cumsum[-1] + np.cumsum(np.log(new_prices))])
+
+        tail = _compute_tail(self.dates, self.prices, self._log_cumsum, start, self.window)
+        for key, values in tail.items():
+            self.values[key] = np.concatenate([self.values[key], values])
+
+        logger.info(f"AHR999已更新{len(new_dates)}天，共{len(self.dates)}天")
+        return len(new_dates)
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """最新一天的AHR999，数据不足窗口时返回None"""
+        history = self.to_history(days=1)
+        return history[0] if history else None
+
+    def to_history(self, days: Optional[int] = None, keep_extra_data: bool = False) -> List[Dict[str, Any]]:
+        """转换为AHR999Collector的记录格式（最新的在前），跳过不足窗口的日期
+
+        Args:
+            days: 只返回最近的天数
+            keep_extra_data: 是否保留价格、200日定投成本和价格/成本比值
+        """
+        valid = np.flatnonzero(~np.isnan(self.values["ahr999"]))
+        if days is not None:
+            valid = valid[-days:]
+
+        history = []
+        for i in valid[::-1]:
+            date = self.dates[i]
+            entry = {
+                "timestamp": int(datetime.strptime(date, '%Y-%m-%d').timestamp()),
+                "date": date,
+                "ahr999": round(float(self.values["ahr999"][i]), 4),
+            }
+            if keep_extra_data:
+                entry["price"] = float(self.prices[i])
+                entry["ma200"] = round(float(self.values["dca_cost"][i]), 2)
+                entry["price_ma_ratio"] = round(float(self.prices[i] / self.values["dca_cost"][i]), 4)
+            history.append(entry)
+        return history
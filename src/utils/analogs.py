@@ -0,0 +1,270 @@
+"""
+历史相似行情模块 - 基于KD树的市场状态近邻检索
+
+为每个历史交易日构建特征向量（MVRV、恐惧贪婪指数、30日涨跌幅、30日波动率），
+标准化后建立KD树索引，检索与指定日期最相似的k个历史日期，并给出这些
+日期之后7/30/90天的价格表现。
+
+新增日期先进入未索引缓冲区（暴力检索），缓冲区超过阈值时再整体重建，
+避免每加一天就重建整棵树。
+"""
+
+import heapq
+import logging
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+FEATURE_NAMES = ["mvrv", "fear_greed", "change_30d", "volatility_30d"]
+
+# 与TrendAnalyzer一致：30日变化使用prices[29]，波动率使用最近30个价格
+LOOKBACK_30D = 29
+VOLATILITY_WINDOW = 30
+
+
+class _KDTree:
+    """静态KD树，叶子节点内使用numpy批量计算距离"""
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 16):
+        self.points = points
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(points))
+        # 节点: [axis, split, left, right, start, end]，叶子节点axis为-1
+        self.nodes: List[list] = []
+        if len(points):
+            self._build(0, len(points), 0)
+
+    def _build(self, start: int, end: int, depth: int) -> int:
+        node_id = len(self.nodes)
+        self.nodes.append([-1, 0.0, -1, -1, start, end])
+        if end - start <= self.leaf_size:
+            return node_id
+
+        idx = self.order[start:end]
+        spread = self.points[idx].max(axis=0) - self.points[idx].min(axis=0)
+        axis = int(np.argmax(spread))
+        if spread[axis] == 0:
+            return node_id
+
+        mid = (end - start) // 2
+        part = np.argpartition(self.points[idx, axis], mid)
+        self.order[start:end] = idx[part]
+        split = float(self.points[self.order[start + mid], axis])
+
+        left = self._build(start, start + mid, depth + 1)
+        right = self._build(start + mid, end, depth + 1)
+        self.nodes[node_id] = [axis, split, left, right, start, end]
+        return node_id
+
+    def query(self, x: np.ndarray, k: int, max_id: int) -> List[Tuple[float, int]]:
+        """检索k个最近邻，只考虑编号不超过max_id的点
+
+        Returns:
+            [(距离平方, 点编号)]，按距离升序
+        """
+        if not self.nodes:
+            return []
+
+        heap: List[Tuple[float, int]] = []  # 存(-距离平方, 编号)的大顶堆
+        stack = [(0, 0.0)]
+        while stack:
+            node_id, bound = stack.pop()
+            if len(heap) == k and bound > -heap[0][0]:
+                continue
+
+            axis, split, left, right, start, end = self.nodes[node_id]
+            if axis < 0:
+                ids = self.order[start:end]
+                ids = ids[ids <= max_id]
+                if len(ids) == 0:
+                    continue
+                d2 = np.sum((self.points[ids] - x) ** 2, axis=1)
+                for dist, point_id in zip(d2.tolist(), ids.tolist()):
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-dist, point_id))
+                    elif dist < -heap[0][0]:
+                        heapq.heapreplace(heap, (-dist, point_id))
+                continue
+
+            diff = x[axis] - split
+            near, far = (left, right) if diff < 0 else (right, left)
+            # 先压入远侧，后压入近侧，保证近侧先被访问
+            stack.append((far, max(bound, diff * diff)))
+            stack.append((near, bound))
+
+        return sorted((-d, i) for d, i in heap)
+
+
+class AnalogFinder:
+    """历史相似行情检索器"""
+
+    def __init__(self, exclusion_days: int = 30, horizons: Iterable[int] = (7, 30, 90),
+                 rebuild_threshold: int = 64):
+        """初始化相似行情检索器
+
+        Args:
+            exclusion_days: 检索时排除查询日之前多少天内的日期（避免匹配到"昨天"）
+            horizons: 统计后续价格表现的天数
+            rebuild_threshold: 未索引缓冲区超过该数量时重建KD树
+        """
+        self.exclusion_days = exclusion_days
+        self.horizons = list(horizons)
+        self.rebuild_threshold = rebuild_threshold
+
+        self.dates: List[str] = []
+        self.prices: List[float] = []
+        # 有完整特征的日期：在self.dates中的位置及原始特征
+        self.feature_rows: List[int] = []
+        self.features = np.empty((0, len(FEATURE_NAMES)), dtype=np.float64)
+
+        self._tree: Optional[_KDTree] = None
+        self._indexed = 0
+        self._mean = None
+        self._std = None
+
+    @classmethod
+    def from_daily_rows(cls, rows: List[Dict[str, Any]], **kwargs) -> "AnalogFinder":
+        """由按日期整合的数据（daily_data.json中的行）构建"""
+        finder = cls(**kwargs)
+        finder.add_days(rows)
+        return finder
+
+    @classmethod
+    def from_historical_data(cls, historical_data: Dict[str, Any], **kwargs) -> "AnalogFinder":
+        """由HistoricalDataCollector返回的历史数据构建"""
+        from utils.data_reorganizer import reorganize_by_date
+        rows = sorted(reorganize_by_date(historical_data).values(), key=lambda x: x["date"])
+        return cls.from_daily_rows(rows, **kwargs)
+
+    def add_days(self, rows: List[Dict[str, Any]]):
+        """追加新的日期（需晚于已有日期），新日期进入未索引缓冲区"""
+        rows = sorted((r for r in rows if r.get("date") and r.get("price") is not None), key=lambda r: r["date"])
+        if self.dates:
+            rows = [r for r in rows if r["date"] > self.dates[-1]]
+        if not rows:
+            return
+
+        new_features = []
+        for row in rows:
+            self.dates.append(row["date"])
+            self.prices.append(float(row["price"]))
+            position = len(self.prices) - 1
+            if position < LOOKBACK_30D or row.get("mvrv") is None or row.get("fear_greed_value") is None:
+                continue
+
+            window = np.array(self.prices[-VOLATILITY_WINDOW:])
+            change_30d = (self.prices[-1] / self.prices[-1 - LOOKBACK_30D] - 1) * 100
+            volatility_30d = np.std(window) / np.mean(window) * 100
+            new_features.append([float(row["mvrv"]), float(row["fear_greed_value"]), change_30d, volatility_30d])
+            self.feature_rows.append(position)
+
+        if new_features:
+            self.features = np.vstack([self.features, np.array(new_features, dtype=np.float64)])
+
+        if self._tree is None or len(self.feature_rows) - self._indexed > self.rebuild_threshold:
+            self.rebuild()
+
+    def rebuild(self):
+        """重新计算标准化参数并重建KD树"""
+        if len(self.features) == 0:
+            self._tree = None
+            self._indexed = 0
+            return
+
+        self._mean = self.features.mean(axis=0)
+        std = self.features.std(axis=0)
+        self._std = np.where(std > 0, std, 1.0)
+        self._tree = _KDTree(self._normalize(self.features))
+        self._indexed = len(self.features)
+        logger.info(f"已重建相似行情索引，共{self._indexed}天")
+
+    def _normalize(self, features: np.ndarray) -> np.ndarray:
+        return (features - self._mean) / self._std
+
+    def _forward_returns(self, position: int) -> Dict[str, Optional[float]]:
+        """某日之后各观察期的价格涨跌幅"""
+        result = {}
+        for horizon in self.horizons:
+            target = position + horizon
+            key = f"return_{horizon}d"
+            if target < len(self.prices):
+                result[key] = (self.prices[target] / self.prices[position] - 1) * 100
+            else:
+                result[key] = None
+        return result
+
+    def query(self, date: Optional[str] = None, k: int = 5) -> Dict[str, Any]:
+        """检索与指定日期（默认最新有完整特征的日期）最相似的k个历史日期
+
+        Returns:
+            检索结果字典，status为success或error
+        """
+        if len(self.features) == 0 or self._tree is None:
+            return {"status": "error", "message": "没有足够的历史数据构建相似行情索引"}
+
+        if date is None:
+            query_index = len(self.feature_rows) - 1
+        else:
+            positions = [self.dates[p] for p in self.feature_rows]
+            if date not in positions:
+                return {"status": "error", "message": f"{date}缺少完整特征，无法检索"}
+            query_index = positions.index(date)
+
+        query_position = self.feature_rows[query_index]
+        x = self._normalize(self.features[query_index])
+
+        # 只允许匹配查询日exclusion_days天之前的日期；feature_rows按时间升序
+        cutoff_position = query_position - self.exclusion_days
+        max_id = int(np.searchsorted(self.feature_rows, cutoff_position, side="right")) - 1
+        if max_id < 0:
+            return {"status": "error", "message": "查询日期之前没有足够的历史数据"}
+
+        candidates = self._tree.query(x, k, min(max_id, self._indexed - 1))
+
+        # 缓冲区中尚未索引的日期直接暴力比较
+        if max_id >= self._indexed:
+            buffer_ids = np.arange(self._indexed, max_id + 1)
+            d2 = np.sum((self._normalize(self.features[buffer_ids]) - x) ** 2, axis=1)
+            candidates = sorted(candidates + list(zip(d2.tolist(), buffer_ids.tolist())))[:k]
+
+        analogs = []
+        for dist2, feature_id in candidates:
+            position = self.feature_rows[feature_id]
+            item = {
+                "date": self.dates[position],
+                "distance": float(np.sqrt(dist2)),
+                "price": self.prices[position],
+            }
+            item.update({name: float(v) for name, v in zip(FEATURE_NAMES, self.features[feature_id])})
+            item.update(self._forward_returns(position))
+            analogs.append(item)
+
+        current = {"date": self.dates[query_position], "price": self.prices[query_position]}
+        current.update({name: float(v) for name, v in zip(FEATURE_NAMES, self.features[query_index])})
+        return {"status": "success", "current": current, "analogs": analogs}
+
+    def format_analogs(self, date: Optional[str] = None, k: int = 5) -> str:
+        """格式化相似行情检索结果，用于报告和AI提示词"""
+        result = self.query(date, k)
+        if result["status"] == "error":
+            return f"无法检索历史相似行情: {result['message']}"
+
+        current = result["current"]
+        output = [
+            f"当前({current['date']}): MVRV {current['mvrv']:.3f}, 恐惧贪婪 {current['fear_greed']:.0f}, "
+            f"30日涨跌 {current['change_30d']:.2f}%, 30日波动率 {current['volatility_30d']:.2f}%"
+        ]
+        for item in result["analogs"]:
+            outcome = ", ".join(
+                f"{h}日后 {item[f'return_{h}d']:+.2f}%" if item[f"return_{h}d"] is not None else f"{h}日后 N/A"
+                for h in self.horizons
+            )
+            output.append(
+                f"  {item['date']} (距离 {item['distance']:.2f}): 价格 ${item['price']:,.0f}, "
+                f"MVRV {item['mvrv']:.3f}, 恐惧贪婪 {item['fear_greed']:.0f}, "
+                f"30日涨跌 {item['change_30d']:.2f}% → {outcome}"
+            )
+        return "\n".join(output)
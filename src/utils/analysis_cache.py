@@ -0,0 +1,136 @@
+"""
+分析结果缓存模块 - 按输入内容指纹缓存TrendAnalyzer的分析结果
+
+historical_data每12小时才刷新一次，而生成报告、菜单查看、调试运行都会
+重新执行完整的分析。本模块以"输入序列 + 分析参数"的内容哈希作为键，
+在内存（LRU）和磁盘上缓存分析结果，输入未变化时直接返回。
+读取时返回缓存条目的副本，调用方修改结果（如更新生成时间）不会影响缓存。
+"""
+
+import os
+import copy
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 分析逻辑或输出格式变化时递增，使旧缓存失效
+CACHE_VERSION = 4
+
+
+def fingerprint(*parts: Any) -> str:
+    """计算任意可JSON序列化内容的SHA-256指纹"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class AnalysisCache:
+    """内存LRU + 磁盘的两级结果缓存"""
+
+    def __init__(self, cache_dir: str = "cache/analysis", max_memory_entries: int = 32,
+                 max_disk_entries: int = 256):
+        """初始化缓存
+
+        Args:
+            cache_dir: 磁盘缓存目录，为None时只使用内存缓存
+            max_memory_entries: 内存中保留的最大条目数
+            max_disk_entries: 磁盘上保留的最大条目数
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        """写入内存LRU并淘汰最久未使用的条目"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """查找缓存条目，内存未命中时尝试磁盘（不计入命中统计，返回缓存中的对象本身）"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        if self.cache_dir:
+            path = self._path(key)
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        value = json.load(f)
+                    # 更新访问时间，供磁盘LRU淘汰使用
+                    os.utime(path, None)
+                    self._remember(key, value)
+                    return value
+                except Exception as e:
+                    logger.warning(f"读取分析缓存出错: {str(e)}")
+        return None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """读取缓存（返回副本），内存未命中时尝试磁盘"""
+        value = self._lookup(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """写入缓存"""
+        self._remember(key, copy.deepcopy(value))
+        if not self.cache_dir:
+            return
+
+        try:
+            path = self._path(key)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+        except Exception as e:
+            logger.warning(f"写入分析缓存出错: {str(e)}")
+
+    def _evict_disk(self):
+        """按最近访问时间淘汰超出上限的磁盘条目"""
+        entries = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir) if name.endswith(".json")
+        ]
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_or_compute(self, key: str, compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """命中则直接返回，否则计算并缓存（status为error的结果不缓存）"""
+        cached = self.get(key)
+        if cached is not None:
+            logger.info(f"分析结果缓存命中: {key[:12]}")
+            return cached
+
+        value = compute()
+        if value.get("status") != "error":
+            self.set(key, value)
+        return value
@@ -0,0 +1,465 @@
+"""
+规则回测模块 - 在完整历史数据上回测TrendAnalyzer的规则建议
+
+TrendAnalyzer只对"今天"给出一次建议，逐日调用generate_investment_advice
+回放历史非常慢。本模块把价格、MVRV、恐惧贪婪三类规则以及综合加权规则
+改写为覆盖全部历史的numpy向量掩码，一次计算出每天的建议动作，
+再模拟仓位变化和手续费，输出收益、最大回撤和命中率。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from utils.trend_analyzer import merge_advice_params
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 规则可能给出的全部动作（顺序即动作编码）
+ACTIONS = [
+    "逐步买入",
+    "小幅买入",
+    "逢低小幅买入",
+    "谨慎小幅买入",
+    "持有",
+    "谨慎持有",
+    "观望",
+    "观望或小幅减仓",
+    "考虑减仓",
+    "大幅减仓",
+]
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+# 每个动作对应的仓位调整幅度（占总预算的比例）
+ACTION_POSITION_DELTA = {
+    "逐步买入": 0.20,
+    "小幅买入": 0.10,
+    "逢低小幅买入": 0.10,
+    "谨慎小幅买入": 0.05,
+    "持有": 0.0,
+    "谨慎持有": 0.0,
+    "观望": 0.0,
+    "观望或小幅减仓": -0.10,
+    "考虑减仓": -0.20,
+    "大幅减仓": -0.50,
+}
+
+# 恐惧贪婪指数分类编码，与Alternative.me的value_classification对应
+FEAR_GREED_CLASSES = ["Extreme Fear", "Fear", "Neutral", "Greed", "Extreme Greed"]
+
+# 与TrendAnalyzer保持一致的回看窗口：prices[6]和prices[29]
+LOOKBACK_7D = 6
+LOOKBACK_30D = 29
+
+
+def align_history(historical_data: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """将historical_data中的三类序列按日期对齐为等长数组
+
+    以BTC价格的日期为主轴（从旧到新），缺失的MVRV/恐惧贪婪值记为NaN，
+    缺失的恐惧贪婪分类记为-1。
+
+    Args:
+        historical_data: HistoricalDataCollector返回的历史数据字典
+
+    Returns:
+        包含dates/price/mvrv/fear_greed/fear_greed_class数组的字典
+    """
+    btc_data = [item for item in historical_data.get("btc_price", []) if item.get("date") and "price" in item]
+    btc_by_date = {item["date"]: float(item["price"]) for item in btc_data}
+    dates = sorted(btc_by_date)
+
+    mvrv_by_date = {
+        item["date"]: float(item["mvrv"])
+        for item in historical_data.get("mvrv", []) if item.get("date") and item.get("mvrv") is not None
+    }
+    fg_by_date = {
+        item["date"]: item
+        for item in historical_data.get("fear_greed", []) if item.get("date") and "value" in item
+    }
+    class_codes = {name: code for code, name in enumerate(FEAR_GREED_CLASSES)}
+
+    n = len(dates)
+    price = np.empty(n, dtype=np.float64)
+    mvrv = np.full(n, np.nan, dtype=np.float64)
+    fear_greed = np.full(n, np.nan, dtype=np.float64)
+    fear_greed_class = np.full(n, -1, dtype=np.int8)
+
+    for i, date in enumerate(dates):
+        price[i] = btc_by_date[date]
+        if date in mvrv_by_date:
+            mvrv[i] = mvrv_by_date[date]
+        fg_item = fg_by_date.get(date)
+        if fg_item is not None:
+            fear_greed[i] = float(fg_item["value"])
+            fear_greed_class[i] = class_codes.get(fg_item.get("value_classification", ""), -1)
+
+    return {
+        "dates": np.array(dates),
+        "price": price,
+        "mvrv": mvrv,
+        "fear_greed": fear_greed,
+        "fear_greed_class": fear_greed_class,
+    }
+
+
+def _pct_change(values: np.ndarray, lag: int) -> np.ndarray:
+    """计算相对lag天前的百分比变化，前lag天为NaN"""
+    change = np.full(values.shape, np.nan, dtype=np.float64)
+    if len(values) > lag:
+        change[lag:] = (values[lag:] / values[:-lag] - 1) * 100
+    return change
+
+
+def _select(conditions: List[np.ndarray], choices: List[str], default: str) -> np.ndarray:
+    """按条件掩码选择动作编码，等价于规则中的if/elif链"""
+    return np.select(
+        conditions,
+        [ACTION_CODES[choice] for choice in choices],
+        default=ACTION_CODES[default],
+    ).astype(np.int16)
+
+
+def price_based_actions(price: np.ndarray, params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """向量化的_get_price_based_advice
+
+    Returns:
+        包含action（动作编码）与confidence（置信度权重）数组的字典
+    """
+    change_7d = _pct_change(price, LOOKBACK_7D)
+    change_30d = _pct_change(price, LOOKBACK_30D)
+
+    up_7d = change_7d > 0
+    up_30d = change_30d > 0
+
+    both_up = up_30d & up_7d
+    pullback = up_30d & ~up_7d
+    rebound = ~up_30d & up_7d
+    both_down = ~up_30d & ~up_7d
+
+    crash = both_down & (change_30d < params["price_crash_30d"])
+    conditions = [
+        both_up & (change_7d > params["price_surge_7d"]),
+        both_up,
+        pullback & (change_7d < params["price_dip_7d"]),
+        pullback,
+        rebound,
+        crash,
+    ]
+    choices = ["观望或小幅减仓", "持有", "逢低小幅买入", "持有", "谨慎持有", "谨慎小幅买入"]
+    action = _select(conditions, choices, "观望")
+
+    weights = params["confidence_weights"]
+    confidence = np.select(
+        [rebound, crash],
+        [weights["低"], weights["低"]],
+        default=weights["中"],
+    ).astype(np.float64)
+
+    return {"action": action, "confidence": confidence, "valid": ~np.isnan(change_30d)}
+
+
+def mvrv_based_actions(mvrv: np.ndarray, params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """向量化的_get_mvrv_based_advice（MVRV区间由np.digitize一次划分）"""
+    band = np.digitize(mvrv, params["mvrv_bands"])
+    band_actions = ["逐步买入", "持有", "谨慎持有", "考虑减仓", "大幅减仓"]
+    band_confidence = ["中高", "中", "中", "中高", "高"]
+
+    weights = params["confidence_weights"]
+    action_lookup = np.array([ACTION_CODES[a] for a in band_actions], dtype=np.int16)
+    confidence_lookup = np.array([weights[c] for c in band_confidence], dtype=np.float64)
+
+    return {
+        "action": action_lookup[band],
+        "confidence": confidence_lookup[band],
+        "valid": ~np.isnan(mvrv),
+    }
+
+
+def fear_greed_based_actions(fear_greed_class: np.ndarray, params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """向量化的_get_fear_greed_based_advice（按分类编码查表）"""
+    class_actions = ["逐步买入", "小幅买入", "持有", "谨慎持有", "考虑减仓"]
+    class_confidence = ["中高", "中", "中", "中", "中高"]
+
+    weights = params["confidence_weights"]
+    action_lookup = np.array([ACTION_CODES[a] for a in class_actions], dtype=np.int16)
+    confidence_lookup = np.array([weights[c] for c in class_confidence], dtype=np.float64)
+
+    valid = fear_greed_class >= 0
+    index = np.where(valid, fear_greed_class, 0)
+    return {
+        "action": action_lookup[index],
+        "confidence": confidence_lookup[index],
+        "valid": valid,
+    }
+
+
+def overall_actions(sources: List[Dict[str, np.ndarray]], params: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """向量化的_get_overall_advice
+
+    每个来源的得分为所有给出相同动作的来源置信度之和；取得分最高的来源动作，
+    并列时取靠前的来源，与原实现中dict插入顺序 + max()的行为一致。
+    """
+    actions = np.stack([np.where(s["valid"], s["action"], -1) for s in sources])
+    weights = np.stack([np.where(s["valid"], s["confidence"], 0) for s in sources]).astype(np.float64)
+
+    # same[i, j, t]: 第t天来源i与来源j给出相同动作
+    same = actions[:, None, :] == actions[None, :, :]
+    scores = (same * weights[None, :, :]).sum(axis=1)
+    scores = np.where(actions >= 0, scores, -1)
+
+    winner = np.argmax(scores, axis=0)
+    columns = np.arange(actions.shape[1])
+    action = actions[winner, columns]
+    max_weight = scores[winner, columns]
+
+    high, mid_high, mid = params["confidence_thresholds"]
+    confidence = np.select(
+        [max_weight >= high, max_weight >= mid_high, max_weight >= mid],
+        ["高", "中高", "中"],
+        default="低",
+    )
+    return {"action": action, "confidence": confidence, "weight": max_weight}
+
+
+class AdviceBacktester:
+    """规则建议回测器 - 一次性向量化计算每天的建议并模拟仓位与收益"""
+
+    def __init__(self, historical_data=None, fee_rate: float = 0.001, hit_horizon: int = 7,
+                 advice_params: Optional[Dict[str, Any]] = None):
+        """初始化回测器
+
+        Args:
+            historical_data: HistoricalDataCollector返回的历史数据字典
+            fee_rate: 单边手续费率，按仓位变动比例收取
+            hit_horizon: 计算命中率时观察的未来天数
+            advice_params: 覆盖DEFAULT_ADVICE_PARAMS中的规则阈值和权重
+        """
+        self.historical_data = historical_data
+        self.fee_rate = fee_rate
+        self.hit_horizon = hit_horizon
+        self.advice_params = merge_advice_params(advice_params)
+
+    def set_historical_data(self, historical_data):
+        """设置历史数据"""
+        self.historical_data = historical_data
+
+    def evaluate_rules(self, aligned: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """对齐后的历史上逐日计算各规则的动作编码"""
+        params = self.advice_params
+        price_src = price_based_actions(aligned["price"], params)
+        mvrv_src = mvrv_based_actions(aligned["mvrv"], params)
+        fg_src = fear_greed_based_actions(aligned["fear_greed_class"], params)
+        overall = overall_actions([price_src, mvrv_src, fg_src], params)
+
+        return {
+            "price_based": price_src["action"],
+            "mvrv_based": np.where(mvrv_src["valid"], mvrv_src["action"], -1),
+            "fear_greed_based": np.where(fg_src["valid"], fg_src["action"], -1),
+            "overall": overall["action"],
+            "overall_confidence": overall["confidence"],
+            "valid": price_src["valid"],
+        }
+
+    def simulate(self, price: np.ndarray, actions: np.ndarray) -> Dict[str, np.ndarray]:
+        """根据每日动作模拟仓位、手续费和净值
+
+        第t天收盘给出的建议在第t天收盘执行，承担第t+1天的价格变动，避免前视偏差。
+        """
+        delta_lookup = np.array([ACTION_POSITION_DELTA[a] for a in ACTIONS], dtype=np.float64)
+        deltas = np.where(actions >= 0, delta_lookup[np.maximum(actions, 0)], 0.0)
+
+        # 仓位在[0, 1]之间截断的累加无法直接向量化，只在仓位变化的日子上推进
+        position = np.empty(len(deltas), dtype=np.float64)
+        current = 0.0
+        last = 0
+        for i in np.flatnonzero(deltas):
+            position[last:i] = current
+            current = min(1.0, max(0.0, current + deltas[i]))
+            last = i
+        position[last:] = current
+
+        returns = np.zeros(len(price), dtype=np.float64)
+        returns[1:] = price[1:] / price[:-1] - 1
+
+        turnover = np.abs(np.diff(position, prepend=0.0))
+        strategy_returns = np.zeros(len(price), dtype=np.float64)
+        strategy_returns[1:] = position[:-1] * returns[1:]
+        strategy_returns -= turnover * self.fee_rate
+
+        equity = np.cumprod(1 + strategy_returns)
+        return {
+            "position": position,
+            "returns": returns,
+            "strategy_returns": strategy_returns,
+            "turnover": turnover,
+            "equity": equity,
+        }
+
+    def _hit_rate(self, price: np.ndarray, actions: np.ndarray) -> Dict[str, Any]:
+        """买入信号后hit_horizon天上涨、减仓信号后下跌记为命中"""
+        horizon = self.hit_horizon
+        forward = np.full(len(price), np.nan, dtype=np.float64)
+        if len(price) > horizon:
+            forward[:-horizon] = price[horizon:] / price[:-horizon] - 1
+
+        delta_lookup = np.array([ACTION_POSITION_DELTA[a] for a in ACTIONS], dtype=np.float64)
+        deltas = np.where(actions >= 0, delta_lookup[np.maximum(actions, 0)], 0.0)
+
+        known = ~np.isnan(forward)
+        buys = (deltas > 0) & known
+        sells = (deltas < 0) & known
+        buy_hits = int(np.count_nonzero(buys & (forward > 0)))
+        sell_hits = int(np.count_nonzero(sells & (forward < 0)))
+        signals = int(np.count_nonzero(buys) + np.count_nonzero(sells))
+
+        return {
+            "hit_rate": (buy_hits + sell_hits) / signals * 100 if signals else None,
+            "buy_signals": int(np.count_nonzero(buys)),
+            "sell_signals": int(np.count_nonzero(sells)),
+            "buy_hits": buy_hits,
+            "sell_hits": sell_hits,
+        }
+
+    @staticmethod
+    def _max_drawdown(equity: np.ndarray) -> float:
+        """最大回撤（百分比）"""
+        if len(equity) == 0:
+            return 0.0
+        peaks = np.maximum.accumulate(equity)
+        return float(np.max(1 - equity / peaks) * 100)
+
+    def run(self, rule: str = "overall") -> Dict[str, Any]:
+        """执行回测
+
+        Args:
+            rule: 用于交易的规则，可选 overall/price_based/mvrv_based/fear_greed_based
+
+        Returns:
+            回测结果字典，status为success或error
+        """
+        logger.info(f"开始回测规则建议: {rule}")
+
+        if not self.historical_data or "btc_price" not in self.historical_data:
+            logger.error("没有BTC价格历史数据可供回测")
+            return {
+                "status": "error",
+                "message": "没有BTC价格历史数据可供回测"
+            }
+
+        aligned = align_history(self.historical_data)
+        result = self.evaluate(aligned, rule=rule)
+        if result["status"] == "success":
+            result["formatted_output"] = self._format_backtest_output(result)
+        return result
+
+    def evaluate(self, aligned: Dict[str, np.ndarray], rule: str = "overall") -> Dict[str, Any]:
+        """在已对齐的数组上执行回测并计算指标（不生成格式化输出）
+
+        Args:
+            aligned: align_history返回的数组字典
+            rule: 用于交易的规则
+
+        Returns:
+            回测指标字典，status为success或error
+        """
+        if len(aligned["price"]) <= LOOKBACK_30D + 1:
+            logger.error(f"BTC价格数据不足，只有{len(aligned['price'])}天，至少需要{LOOKBACK_30D + 2}天数据")
+            return {
+                "status": "error",
+                "message": f"BTC价格数据不足，只有{len(aligned['price'])}天，至少需要{LOOKBACK_30D + 2}天数据"
+            }
+
+        rules = self.evaluate_rules(aligned)
+        if rule not in rules or rule in ("valid", "overall_confidence"):
+            return {
+                "status": "error",
+                "message": f"未知的回测规则: {rule}"
+            }
+
+        # 丢弃30日变化尚不可计算的预热期
+        start = int(np.argmax(rules["valid"]))
+        price = aligned["price"][start:]
+        actions = rules[rule][start:]
+        dates = aligned["dates"][start:]
+
+        sim = self.simulate(price, actions)
+        equity = sim["equity"]
+        days = len(price)
+
+        total_return = (equity[-1] - 1) * 100
+        years = days / 365
+        annual_return = (equity[-1] ** (1 / years) - 1) * 100 if years > 0 and equity[-1] > 0 else None
+        benchmark_return = (price[-1] / price[0] - 1) * 100
+        max_drawdown = self._max_drawdown(equity)
+
+        daily = sim["strategy_returns"][1:]
+        std = float(np.std(daily))
+        sharpe = float(np.mean(daily) / std * np.sqrt(365)) if std > 0 else None
+        calmar = float(annual_return / max_drawdown) if annual_return is not None and max_drawdown > 0 else None
+
+        counts = np.bincount(actions[actions >= 0], minlength=len(ACTIONS))
+        action_counts = {ACTIONS[i]: int(c) for i, c in enumerate(counts) if c}
+
+        result = {
+            "status": "success",
+            "rule": rule,
+            "start_date": str(dates[0]),
+            "end_date": str(dates[-1]),
+            "days": days,
+            "fee_rate": self.fee_rate,
+            "total_return": float(total_return),
+            "annual_return": float(annual_return) if annual_return is not None else None,
+            "benchmark_return": float(benchmark_return),
+            "max_drawdown": max_drawdown,
+            "sharpe": sharpe,
+            "calmar": calmar,
+            "benchmark_max_drawdown": self._max_drawdown(price / price[0]),
+            "total_fees": float(np.sum(sim["turnover"]) * self.fee_rate * 100),
+            "trades": int(np.count_nonzero(sim["turnover"])),
+            "exposure": float(np.mean(sim["position"]) * 100),
+            "final_position": float(sim["position"][-1] * 100),
+            "action_counts": action_counts,
+        }
+        result.update(self._hit_rate(price, actions))
+        return result
+
+    def _format_backtest_output(self, result: Dict[str, Any]) -> str:
+        """格式化回测结果输出"""
+        output = []
+        output.append("=============== 规则建议回测报告 ===============")
+        output.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+        output.append(f"回测规则: {result['rule']}")
+        output.append(f"回测区间: {result['start_date']} ~ {result['end_date']} ({result['days']}天)")
+        output.append(f"手续费率: {result['fee_rate'] * 100:.3f}%")
+        output.append("")
+
+        output.append("【📈 收益表现】")
+        output.append(f"策略总收益: {result['total_return']:.2f}%")
+        if result.get("annual_return") is not None:
+            output.append(f"策略年化收益: {result['annual_return']:.2f}%")
+        output.append(f"持有基准收益: {result['benchmark_return']:.2f}%")
+        output.append(f"策略最大回撤: {result['max_drawdown']:.2f}%")
+        if result.get("sharpe") is not None:
+            output.append(f"夏普比率: {result['sharpe']:.2f}")
+        output.append(f"基准最大回撤: {result['benchmark_max_drawdown']:.2f}%")
+        output.append(f"累计手续费: {result['total_fees']:.3f}%")
+        output.append("")
+
+        output.append("【🎯 信号统计】")
+        if result.get("hit_rate") is not None:
+            output.append(f"命中率({self.hit_horizon}日): {result['hit_rate']:.2f}%")
+        output.append(f"买入信号: {result['buy_signals']} (命中 {result['buy_hits']})")
+        output.append(f"减仓信号: {result['sell_signals']} (命中 {result['sell_hits']})")
+        output.append(f"调仓次数: {result['trades']}")
+        output.append(f"平均仓位: {result['exposure']:.2f}%")
+        output.append(f"期末仓位: {result['final_position']:.2f}%")
+        output.append("动作分布:")
+        for action, count in sorted(result["action_counts"].items(), key=lambda x: -x[1]):
+            output.append(f"  {action}: {count}天")
+
+        output.append("\n=============== 报告结束 ===============")
+        return "\n".join(output)
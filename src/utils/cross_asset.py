@@ -0,0 +1,221 @@
+"""
+跨资产分析模块 - 批量计算滚动相关系数矩阵和Beta矩阵
+
+TrendAnalyzer只单独分析BTC。本模块把一组资产价格以及情绪序列
+（MVRV、恐惧贪婪指数）对齐为一个 T×N 矩阵，用累积和一次性得到
+所有窗口的一阶/二阶滚动矩（均值、协方差），相关系数和Beta都由
+同一份滚动矩推导，不再为每对序列重复计算。结果按窗口缓存。
+"""
+
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def align_series(series: Dict[str, Dict[str, float]]) -> Tuple[List[str], List[str], np.ndarray]:
+    """按日期对齐多条序列
+
+    Args:
+        series: {名称: {日期: 数值}}
+
+    Returns:
+        (日期列表, 名称列表, T×N矩阵)，缺失值为NaN
+    """
+    names = list(series)
+    dates = sorted(set().union(*(s.keys() for s in series.values()))) if series else []
+    index = {date: i for i, date in enumerate(dates)}
+
+    matrix = np.full((len(dates), len(names)), np.nan, dtype=np.float64)
+    for j, name in enumerate(names):
+        for date, value in series[name].items():
+            if value is not None:
+                matrix[index[date], j] = float(value)
+    return dates, names, matrix
+
+
+def series_from_historical_data(historical_data: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """从historical_data提取BTC价格、MVRV和恐惧贪婪序列"""
+    return {
+        "BTC": {item["date"]: item["price"] for item in historical_data.get("btc_price", []) if "price" in item},
+        "MVRV": {item["date"]: item["mvrv"] for item in historical_data.get("mvrv", []) if "mvrv" in item},
+        "FEAR_GREED": {item["date"]: item["value"] for item in historical_data.get("fear_greed", []) if "value" in item},
+    }
+
+
+class CrossAssetAnalyzer:
+    """跨资产滚动相关性与Beta分析器"""
+
+    def __init__(self, series: Dict[str, Dict[str, float]], use_returns: Optional[Dict[str, bool]] = None):
+        """初始化跨资产分析器
+
+        Args:
+            series: {名称: {日期: 数值}}，价格类与指标类序列均可
+            use_returns: 各序列是否先转换为对数收益率，默认全部转换；
+                         恐惧贪婪这类有界指标可设为False，改用逐日差分
+        """
+        self.dates, self.names, levels = align_series(series)
+        use_returns = use_returns or {}
+
+        # 缺失值向前填充，保证收益率序列连续
+        levels = self._forward_fill(levels)
+
+        changes = np.full(levels.shape, np.nan, dtype=np.float64)
+        for j, name in enumerate(self.names):
+            column = levels[:, j]
+            if use_returns.get(name, True):
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    changes[1:, j] = np.log(column[1:] / column[:-1])
+            else:
+                changes[1:, j] = np.diff(column)
+        self.changes = changes
+
+        self._moments_cache: Dict[int, Dict[str, np.ndarray]] = {}
+        self._matrix_cache: Dict[int, Dict[str, np.ndarray]] = {}
+
+    @classmethod
+    def from_historical_data(cls, historical_data: Dict[str, Any],
+                             extra_series: Optional[Dict[str, Dict[str, float]]] = None):
+        """由historical_data构建，可附加其他资产的{日期: 价格}序列"""
+        series = series_from_historical_data(historical_data)
+        if extra_series:
+            series.update(extra_series)
+        return cls(series, use_returns={"FEAR_GREED": False})
+
+    @staticmethod
+    def _forward_fill(matrix: np.ndarray) -> np.ndarray:
+        """按列向前填充NaN"""
+        mask = np.isnan(matrix)
+        index = np.where(~mask, np.arange(matrix.shape[0])[:, None], 0)
+        np.maximum.accumulate(index, axis=0, out=index)
+        return matrix[index, np.arange(matrix.shape[1])]
+
+    def rolling_moments(self, window: int) -> Dict[str, np.ndarray]:
+        """计算窗口内的滚动均值与协方差（所有序列对一次完成，按窗口缓存）
+
+        使用累积和：窗口和 = S[t] - S[t-window]。
+        缺失的收益率置0并单独统计缺失数，只有窗口内完整的序列（对）才有结果。
+
+        Returns:
+            mean: (T, N) 滚动均值
+            cov:  (T, N, N) 滚动协方差
+            valid:(T, N) 窗口内该序列没有缺失的时刻
+        """
+        if window in self._moments_cache:
+            return self._moments_cache[window]
+
+        x = self.changes
+        missing = np.isnan(x)
+        x0 = np.where(missing, 0.0, x)
+
+        T, N = x0.shape
+        zero_row = np.zeros((1, N))
+        s1 = np.concatenate([zero_row, np.cumsum(x0, axis=0)])
+        s2 = np.concatenate([np.zeros((1, N, N)), np.cumsum(x0[:, :, None] * x0[:, None, :], axis=0)])
+        miss = np.concatenate([np.zeros((1, N), dtype=np.int64), np.cumsum(missing, axis=0)])
+
+        mean = np.full((T, N), np.nan)
+        cov = np.full((T, N, N), np.nan)
+        valid = np.zeros((T, N), dtype=bool)
+
+        if T >= window:
+            end = np.arange(window, T + 1)
+            sum1 = s1[end] - s1[end - window]
+            sum2 = s2[end] - s2[end - window]
+            m = sum1 / window
+            c = sum2 / window - m[:, :, None] * m[:, None, :]
+            ok = (miss[end] - miss[end - window]) == 0
+
+            mean[window - 1:] = np.where(ok, m, np.nan)
+            cov[window - 1:] = np.where(ok[:, :, None] & ok[:, None, :], c, np.nan)
+            valid[window - 1:] = ok
+
+        moments = {"mean": mean, "cov": cov, "valid": valid}
+        self._moments_cache[window] = moments
+        return moments
+
+    def rolling_matrices(self, window: int) -> Dict[str, np.ndarray]:
+        """滚动相关系数矩阵和Beta矩阵（按窗口缓存）
+
+        Returns:
+            corr: (T, N, N) corr[t, i, j] 为序列i与j的相关系数
+            beta: (T, N, N) beta[t, i, j] 为序列i相对序列j的Beta（cov_ij / var_j）
+        """
+        if window in self._matrix_cache:
+            return self._matrix_cache[window]
+
+        cov = self.rolling_moments(window)["cov"]
+        var = np.diagonal(cov, axis1=1, axis2=2)
+        var = np.where(var > 0, var, np.nan)
+        std = np.sqrt(var)
+
+        corr = cov / (std[:, :, None] * std[:, None, :])
+        np.clip(corr, -1.0, 1.0, out=corr)
+        beta = cov / var[:, None, :]
+
+        matrices = {"corr": corr, "beta": beta}
+        self._matrix_cache[window] = matrices
+        return matrices
+
+    def latest(self, window: int = 30, benchmark: str = "BTC") -> Dict[str, Any]:
+        """最新时刻的相关系数矩阵和各序列相对基准的Beta
+
+        Returns:
+            分析结果字典，status为success或error
+        """
+        if benchmark not in self.names:
+            return {
+                "status": "error",
+                "message": f"基准序列不存在: {benchmark}"
+            }
+
+        b = self.names.index(benchmark)
+        moments = self.rolling_moments(window)
+        valid_rows = np.flatnonzero(moments["valid"][:, b])
+        if len(valid_rows) == 0:
+            logger.error(f"数据不足，无法计算{window}日滚动相关性")
+            return {
+                "status": "error",
+                "message": f"数据不足，无法计算{window}日滚动相关性"
+            }
+
+        t = int(valid_rows[-1])
+        matrices = self.rolling_matrices(window)
+
+        corr = matrices["corr"][t]
+        beta = matrices["beta"][t]
+        return {
+            "status": "success",
+            "date": self.dates[t],
+            "window": window,
+            "names": list(self.names),
+            "corr": [[None if np.isnan(v) else float(v) for v in row] for row in corr],
+            "beta_to_benchmark": {
+                name: None if np.isnan(beta[i, b]) else float(beta[i, b])
+                for i, name in enumerate(self.names)
+            },
+            "corr_to_benchmark": {
+                name: None if np.isnan(corr[i, b]) else float(corr[i, b])
+                for i, name in enumerate(self.names)
+            },
+        }
+
+    def format_latest(self, window: int = 30, benchmark: str = "BTC") -> str:
+        """格式化最新相关性结果"""
+        result = self.latest(window, benchmark)
+        if result["status"] == "error":
+            return f"无法计算跨资产相关性: {result['message']}"
+
+        output = [f"【🔗 {window}日滚动相关性】({result['date']}, 基准: {benchmark})"]
+        for name in result["names"]:
+            if name == benchmark:
+                continue
+            corr = result["corr_to_benchmark"][name]
+            beta = result["beta_to_benchmark"][name]
+            corr_text = f"{corr:.3f}" if corr is not None else "N/A"
+            beta_text = f"{beta:.3f}" if beta is not None else "N/A"
+            output.append(f"  {name}: 相关系数 {corr_text}, Beta {beta_text}")
+        return "\n".join(output)
@@ -3,18 +3,30 @@
 
 提供功能将BTC价格、MVRV比率和恐惧贪婪指数数据
 按照日期合并，生成一个新的daily_data.json文件。
+
+reorganize_rows直接返回按日期升序的数据列表（DailyRow），可在内存中交给AI顾问，
+daily_data.json只是其中一种持久化方式（save_daily_data / load_daily_data）。
 """
 
 import os
 import json
 import logging
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, TypedDict
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+
+class DailyRow(TypedDict, total=False):
+    """按日期整合的一天数据，除date外的字段在当天缺失时不存在"""
+    date: str
+    price: float
+    mvrv: float
+    fear_greed_value: int
+
+
 def load_historical_data(file_path: str) -> Dict[str, Any]:
     """加载历史数据"""
     try:
@@ -82,12 +94,45 @@ def reorganize_by_date(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
     logger.info(f"按日期重组了{len(daily_data)}天的数据")
     return daily_data
 
+def to_daily_rows(daily_data: Dict[str, Dict[str, Any]]) -> List[DailyRow]:
+    """将按日期索引的字典转换为按日期升序排列（从旧到新）的列表"""
+    return sorted(daily_data.values(), key=lambda x: x['date'])
+
+def reorganize_rows(data: Dict[str, Any]) -> List[DailyRow]:
+    """按日期重新组织历史数据，返回按日期升序排列的列表"""
+    return to_daily_rows(reorganize_by_date(data))
+
+def load_daily_data(file_path: str) -> List[DailyRow]:
+    """从daily_data.json加载按日期组织的数据（save_daily_data的逆操作）
+    
+    兼容带元数据的{"data": [...]}结构和直接保存的列表，忽略没有日期的项
+    """
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        logger.error(f"数据文件不存在: {file_path}")
+        return []
+    except Exception as e:
+        logger.error(f"加载按日期组织的数据出错: {str(e)}")
+        return []
+    
+    if isinstance(data, dict):
+        data = data.get('data')
+    if not isinstance(data, list):
+        logger.error(f"数据格式错误: {file_path}中没有数据列表")
+        return []
+    
+    rows = [item for item in data if isinstance(item, dict) and isinstance(item.get('date'), str)]
+    rows.sort(key=lambda x: x['date'])
+    logger.info(f"从{file_path}加载了{len(rows)}天的数据")
+    return rows
+
 def save_daily_data(daily_data: Dict[str, Dict[str, Any]], file_path: str) -> bool:
     """保存按日期组织的数据"""
     try:
         # 将字典转换为列表，并按日期升序排序（从旧到新）
-        data_list = list(daily_data.values())
-        data_list.sort(key=lambda x: x['date'], reverse=False)
+        data_list = to_daily_rows(daily_data)
         
         # 创建包含元数据的完整数据结构
         complete_data = {
@@ -105,8 +150,12 @@ def save_daily_data(daily_data: Dict[str, Dict[str, Any]], file_path: str) -> bo
         logger.error(f"保存数据出错: {str(e)}")
         return False
 
-def reorganize_data(input_file: str, output_file: str) -> bool:
-    """重新组织数据主函数"""
+def reorganize_data(input_file: str, output_file: str) -> List[DailyRow]:
+    """重新组织数据主函数
+    
+    返回按日期升序的数据列表（同时保存到output_file），失败时返回空列表，
+    调用方可直接使用返回的数据，无需再读取output_file
+    """
     logger.info(f"开始重组数据: 从 {input_file} 到 {output_file}")
     
     # 确保数据目录存在
@@ -116,23 +165,23 @@ def reorganize_data(input_file: str, output_file: str) -> bool:
     historical_data = load_historical_data(input_file)
     if not historical_data:
         logger.error("无法加载历史数据，退出函数")
-        return False
+        return []
     
     # 按日期重新组织数据
     daily_data = reorganize_by_date(historical_data)
     if not daily_data:
         logger.error("重组数据失败，退出函数")
-        return False
+        return []
     
     # 保存按日期组织的数据
     success = save_daily_data(daily_data, output_file)
     if success:
         logger.info(f"数据重组成功！已生成按日期组织的数据文件: {output_file}")
         logger.info(f"共处理了 {len(daily_data)} 天的数据")
-        return True
+        return to_daily_rows(daily_data)
     else:
         logger.error("数据重组失败")
-        return False
+        return []
 
     """修复数据文件格式问题
     
@@ -0,0 +1,67 @@
+"""
+截止时间模块 - 为整个运行流程设定总时间预算，并分配给各个阶段
+
+采集器走代理失败再直连时单个接口就可能耗时2×30秒，AI调用最坏需要(max_retries+1)×600秒。
+Deadline从流程开始计时，每个阶段通过slice取得不超过剩余时间的时间片，
+run在时间片用完时取消该阶段并抛出asyncio.TimeoutError，由调用方决定如何降级。
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Optional
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+    """截止时间（基于单调时钟），seconds为None时不限时"""
+
+    def __init__(self, seconds: Optional[float] = None, name: str = "总流程"):
+        """初始化截止时间
+
+        Args:
+            seconds: 从现在起的可用时间（秒），None或0表示不限时
+            name: 阶段名称，用于日志
+        """
+        self.name = name
+        self.seconds = seconds or None
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + self.seconds if self.seconds else None
+
+    def remaining(self) -> Optional[float]:
+        """剩余时间（秒），不限时返回None，已过期返回0"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        """已用时间（秒）"""
+        return time.monotonic() - self.started_at
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def slice(self, seconds: Optional[float], name: str) -> "Deadline":
+        """为某个阶段分配时间片，不超过当前剩余时间"""
+        remaining = self.remaining()
+        if seconds is None:
+            seconds = remaining
+        elif remaining is not None:
+            seconds = min(seconds, remaining)
+        # 剩余时间已耗尽时给一个极短的时间片，使阶段立即超时而不是不限时
+        return Deadline(seconds if seconds is None or seconds > 0 else 1e-3, name)
+
+    async def run(self, awaitable: Awaitable[Any]) -> Any:
+        """在截止时间内等待，超时则取消并抛出asyncio.TimeoutError"""
+        try:
+            return await asyncio.wait_for(awaitable, timeout=self.remaining())
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name}超出时间预算（{self.seconds:.0f}秒），已取消")
+            raise
+
+    def __repr__(self) -> str:
+        remaining = self.remaining()
+        return f"Deadline({self.name}, 剩余{'不限' if remaining is None else f'{remaining:.0f}秒'})"
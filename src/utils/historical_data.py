@@ -6,7 +6,7 @@ import time
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 
-from collectors import BTCPriceCollector, MVRVCollector, FearGreedCollector
+from collectors import BTCPriceCollector, MVRVCollector, FearGreedCollector, OnChainCollector
 from config import PROXY_URL, USE_PROXY
 
 # 设置日志
@@ -26,23 +26,30 @@ class HistoricalDataCollector:
         self.btc_collector = BTCPriceCollector(data_dir)
         self.mvrv_collector = MVRVCollector(data_dir)
         self.fng_collector = FearGreedCollector(data_dir)
+        self.onchain_collector = OnChainCollector(data_dir)
     
     async def collect_historical_data(self, days=180) -> Dict[str, Any]:
         """收集所有历史数据"""
         logger.info(f"开始收集{days}天的历史数据...")
         
         btc_task = asyncio.create_task(self.btc_collector.get_price_history(days))
-        mvrv_task = asyncio.create_task(self.mvrv_collector.get_mvrv_history(days))
+        onchain_task = asyncio.create_task(self.onchain_collector.get_onchain_history(days))
         fng_task = asyncio.create_task(self.fng_collector.get_fear_greed_history(days))
         
         btc_history = await btc_task
-        mvrv_history = await mvrv_task
+        onchain_history = await onchain_task
         fng_history = await fng_task
         
+        # MVRV随其他链上指标一起获取，批量请求失败时再单独获取
+        mvrv_history = onchain_history.get("btc", {}).get("mvrv")
+        if not mvrv_history:
+            mvrv_history = await self.mvrv_collector.get_mvrv_history(days)
+        
         historical_data = {
             "btc_price": btc_history,
             "mvrv": mvrv_history,
             "fear_greed": fng_history,
+            "onchain": onchain_history,
             "last_updated": int(time.time())
         }
         
@@ -117,6 +124,20 @@ class HistoricalDataCollector:
         else:
             merged_data["fear_greed"] = new_data.get("fear_greed", old_data.get("fear_greed", []))
         
+        # 合并链上指标数据（按资产、指标逐条序列合并）
+        old_onchain = old_data.get("onchain") or {}
+        new_onchain = new_data.get("onchain") or {}
+        if old_onchain or new_onchain:
+            merged_data["onchain"] = {}
+            for asset in set(old_onchain) | set(new_onchain):
+                old_metrics = old_onchain.get(asset, {})
+                new_metrics = new_onchain.get(asset, {})
+                merged_data["onchain"][asset] = {}
+                for key in set(old_metrics) | set(new_metrics):
+                    series = {item["date"]: item for item in old_metrics.get(key, [])}
+                    series.update({item["date"]: item for item in new_metrics.get(key, [])})
+                    merged_data["onchain"][asset][key] = sorted(series.values(), key=lambda x: x["timestamp"], reverse=True)
+        
         # 更新时间戳
         merged_data["last_updated"] = int(time.time())
         
@@ -0,0 +1,183 @@
+"""
+K线数据模块 - 以结构化numpy数组完整保存Binance K线，并提供基于成交量的指标
+
+Binance K线包含开高低收、成交量、成交额、成交笔数和主动买入量，
+每个字段以8字节定长存储（11个字段，每根K线88字节），比逐行字典节省大量内存，
+可直接用于ATR、VWAP和成交量分布（筹码密集区）等指标计算。
+"""
+
+import os
+import logging
+from typing import Dict, Any, Iterable, Optional
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Binance K线格式: [开盘时间, 开盘价, 最高价, 最低价, 收盘价, 成交量, 收盘时间,
+#                   成交额, 成交笔数, 主动买入成交量, 主动买入成交额, 忽略]
+KLINE_DTYPE = np.dtype([
+    ("open_time", np.int64),
+    ("open", np.float64),
+    ("high", np.float64),
+    ("low", np.float64),
+    ("close", np.float64),
+    ("volume", np.float64),
+    ("close_time", np.int64),
+    ("quote_volume", np.float64),
+    ("trades", np.int64),
+    ("taker_buy_volume", np.float64),
+    ("taker_buy_quote_volume", np.float64),
+])
+
+
+def empty_records() -> np.ndarray:
+    return np.empty(0, dtype=KLINE_DTYPE)
+
+
+def klines_to_records(klines: Iterable[list]) -> np.ndarray:
+    """将Binance原始K线列表转换为结构化数组（按开盘时间升序，同一开盘时间保留最后一条）"""
+    rows = [tuple(row[:len(KLINE_DTYPE)]) for row in klines if len(row) >= len(KLINE_DTYPE)]
+    if not rows:
+        return empty_records()
+    records = np.array(rows, dtype=KLINE_DTYPE)
+    return _dedupe(records)
+
+
+def _dedupe(records: np.ndarray) -> np.ndarray:
+    """按开盘时间稳定排序，重复的开盘时间保留最后出现的一条"""
+    records = records[np.argsort(records["open_time"], kind="stable")]
+    times = records["open_time"]
+    keep = np.r_[times[1:] != times[:-1], True] if len(times) else np.empty(0, dtype=bool)
+    return records[keep]
+
+
+def merge_records(old: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """合并两段K线，重叠部分（如尚未收盘的最后一根）以新数据为准"""
+    return _dedupe(np.concatenate([old, new]))
+
+
+def save_records(records: np.ndarray, file_path: str) -> bool:
+    """以.npy格式保存K线"""
+    try:
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        tmp_path = file_path + ".tmp.npy"
+        np.save(tmp_path, records, allow_pickle=False)
+        os.replace(tmp_path, file_path)
+        return True
+    except Exception as e:
+        logger.error(f"保存K线数据出错: {str(e)}")
+        return False
+
+
+def load_records(file_path: str) -> np.ndarray:
+    """加载K线，文件不存在或格式不符时返回空数组"""
+    if not os.path.exists(file_path):
+        return empty_records()
+    try:
+        records = np.load(file_path, allow_pickle=False)
+        if records.dtype != KLINE_DTYPE:
+            logger.error(f"K线数据格式不符: {file_path}")
+            return empty_records()
+        return records
+    except Exception as e:
+        logger.error(f"加载K线数据出错: {str(e)}")
+        return empty_records()
+
+
+def to_bars(records: np.ndarray) -> Dict[str, np.ndarray]:
+    """转换为TimeframeResampler使用的OHLCV数组字典"""
+    from utils.resampler import OHLCV_FIELDS
+    return {field: np.ascontiguousarray(records[field]) for field in OHLCV_FIELDS}
+
+
+def true_range(records: np.ndarray) -> np.ndarray:
+    """真实波幅，第一根K线只使用最高价-最低价"""
+    high, low, close = records["high"], records["low"], records["close"]
+    prev_close = np.r_[close[:1], close[:-1]]
+    return np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
+
+
+def atr(records: np.ndarray, period: int = 14) -> np.ndarray:
+    """平均真实波幅（Wilder平滑），不足period根时为NaN"""
+    tr = true_range(records)
+    result = np.full(len(tr), np.nan)
+    if len(tr) < period:
+        return result
+
+    value = tr[:period].mean()
+    result[period - 1] = value
+    for i in range(period, len(tr)):
+        value = (value * (period - 1) + tr[i]) / period
+        result[i] = value
+    return result
+
+
+def typical_price(records: np.ndarray) -> np.ndarray:
+    return (records["high"] + records["low"] + records["close"]) / 3
+
+
+def rolling_vwap(records: np.ndarray, window: int = 30) -> np.ndarray:
+    """滚动成交量加权均价（典型价格加权），不足window根时为NaN"""
+    volume = records["volume"]
+    pv = np.concatenate([[0.0], np.cumsum(typical_price(records) * volume)])
+    vol = np.concatenate([[0.0], np.cumsum(volume)])
+
+    result = np.full(len(volume), np.nan)
+    if len(volume) >= window:
+        end = np.arange(window, len(volume) + 1)
+        window_volume = vol[end] - vol[end - window]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result[window - 1:] = np.where(window_volume > 0, (pv[end] - pv[end - window]) / window_volume, np.nan)
+    return result
+
+
+def volume_profile(records: np.ndarray, bins: int = 24) -> Dict[str, np.ndarray]:
+    """成交量分布：按典型价格分箱统计成交量
+
+    Returns:
+        centers: 各价格区间中点
+        volumes: 各价格区间的成交量
+    """
+    if len(records) == 0:
+        return {"centers": np.empty(0), "volumes": np.empty(0)}
+    volumes, edges = np.histogram(typical_price(records), bins=bins, weights=records["volume"])
+    return {"centers": (edges[:-1] + edges[1:]) / 2, "volumes": volumes}
+
+
+def volume_levels(records: np.ndarray, current_price: float, bins: int = 24) -> Dict[str, Optional[float]]:
+    """成交量支撑/阻力位：当前价格下方/上方成交量最大的价格区间"""
+    profile = volume_profile(records, bins)
+    centers, volumes = profile["centers"], profile["volumes"]
+
+    levels: Dict[str, Optional[float]] = {"volume_support": None, "volume_resistance": None}
+    below = centers < current_price
+    above = centers > current_price
+    if below.any():
+        levels["volume_support"] = float(centers[below][np.argmax(volumes[below])])
+    if above.any():
+        levels["volume_resistance"] = float(centers[above][np.argmax(volumes[above])])
+    return levels
+
+
+def summarize_indicators(records: np.ndarray, atr_period: int = 14, vwap_window: int = 30,
+                         bins: int = 24) -> Dict[str, Any]:
+    """最新一根K线的ATR、VWAP及成交量支撑/阻力位"""
+    if len(records) < atr_period + 1:
+        return {"status": "error", "message": f"K线数据不足{atr_period + 1}根"}
+
+    current_price = float(records["close"][-1])
+    atr_value = float(atr(records, atr_period)[-1])
+    vwap_value = rolling_vwap(records, vwap_window)[-1]
+
+    result = {
+        "status": "success",
+        "atr": atr_value,
+        "atr_pct": atr_value / current_price * 100,
+        "vwap": None if np.isnan(vwap_value) else float(vwap_value),
+        "atr_period": atr_period,
+        "vwap_window": vwap_window,
+    }
+    result.update(volume_levels(records, current_price, bins))
+    return result
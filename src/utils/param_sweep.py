@@ -0,0 +1,312 @@
+"""
+参数扫描模块 - 在进程池中并行搜索规则建议的阈值和权重
+
+TrendAnalyzer中的MVRV区间、价格涨跌阈值和综合置信度权重都是经验值。
+本模块对这些参数做网格搜索或随机搜索，每组参数在历史数据上执行一次
+向量化回测（见backtester模块），并按指定目标排序。
+
+对齐后的价格/指标数组只放入一块共享内存，工作进程以只读视图映射，
+不会为每个任务重复序列化和复制数据。
+"""
+
+import os
+import json
+import random
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from utils.backtester import AdviceBacktester, align_history
+from utils.trend_analyzer import DEFAULT_ADVICE_PARAMS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 默认搜索空间：每个参数的候选值列表
+# mood_strong_change/mood_mild_change只影响情绪变化描述，不参与建议决策，因此不在扫描范围内
+DEFAULT_SWEEP_SPACE = {
+    "mvrv_bands": [
+        [1.0, 1.5, 2.5, 3.5],
+        [0.8, 1.2, 2.0, 3.0],
+        [0.9, 1.4, 2.2, 3.2],
+        [1.0, 1.8, 2.8, 3.8],
+        [1.2, 2.0, 3.0, 4.0],
+    ],
+    "price_surge_7d": [5, 7.5, 10, 12.5, 15],
+    "price_dip_7d": [-4, -7, -10, -13],
+    "price_crash_30d": [-10, -15, -20, -25, -30],
+    "confidence_weights": [
+        {"低": 1, "中": 2, "中高": 3, "高": 4},
+        {"低": 1, "中": 2, "中高": 4, "高": 6},
+        {"低": 1, "中": 1, "中高": 2, "高": 3},
+        {"低": 1, "中": 3, "中高": 4, "高": 5},
+    ],
+}
+
+# 可用的排序目标及其方向（True表示越大越好）
+OBJECTIVES = {
+    "total_return": True,
+    "annual_return": True,
+    "sharpe": True,
+    "calmar": True,
+    "hit_rate": True,
+    "max_drawdown": False,
+}
+
+# 每个扫描结果中保留的指标
+RESULT_METRICS = [
+    "total_return", "annual_return", "benchmark_return", "max_drawdown",
+    "sharpe", "calmar", "hit_rate", "trades", "exposure", "final_position",
+]
+
+
+def build_grid(space: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """枚举搜索空间的全部参数组合"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+
+
+def sample_space(space: Dict[str, List[Any]], samples: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """从搜索空间中随机抽取不重复的参数组合"""
+    rng = random.Random(seed)
+    keys = list(space)
+    total = 1
+    for k in keys:
+        total *= len(space[k])
+    samples = min(samples, total)
+
+    seen = set()
+    configs = []
+    while len(configs) < samples:
+        config = {k: rng.choice(space[k]) for k in keys}
+        fingerprint = json.dumps(config, sort_keys=True, ensure_ascii=False)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+        configs.append(config)
+    return configs
+
+
+class SharedArrays:
+    """将对齐后的数组放入一块共享内存，工作进程按布局映射为只读视图"""
+
+    def __init__(self, aligned: Dict[str, np.ndarray]):
+        self.layout = {}
+        offset = 0
+        for name, array in aligned.items():
+            self.layout[name] = (offset, array.shape, array.dtype.str)
+            offset += array.nbytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, array in aligned.items():
+            start, shape, dtype = self.layout[name]
+            view = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start)
+            view[...] = array
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def close(self):
+        """释放共享内存"""
+        self.shm.close()
+        self.shm.unlink()
+
+    @staticmethod
+    def attach(name: str, layout: Dict[str, Tuple[int, tuple, str]]):
+        """映射已有的共享内存，返回(共享内存对象, 只读数组字典)"""
+        shm = shared_memory.SharedMemory(name=name)
+        arrays = {}
+        for key, (offset, shape, dtype) in layout.items():
+            view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            view.flags.writeable = False
+            arrays[key] = view
+        return shm, arrays
+
+
+# 工作进程内的共享数据
+_worker_shm = None
+_worker_arrays = None
+
+
+def _init_worker(shm_name: str, layout: Dict[str, Tuple[int, tuple, str]]):
+    """进程池初始化：映射共享内存"""
+    global _worker_shm, _worker_arrays
+    _worker_shm, _worker_arrays = SharedArrays.attach(shm_name, layout)
+
+
+def _evaluate_configs(aligned: Dict[str, np.ndarray], configs: List[Tuple[int, Dict[str, Any]]],
+                      rule: str, fee_rate: float, hit_horizon: int) -> List[Tuple[int, Dict[str, Any]]]:
+    """依次回测一批参数组合，返回(序号, 指标)列表"""
+    results = []
+    for index, config in configs:
+        backtester = AdviceBacktester(fee_rate=fee_rate, hit_horizon=hit_horizon, advice_params=config)
+        metrics = backtester.evaluate(aligned, rule=rule)
+        if metrics["status"] != "success":
+            results.append((index, {"status": "error", "message": metrics.get("message")}))
+            continue
+        results.append((index, {k: metrics.get(k) for k in RESULT_METRICS}))
+    return results
+
+
+def _evaluate_chunk(args) -> List[Tuple[int, Dict[str, Any]]]:
+    """工作进程任务入口"""
+    configs, rule, fee_rate, hit_horizon = args
+    return _evaluate_configs(_worker_arrays, configs, rule, fee_rate, hit_horizon)
+
+
+class ParameterSweep:
+    """规则参数扫描器"""
+
+    def __init__(self, historical_data=None, space: Optional[Dict[str, List[Any]]] = None,
+                 rule: str = "overall", fee_rate: float = 0.001, hit_horizon: int = 7,
+                 workers: Optional[int] = None):
+        """初始化参数扫描器
+
+        Args:
+            historical_data: HistoricalDataCollector返回的历史数据字典
+            space: 搜索空间，键为DEFAULT_ADVICE_PARAMS中的参数名，值为候选值列表
+            rule: 回测使用的规则
+            fee_rate: 单边手续费率
+            hit_horizon: 命中率观察天数
+            workers: 进程数，默认使用全部CPU核心；为1时在当前进程内执行
+        """
+        self.historical_data = historical_data
+        self.space = space or DEFAULT_SWEEP_SPACE
+        self.rule = rule
+        self.fee_rate = fee_rate
+        self.hit_horizon = hit_horizon
+        self.workers = workers or os.cpu_count() or 1
+
+        unknown = set(self.space) - set(DEFAULT_ADVICE_PARAMS)
+        if unknown:
+            raise ValueError(f"未知的规则参数: {', '.join(sorted(unknown))}")
+
+    def _run_pool(self, aligned: Dict[str, np.ndarray], indexed: List[Tuple[int, Dict[str, Any]]]):
+        """在进程池中执行全部参数组合"""
+        shared = SharedArrays(aligned)
+        try:
+            # 每个任务打包一批参数组合，摊薄进程间通信开销
+            chunk_size = max(1, len(indexed) // (self.workers * 4))
+            chunks = [indexed[i:i + chunk_size] for i in range(0, len(indexed), chunk_size)]
+            tasks = [(chunk, self.rule, self.fee_rate, self.hit_horizon) for chunk in chunks]
+
+            results = []
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(shared.name, shared.layout)) as executor:
+                for chunk_result in executor.map(_evaluate_chunk, tasks):
+                    results.extend(chunk_result)
+            return results
+        finally:
+            shared.close()
+
+    def run(self, search: str = "grid", samples: int = 500, objective: str = "sharpe",
+            top: int = 10, seed: int = 42) -> Dict[str, Any]:
+        """执行参数扫描
+
+        Args:
+            search: grid（网格搜索）或 random（随机搜索）
+            samples: 随机搜索的参数组合数量
+            objective: 排序目标，见OBJECTIVES
+            top: 报告中展示的最优组合数量
+            seed: 随机搜索的随机种子
+
+        Returns:
+            扫描结果字典，results为按目标排序的全部组合
+        """
+        if objective not in OBJECTIVES:
+            return {
+                "status": "error",
+                "message": f"未知的排序目标: {objective}，可选: {', '.join(OBJECTIVES)}"
+            }
+
+        if not self.historical_data or "btc_price" not in self.historical_data:
+            logger.error("没有BTC价格历史数据可供参数扫描")
+            return {
+                "status": "error",
+                "message": "没有BTC价格历史数据可供参数扫描"
+            }
+
+        if search == "grid":
+            configs = build_grid(self.space)
+        elif search == "random":
+            configs = sample_space(self.space, samples, seed=seed)
+        else:
+            return {
+                "status": "error",
+                "message": f"未知的搜索方式: {search}"
+            }
+
+        aligned = align_history(self.historical_data)
+        indexed = list(enumerate(configs))
+        logger.info(f"开始参数扫描: {search}搜索，{len(configs)}组参数，{self.workers}个进程，目标: {objective}")
+
+        start_time = datetime.now()
+        if self.workers > 1 and len(configs) > 1:
+            raw_results = self._run_pool(aligned, indexed)
+        else:
+            raw_results = _evaluate_configs(aligned, indexed, self.rule, self.fee_rate, self.hit_horizon)
+        elapsed = (datetime.now() - start_time).total_seconds()
+
+        ranked = []
+        errors = 0
+        for index, metrics in raw_results:
+            if metrics.get("status") == "error":
+                errors += 1
+                continue
+            ranked.append({"params": configs[index], "metrics": metrics})
+
+        maximize = OBJECTIVES[objective]
+        valid = [r for r in ranked if r["metrics"].get(objective) is not None]
+        missing = [r for r in ranked if r["metrics"].get(objective) is None]
+        valid.sort(key=lambda r: r["metrics"][objective], reverse=maximize)
+        ranked = valid + missing
+
+        logger.info(f"参数扫描完成，耗时{elapsed:.2f}秒，有效结果{len(ranked)}组，失败{errors}组")
+
+        result = {
+            "status": "success",
+            "search": search,
+            "objective": objective,
+            "rule": self.rule,
+            "fee_rate": self.fee_rate,
+            "evaluated": len(configs),
+            "errors": errors,
+            "workers": self.workers,
+            "elapsed_seconds": elapsed,
+            "results": ranked,
+        }
+        result["formatted_output"] = self._format_sweep_output(result, top)
+        return result
+
+    def _format_sweep_output(self, result: Dict[str, Any], top: int) -> str:
+        """格式化扫描结果输出"""
+        output = []
+        output.append("=============== 规则参数扫描报告 ===============")
+        output.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+        output.append(f"搜索方式: {result['search']}")
+        output.append(f"回测规则: {result['rule']}")
+        output.append(f"排序目标: {result['objective']}")
+        output.append(f"参数组合: {result['evaluated']}组 (失败 {result['errors']})")
+        output.append(f"进程数: {result['workers']}，耗时: {result['elapsed_seconds']:.2f}秒")
+        output.append("")
+
+        output.append(f"【🏆 最优{min(top, len(result['results']))}组参数】")
+        for rank, item in enumerate(result["results"][:top], start=1):
+            metrics = item["metrics"]
+            params = item["params"]
+            value = metrics.get(result["objective"])
+            value_text = f"{value:.3f}" if value is not None else "N/A"
+            output.append(f"#{rank} {result['objective']}={value_text} "
+                          f"收益={metrics['total_return']:.2f}% 回撤={metrics['max_drawdown']:.2f}%")
+            for key, val in params.items():
+                output.append(f"  {key}: {json.dumps(val, ensure_ascii=False)}")
+
+        output.append("\n=============== 报告结束 ===============")
+        return "\n".join(output)
@@ -0,0 +1,290 @@
+"""
+市场状态标注模块 - 对完整历史逐日标注状态并以游程编码存储
+
+TrendAnalyzer只给出"今天"的MVRV估值状态和恐惧贪婪分类。本模块一次性
+向量化地为每一天标注MVRV区间、恐惧贪婪分类和价格趋势，将连续相同的状态
+压缩为游程（run），并支持O(log n)的查询，例如：
+- 当前状态已经持续了多久
+- 上一次退出"极度恐惧"是什么时候
+"""
+
+import os
+import json
+import bisect
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import numpy as np
+
+from utils.trend_analyzer import merge_advice_params
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MVRV_STATES = ["低于已实现价值", "合理区间", "偏高区间", "高估区间", "极度高估"]
+FEAR_GREED_STATES = ["Extreme Fear", "Fear", "Neutral", "Greed", "Extreme Greed"]
+# 7日与30日涨跌组合，与价格规则中的四种情形对应
+PRICE_TREND_STATES = ["上涨", "回调", "反弹", "下跌"]
+
+# 缺少value_classification时按指数值划分（Alternative.me口径）
+FEAR_GREED_VALUE_BANDS = [25, 47, 55, 76]
+
+
+def _day_number(date: str) -> int:
+    """日期字符串转为自然日序号，用于计算持续天数
+
+    日内周期的K线日期为'%Y-%m-%d %H:%M'（见TimeframeResampler.to_price_history），只取日期部分。
+    """
+    return datetime.strptime(date[:10], '%Y-%m-%d').toordinal()
+
+
+class RunLengthSeries:
+    """游程编码的状态序列"""
+
+    def __init__(self, name: str, labels: List[str], dates: List[str], codes: np.ndarray):
+        """由逐日状态编码构建游程
+
+        Args:
+            name: 序列名称
+            labels: 状态编码对应的名称
+            dates: 升序日期列表
+            codes: 与dates等长的状态编码，-1表示无法判断
+        """
+        self.name = name
+        self.labels = list(labels)
+
+        codes = np.asarray(codes)
+        if len(codes) == 0:
+            starts = np.empty(0, dtype=np.int64)
+        else:
+            starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        ends = np.r_[starts[1:] - 1, len(codes) - 1] if len(starts) else starts
+
+        self.run_codes = codes[starts].astype(int).tolist() if len(starts) else []
+        self.run_starts = [dates[i] for i in starts]
+        self.run_ends = [dates[i] for i in ends]
+        self.run_lengths = (ends - starts + 1).astype(int).tolist() if len(starts) else []
+        self._build_index()
+
+    def _build_index(self):
+        """为每种状态建立有序的游程位置索引"""
+        self._by_code: Dict[int, List[int]] = {}
+        self._end_days_by_code: Dict[int, List[int]] = {}
+        for position, code in enumerate(self.run_codes):
+            self._by_code.setdefault(code, []).append(position)
+            self._end_days_by_code.setdefault(code, []).append(_day_number(self.run_ends[position]))
+
+    def _code(self, label: str) -> int:
+        if label not in self.labels:
+            raise ValueError(f"{self.name}中不存在状态: {label}")
+        return self.labels.index(label)
+
+    def _run_at(self, date: str) -> Optional[int]:
+        """二分查找包含该日期的游程位置"""
+        position = bisect.bisect_right(self.run_starts, date) - 1
+        if position < 0 or date > self.run_ends[-1]:
+            return None
+        return position
+
+    def _label(self, code: int) -> Optional[str]:
+        return self.labels[code] if code >= 0 else None
+
+    def state_at(self, date: Optional[str] = None) -> Dict[str, Any]:
+        """查询某日（默认最新一天）所处状态及已持续的天数"""
+        if not self.run_starts:
+            return {"status": "error", "message": f"{self.name}没有状态数据"}
+
+        date = date or self.run_ends[-1]
+        position = self._run_at(date)
+        if position is None:
+            return {"status": "error", "message": f"{self.name}没有{date}的状态数据"}
+
+        start = self.run_starts[position]
+        return {
+            "status": "success",
+            "state": self._label(self.run_codes[position]),
+            "since": start,
+            "days": _day_number(date) - _day_number(start) + 1,
+            "run_end": self.run_ends[position],
+        }
+
+    def last_exit(self, label: str, before: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """最近一次退出某状态（该状态游程结束且已被其他状态取代）的时间"""
+        code = self._code(label)
+        positions = self._by_code.get(code, [])
+        end_days = self._end_days_by_code.get(code, [])
+
+        # 最后一个游程仍在进行中，尚未退出
+        if positions and positions[-1] == len(self.run_codes) - 1:
+            positions, end_days = positions[:-1], end_days[:-1]
+        if not positions:
+            return None
+
+        before_day = _day_number(before) if before else end_days[-1] + 1
+        index = bisect.bisect_left(end_days, before_day) - 1
+        if index < 0:
+            return None
+
+        position = positions[index]
+        return {
+            "state": label,
+            "entered": self.run_starts[position],
+            "exited": self.run_ends[position],
+            "days": self.run_lengths[position],
+            "next_state": self._label(self.run_codes[position + 1]),
+        }
+
+    def last_entry(self, label: str) -> Optional[Dict[str, Any]]:
+        """最近一次进入某状态的时间"""
+        positions = self._by_code.get(self._code(label), [])
+        if not positions:
+            return None
+        position = positions[-1]
+        return {
+            "state": label,
+            "entered": self.run_starts[position],
+            "run_end": self.run_ends[position],
+            "days": self.run_lengths[position],
+        }
+
+    def runs(self, label: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出全部游程，可按状态过滤"""
+        positions = range(len(self.run_codes)) if label is None else self._by_code.get(self._code(label), [])
+        return [
+            {
+                "state": self._label(self.run_codes[p]),
+                "start": self.run_starts[p],
+                "end": self.run_ends[p],
+                "length": self.run_lengths[p],
+            }
+            for p in positions
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "labels": self.labels,
+            "codes": self.run_codes,
+            "starts": self.run_starts,
+            "ends": self.run_ends,
+            "lengths": self.run_lengths,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RunLengthSeries":
+        series = cls.__new__(cls)
+        series.name = data["name"]
+        series.labels = data["labels"]
+        series.run_codes = data["codes"]
+        series.run_starts = data["starts"]
+        series.run_ends = data["ends"]
+        series.run_lengths = data["lengths"]
+        series._build_index()
+        return series
+
+
+def _sorted_series(items: List[Dict[str, Any]], value_key: str):
+    """按日期升序提取(日期列表, 记录列表)"""
+    by_date = {item["date"]: item for item in items if item.get("date") and item.get(value_key) is not None}
+    dates = sorted(by_date)
+    return dates, [by_date[d] for d in dates]
+
+
+def label_mvrv(values: np.ndarray, bands: List[float]) -> np.ndarray:
+    """MVRV区间编码"""
+    return np.digitize(values, bands).astype(np.int8)
+
+
+def label_fear_greed(values: np.ndarray, classes: List[str]) -> np.ndarray:
+    """恐惧贪婪分类编码，优先使用接口给出的分类"""
+    class_codes = {name: code for code, name in enumerate(FEAR_GREED_STATES)}
+    codes = np.array([class_codes.get(c, -1) for c in classes], dtype=np.int8)
+    by_value = np.digitize(values, FEAR_GREED_VALUE_BANDS).astype(np.int8)
+    return np.where(codes >= 0, codes, by_value)
+
+
+def label_price_trend(prices: np.ndarray, short: int = 6, long: int = 29) -> np.ndarray:
+    """价格趋势编码：上涨/回调/反弹/下跌，窗口与TrendAnalyzer一致，不足窗口为-1"""
+    codes = np.full(len(prices), -1, dtype=np.int8)
+    if len(prices) <= long:
+        return codes
+    up_short = prices[long:] > prices[long - short:-short]
+    up_long = prices[long:] > prices[:-long]
+    codes[long:] = np.select(
+        [up_long & up_short, up_long & ~up_short, ~up_long & up_short],
+        [0, 1, 2],
+        default=3,
+    )
+    return codes
+
+
+class RegimeLabeller:
+    """市场状态标注器"""
+
+    def __init__(self, historical_data=None, advice_params=None):
+        """初始化状态标注器
+
+        Args:
+            historical_data: HistoricalDataCollector返回的历史数据字典
+            advice_params: 覆盖DEFAULT_ADVICE_PARAMS（使用其中的mvrv_bands）
+        """
+        self.historical_data = historical_data
+        self.advice_params = merge_advice_params(advice_params)
+        self.series: Dict[str, RunLengthSeries] = {}
+
+    def label(self) -> Dict[str, RunLengthSeries]:
+        """对全部历史逐日标注状态并生成游程"""
+        data = self.historical_data or {}
+        self.series = {}
+
+        dates, items = _sorted_series(data.get("mvrv", []), "mvrv")
+        values = np.array([float(item["mvrv"]) for item in items], dtype=np.float64)
+        self.series["mvrv"] = RunLengthSeries(
+            "mvrv", MVRV_STATES, dates, label_mvrv(values, self.advice_params["mvrv_bands"])
+        )
+
+        dates, items = _sorted_series(data.get("fear_greed", []), "value")
+        values = np.array([float(item["value"]) for item in items], dtype=np.float64)
+        classes = [item.get("value_classification", "") for item in items]
+        self.series["fear_greed"] = RunLengthSeries(
+            "fear_greed", FEAR_GREED_STATES, dates, label_fear_greed(values, classes)
+        )
+
+        dates, items = _sorted_series(data.get("btc_price", []), "price")
+        prices = np.array([float(item["price"]) for item in items], dtype=np.float64)
+        self.series["price_trend"] = RunLengthSeries(
+            "price_trend", PRICE_TREND_STATES, dates, label_price_trend(prices)
+        )
+
+        logger.info("已完成状态标注: " + ", ".join(f"{name}({len(s.run_codes)}段)" for name, s in self.series.items()))
+        return self.series
+
+    def get(self, name: str) -> RunLengthSeries:
+        """获取某个状态序列，尚未标注时先执行标注"""
+        if not self.series:
+            self.label()
+        return self.series[name]
+
+    def save(self, file_path: str) -> bool:
+        """以游程编码形式保存到JSON文件"""
+        try:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump({name: s.to_dict() for name, s in self.series.items()}, f, ensure_ascii=False, indent=2)
+            logger.info(f"状态游程已保存到: {file_path}")
+            return True
+        except Exception as e:
+            logger.error(f"保存状态游程出错: {str(e)}")
+            return False
+
+    def load(self, file_path: str) -> bool:
+        """从JSON文件加载游程"""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.series = {name: RunLengthSeries.from_dict(item) for name, item in data.items()}
+            return True
+        except Exception as e:
+            logger.error(f"加载状态游程出错: {str(e)}")
+            return False
@@ -0,0 +1,233 @@
+"""
+多周期重采样模块 - 将高频K线聚合为1h/4h/1d/1w等高周期K线
+
+以最细的周期（如1m或1h）为基础数据，按周期从小到大逐级聚合：
+每个高周期由能整除它的最近一级低周期派生（1m→1h→4h→1d→1w），
+而不是重新请求接口。各周期的聚合结果缓存在内存中，新K线到达时
+只重算受影响的最后几个桶。
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MINUTE_MS = 60 * 1000
+
+# 支持的周期（毫秒）
+TIMEFRAMES = {
+    "1m": MINUTE_MS,
+    "5m": 5 * MINUTE_MS,
+    "15m": 15 * MINUTE_MS,
+    "30m": 30 * MINUTE_MS,
+    "1h": 60 * MINUTE_MS,
+    "4h": 4 * 60 * MINUTE_MS,
+    "1d": 24 * 60 * MINUTE_MS,
+    "1w": 7 * 24 * 60 * MINUTE_MS,
+}
+
+# 周线与Binance一致从周一00:00(UTC)开始，1970-01-01是周四，需偏移4天
+TIMEFRAME_OFFSETS = {
+    "1w": 4 * 24 * 60 * MINUTE_MS,
+}
+
+OHLCV_FIELDS = ("open_time", "open", "high", "low", "close", "volume")
+
+
+def _empty_bars() -> Dict[str, np.ndarray]:
+    """空的K线数组字典"""
+    bars = {"open_time": np.empty(0, dtype=np.int64)}
+    for field in OHLCV_FIELDS[1:]:
+        bars[field] = np.empty(0, dtype=np.float64)
+    return bars
+
+
+def _slice_bars(bars: Dict[str, np.ndarray], start: int = 0, stop: Optional[int] = None) -> Dict[str, np.ndarray]:
+    return {field: values[start:stop] for field, values in bars.items()}
+
+
+def _concat_bars(left: Dict[str, np.ndarray], right: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    return {field: np.concatenate([left[field], right[field]]) for field in OHLCV_FIELDS}
+
+
+def _merge_bars(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """按开盘时间合并两段K线，重复的开盘时间以新数据为准（与ohlcv.merge_records一致）"""
+    merged = _concat_bars(old, new)
+    order = np.argsort(merged["open_time"], kind="stable")
+    merged = {field: values[order] for field, values in merged.items()}
+    times = merged["open_time"]
+    keep = np.r_[times[1:] != times[:-1], True]
+    return {field: values[keep] for field, values in merged.items()}
+
+
+def parse_klines(klines: Iterable[list]) -> Dict[str, np.ndarray]:
+    """将Binance原始K线列表解析为OHLCV数组（按开盘时间升序）
+
+    K线格式: [开盘时间, 开盘价, 最高价, 最低价, 收盘价, 成交量, ...]
+    """
+    rows = [row for row in klines if len(row) >= 6]
+    if not rows:
+        return _empty_bars()
+
+    bars = {"open_time": np.array([int(row[0]) for row in rows], dtype=np.int64)}
+    for i, field in enumerate(OHLCV_FIELDS[1:], start=1):
+        bars[field] = np.array([float(row[i]) for row in rows], dtype=np.float64)
+
+    order = np.argsort(bars["open_time"], kind="stable")
+    return {field: values[order] for field, values in bars.items()}
+
+
+def aggregate_bars(bars: Dict[str, np.ndarray], period: int, offset: int = 0) -> Dict[str, np.ndarray]:
+    """将升序排列的K线聚合为指定周期（一次reduceat完成）
+
+    Args:
+        bars: OHLCV数组字典
+        period: 目标周期（毫秒）
+        offset: 桶对齐偏移（毫秒）
+
+    Returns:
+        聚合后的OHLCV数组字典
+    """
+    n = len(bars["open_time"])
+    if n == 0:
+        return _empty_bars()
+
+    buckets = (bars["open_time"] - offset) // period
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:] - 1, n - 1]
+
+    return {
+        "open_time": buckets[starts] * period + offset,
+        "open": bars["open"][starts],
+        "high": np.maximum.reduceat(bars["high"], starts),
+        "low": np.minimum.reduceat(bars["low"], starts),
+        "close": bars["close"][ends],
+        "volume": np.add.reduceat(bars["volume"], starts),
+    }
+
+
+class TimeframeResampler:
+    """多周期K线重采样器"""
+
+    def __init__(self, base_timeframe: str = "1h", timeframes: Iterable[str] = ("1h", "4h", "1d", "1w")):
+        """初始化重采样器
+
+        Args:
+            base_timeframe: 输入K线的周期
+            timeframes: 需要维护的目标周期
+        """
+        if base_timeframe not in TIMEFRAMES:
+            raise ValueError(f"不支持的周期: {base_timeframe}")
+
+        self.base_timeframe = base_timeframe
+        self.base = _empty_bars()
+        self.cache: Dict[str, Dict[str, np.ndarray]] = {}
+        self.parents: Dict[str, str] = {}
+
+        targets = sorted(set(timeframes), key=lambda tf: TIMEFRAMES.get(tf, 0))
+        built = [base_timeframe]
+        for timeframe in targets:
+            if timeframe not in TIMEFRAMES:
+                raise ValueError(f"不支持的周期: {timeframe}")
+            if TIMEFRAMES[timeframe] < TIMEFRAMES[base_timeframe]:
+                raise ValueError(f"目标周期{timeframe}小于基础周期{base_timeframe}")
+            if timeframe == base_timeframe:
+                continue
+            self.parents[timeframe] = self._find_parent(timeframe, built)
+            self.cache[timeframe] = _empty_bars()
+            built.append(timeframe)
+
+    @staticmethod
+    def _find_parent(timeframe: str, candidates: List[str]) -> str:
+        """在已维护的周期中找到能整除目标周期且对齐一致的最大周期"""
+        period = TIMEFRAMES[timeframe]
+        offset = TIMEFRAME_OFFSETS.get(timeframe, 0)
+        for candidate in sorted(candidates, key=lambda tf: TIMEFRAMES[tf], reverse=True):
+            candidate_period = TIMEFRAMES[candidate]
+            candidate_offset = TIMEFRAME_OFFSETS.get(candidate, 0)
+            if period % candidate_period == 0 and (offset - candidate_offset) % candidate_period == 0:
+                return candidate
+        raise ValueError(f"无法从已有周期派生{timeframe}")
+
+    def _source(self, timeframe: str) -> Dict[str, np.ndarray]:
+        return self.base if timeframe == self.base_timeframe else self.cache[timeframe]
+
+    def ingest_klines(self, klines: Iterable[list]):
+        """导入Binance原始K线"""
+        self.ingest(parse_klines(klines))
+
+    def ingest(self, bars: Dict[str, np.ndarray]):
+        """导入基础周期的OHLCV数组，并增量更新所有高周期
+
+        按开盘时间与已有数据合并，可以补入更早的K线；
+        与已有数据重叠的部分（如尚未收盘的最后一根K线）以新数据为准。
+        """
+        if len(bars["open_time"]) == 0:
+            return
+
+        bars = {field: np.asarray(bars[field]) for field in OHLCV_FIELDS}
+        dirty_from = int(bars["open_time"].min())
+        self.base = _merge_bars(self.base, bars)
+
+        # 按周期从小到大逐级重算从最早的新K线所在桶开始的各个桶
+        for timeframe, parent in self.parents.items():
+            period = TIMEFRAMES[timeframe]
+            offset = TIMEFRAME_OFFSETS.get(timeframe, 0)
+            bucket_start = (dirty_from - offset) // period * period + offset
+
+            cached = self.cache[timeframe]
+            keep = int(np.searchsorted(cached["open_time"], bucket_start, side="left"))
+            source = self._source(parent)
+            first = int(np.searchsorted(source["open_time"], bucket_start, side="left"))
+
+            tail = aggregate_bars(_slice_bars(source, first), period, offset)
+            self.cache[timeframe] = _concat_bars(_slice_bars(cached, 0, keep), tail)
+            dirty_from = bucket_start
+
+        logger.info(f"已导入{len(bars['open_time'])}条{self.base_timeframe}K线，基础数据共{len(self.base['open_time'])}条")
+
+    def get_bars(self, timeframe: str) -> Dict[str, np.ndarray]:
+        """获取指定周期的OHLCV数组（最后一根可能尚未收盘）"""
+        if timeframe == self.base_timeframe:
+            return self.base
+        if timeframe not in self.cache:
+            raise ValueError(f"未维护的周期: {timeframe}")
+        return self.cache[timeframe]
+
+    def to_price_history(self, timeframe: str) -> List[Dict[str, Any]]:
+        """将指定周期转换为historical_data中btc_price的记录格式（最新的在前）"""
+        bars = self.get_bars(timeframe)
+        date_format = '%Y-%m-%d' if TIMEFRAMES[timeframe] >= TIMEFRAMES["1d"] else '%Y-%m-%d %H:%M'
+
+        history = []
+        for open_time, close in zip(bars["open_time"][::-1], bars["close"][::-1]):
+            history.append({
+                "timestamp": int(open_time),
+                "date": datetime.fromtimestamp(int(open_time) / 1000).strftime(date_format),
+                "price": float(close)
+            })
+        return history
+
+    def build_historical_data(self, historical_data: Dict[str, Any], timeframe: str) -> Dict[str, Any]:
+        """用指定周期的K线替换historical_data中的btc_price，供TrendAnalyzer按该周期分析"""
+        data = dict(historical_data or {})
+        data["btc_price"] = self.to_price_history(timeframe)
+        return data
+
+if __name__ == "__main__":
+    import json
+    from utils.ohlcv import load_records, to_bars
+    from utils.trend_analyzer import TrendAnalyzer
+
+    # 用已保存的1h K线（btc_ohlcv_1h.npy）按4h周期生成规则建议
+    with open("data/historical_data.json", 'r', encoding='utf-8') as f:
+        historical_data = json.load(f)
+    resampler = TimeframeResampler("1h", ("4h", "1d"))
+    resampler.ingest(to_bars(load_records("data/btc_ohlcv_1h.npy")))
+    analyzer = TrendAnalyzer(resampler.build_historical_data(historical_data, "4h"), timeframe="4h")
+    advice = analyzer.generate_investment_advice()
+    print(advice.get("formatted_output") or advice.get("message"))
@@ -1,23 +1,86 @@
 import os
+import re
 import json
+import hashlib
 import numpy as np
 from datetime import datetime, timedelta
 import logging
 
+from utils.analysis_cache import CACHE_VERSION, fingerprint
+from utils.ohlcv import summarize_indicators
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 建议规则使用的阈值和权重，可通过advice_params覆盖（参数扫描见param_sweep模块）
+DEFAULT_ADVICE_PARAMS = {
+    "mvrv_bands": [1.0, 1.5, 2.5, 3.5],          # MVRV估值区间分界
+    "mood_strong_change": 10,                    # 7日恐惧贪婪变化超过该值为"明显"变化
+    "mood_mild_change": 5,                       # 7日恐惧贪婪变化超过该值为"略有"变化
+    "price_surge_7d": 10,                        # 7日涨幅超过该值视为短期快速上涨
+    "price_dip_7d": -7,                          # 中期上涨中7日跌幅低于该值视为逢低机会
+    "price_crash_30d": -20,                      # 30日跌幅低于该值视为可能筑底
+    "confidence_weights": {"低": 1, "中": 2, "中高": 3, "高": 4},
+    "confidence_thresholds": [7, 5, 3],          # 综合权重达到该值分别为高/中高/中置信度
+}
+
+
+def merge_advice_params(advice_params=None):
+    """将自定义参数合并到默认参数上，返回新的参数字典"""
+    params = dict(DEFAULT_ADVICE_PARAMS)
+    if advice_params:
+        params.update(advice_params)
+    return params
+
+
 class TrendAnalyzer:
     """趋势分析器 - 分析历史数据并提供买入/卖出建议"""
     
-    def __init__(self, historical_data=None):
-        """初始化趋势分析器"""
+    def __init__(self, historical_data=None, advice_params=None, timeframe="1d", ohlcv=None):
+        """初始化趋势分析器
+        
+        Args:
+            historical_data: 历史数据字典
+            advice_params: 覆盖DEFAULT_ADVICE_PARAMS中的规则阈值和权重
+            timeframe: btc_price数据的K线周期，非1d时各价格窗口按K线根数计算
+                       （可由TimeframeResampler.build_historical_data生成对应数据）
+            ohlcv: 与timeframe同周期的完整K线结构化数组（BTCPriceCollector.load_ohlcv），
+                   提供时额外计算ATR、VWAP和成交量支撑/阻力位
+        """
         self.historical_data = historical_data
-        self.analysis_period = 180  # 分析最近180天（约6个月）的数据
+        self.analysis_period = 180  # 分析最近180根K线（日线约6个月）的数据
+        self.advice_params = merge_advice_params(advice_params)
+        self.timeframe = timeframe
+        self.ohlcv = ohlcv
+        self._regimes = None
+        self._analogs = None
     
     def set_historical_data(self, historical_data):
         """设置历史数据"""
         self.historical_data = historical_data
+        self._regimes = None
+        self._analogs = None
+    
+    def _get_regimes(self):
+        """对完整历史做状态标注（游程编码），用于计算当前状态的持续时间"""
+        if self._regimes is None:
+            from utils.regimes import RegimeLabeller
+            self._regimes = RegimeLabeller(self.historical_data, self.advice_params).label()
+        return self._regimes
+    
+    def _get_analogs(self):
+        """基于完整日线历史构建相似行情索引"""
+        if self._analogs is None:
+            from utils.analogs import AnalogFinder
+            self._analogs = AnalogFinder.from_historical_data(self.historical_data or {})
+        return self._analogs
+    
+    def fingerprint(self):
+        """输入序列与分析参数的内容指纹，用于缓存分析结果（忽略last_updated）"""
+        data = self.historical_data or {}
+        series = {key: data.get(key) for key in ("btc_price", "mvrv", "fear_greed")}
+        ohlcv_digest = hashlib.sha256(self.ohlcv.tobytes()).hexdigest() if self.ohlcv is not None else None
+        return fingerprint(CACHE_VERSION, series, self.analysis_period, self.advice_params, self.timeframe, ohlcv_digest)
     
     def analyze_btc_price_trend(self):
         """分析BTC价格趋势"""
@@ -92,6 +155,14 @@ class TrendAnalyzer:
         support_level = sum(recent_lows) / len(recent_lows)
         resistance_level = sum(recent_highs) / len(recent_highs)
         
+        # 基于完整K线的ATR、VWAP和成交量支撑/阻力位
+        ohlcv_indicators = None
+        if self.ohlcv is not None and len(self.ohlcv) > 0:
+            ohlcv_indicators = summarize_indicators(self.ohlcv[-self.analysis_period:])
+            if ohlcv_indicators["status"] == "error":
+                logger.warning(f"无法计算K线指标: {ohlcv_indicators['message']}")
+                ohlcv_indicators = None
+        
         return {
             "status": "success",
             "current_price": current_price,
@@ -109,6 +180,8 @@ class TrendAnalyzer:
             "price_percentile": price_percentile,
             "support_level": support_level,
             "resistance_level": resistance_level,
+            "ohlcv_indicators": ohlcv_indicators,
+            "timeframe": self.timeframe,
             "latest_date": dates[0] if dates else None
         }
     
@@ -177,14 +250,15 @@ class TrendAnalyzer:
         max_mvrv = max(mvrv_values)
         mvrv_percentile = ((current_mvrv - min_mvrv) / (max_mvrv - min_mvrv) * 100) if max_mvrv > min_mvrv else 50
         
+        bands = self.advice_params["mvrv_bands"]
         market_state = "未知"
-        if current_mvrv < 1.0:
+        if current_mvrv < bands[0]:
             market_state = "低于已实现价值"
-        elif current_mvrv < 1.5:
+        elif current_mvrv < bands[1]:
             market_state = "合理区间"
-        elif current_mvrv < 2.5:
+        elif current_mvrv < bands[2]:
             market_state = "偏高区间"
-        elif current_mvrv < 3.5:
+        elif current_mvrv < bands[3]:
             market_state = "高估区间"
         else:
             market_state = "极度高估"
@@ -201,6 +275,7 @@ class TrendAnalyzer:
             "trend_30d": trend_30d,
             "percentile": mvrv_percentile,
             "market_state": market_state,
+            "state_days": self._get_regimes()["mvrv"].state_at().get("days"),
             "latest_date": dates[0] if dates else None
         }
     
@@ -260,13 +335,15 @@ class TrendAnalyzer:
         market_mood = current_class
         
         # 计算市场情绪变化
-        if fg_change_7d > 10:
+        strong = self.advice_params["mood_strong_change"]
+        mild = self.advice_params["mood_mild_change"]
+        if fg_change_7d > strong:
             mood_change = "情绪明显好转"
-        elif fg_change_7d > 5:
+        elif fg_change_7d > mild:
             mood_change = "情绪略有好转"
-        elif fg_change_7d < -10:
+        elif fg_change_7d < -strong:
             mood_change = "情绪明显恶化"
-        elif fg_change_7d < -5:
+        elif fg_change_7d < -mild:
             mood_change = "情绪略有恶化"
         else:
             mood_change = "情绪相对稳定"
@@ -284,6 +361,8 @@ class TrendAnalyzer:
             "trend_30d": trend_30d,
             "market_mood": market_mood,
             "mood_change": mood_change,
+            "class_days": self._get_regimes()["fear_greed"].state_at().get("days"),
+            "last_extreme_fear_exit": (self._get_regimes()["fear_greed"].last_exit("Extreme Fear") or {}).get("exited"),
             "latest_date": dates[0] if dates else None
         }
     
@@ -335,6 +414,7 @@ class TrendAnalyzer:
         # 根据价格趋势生成初步建议
         advice = {
             "status": "success",
+            "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             "price_based": self._get_price_based_advice(price_analysis),
             "formatted_output": ""
         }
@@ -349,18 +429,35 @@ class TrendAnalyzer:
         # 综合分析，给出最终建议
         advice["overall"] = self._get_overall_advice(advice)
         
+        # 历史相似行情（特征基于日线数据）
+        if self.timeframe == "1d":
+            analogs = self._get_analogs().query()
+            if analogs["status"] == "success":
+                advice["analogs"] = analogs
+        
         # 格式化输出
         advice["formatted_output"] = self._format_advice_output(price_analysis, sentiment_analysis, advice)
         
         return advice
     
+    @staticmethod
+    def refresh_generated_at(advice):
+        """将建议（如缓存命中的结果）的生成时间更新为当前时间，报告中的生成时间一并替换"""
+        generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        advice["generated_at"] = generated_at
+        if advice.get("formatted_output"):
+            advice["formatted_output"] = re.sub(r"^生成时间: .*$", f"生成时间: {generated_at}",
+                                                advice["formatted_output"], count=1, flags=re.MULTILINE)
+        return advice
+    
     def _get_price_based_advice(self, price_analysis):
         """基于价格分析生成建议"""
         current_price = price_analysis["current_price"]
+        params = self.advice_params
         
         # 基于价格趋势的建议
         if price_analysis["trend_30d"] == "上涨" and price_analysis["trend_7d"] == "上涨":
-            if price_analysis["price_change_7d"] > 10:
+            if price_analysis["price_change_7d"] > params["price_surge_7d"]:
                 return {
                     "action": "观望或小幅减仓",
                     "reason": "短期内价格快速上涨，可能面临回调风险",
@@ -373,7 +470,7 @@ class TrendAnalyzer:
                     "confidence": "中"
                 }
         elif price_analysis["trend_30d"] == "上涨" and price_analysis["trend_7d"] == "下跌":
-            if price_analysis["price_change_7d"] < -7:
+            if price_analysis["price_change_7d"] < params["price_dip_7d"]:
                 return {
                     "action": "逢低小幅买入",
                     "reason": "短期回调但中期趋势向上，可能是买入机会",
@@ -392,7 +489,7 @@ class TrendAnalyzer:
                 "confidence": "低"
             }
         else:  # 30天和7天都是下跌
-            if price_analysis["price_change_30d"] < -20:
+            if price_analysis["price_change_30d"] < params["price_crash_30d"]:
                 return {
                     "action": "谨慎小幅买入",
                     "reason": "价格大幅下跌后可能开始筑底",
@@ -482,7 +579,7 @@ class TrendAnalyzer:
         # 按照权重组合不同指标的建议
         actions = []
         reasons = []
-        confidence_levels = {"低": 1, "中": 2, "中高": 3, "高": 4}
+        confidence_levels = self.advice_params["confidence_weights"]
         
         if "price_based" in advice_dict:
             actions.append(advice_dict["price_based"]["action"])
@@ -532,11 +629,12 @@ class TrendAnalyzer:
             
             # 确定最终置信度
             max_weight = max(action_weights.values())
-            if max_weight >= 7:
+            high, mid_high, mid = self.advice_params["confidence_thresholds"]
+            if max_weight >= high:
                 final_confidence = "高"
-            elif max_weight >= 5:
+            elif max_weight >= mid_high:
                 final_confidence = "中高"
-            elif max_weight >= 3:
+            elif max_weight >= mid:
                 final_confidence = "中"
             else:
                 final_confidence = "低"
@@ -547,13 +645,19 @@ class TrendAnalyzer:
             "confidence": final_confidence
         }
     
+    def _window_label(self, bars):
+        """价格窗口的显示名称：日线为N日，其他周期为N根xK线"""
+        if self.timeframe == "1d":
+            return f"{bars}日"
+        return f"{bars}根{self.timeframe}K线"
+    
     def _format_advice_output(self, price_analysis, sentiment_analysis, advice):
         """格式化投资建议输出"""
         output = []
         
         # 添加标题
         output.append("=============== BTC 投资建议分析报告 ===============")
-        output.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        output.append(f"生成时间: {advice['generated_at']}\n")
         
         # 价格信息部分
         output.append("【💰 价格信息】")
@@ -561,21 +665,35 @@ class TrendAnalyzer:
             latest_date = price_analysis.get("latest_date", "未知")
             output.append(f"最新数据日期: {latest_date}")
             output.append(f"当前价格: ${price_analysis['current_price']:,.2f}")
-            output.append(f"7日均价: ${price_analysis['avg_7d']:,.2f}")
-            output.append(f"30日均价: ${price_analysis['avg_30d']:,.2f}")
-            output.append(f"90日均价: ${price_analysis['avg_90d']:,.2f}")
-            output.append(f"24小时变化: {price_analysis['price_change_1d']:.2f}%")
-            output.append(f"7日变化: {price_analysis['price_change_7d']:.2f}%")
-            output.append(f"30日变化: {price_analysis['price_change_30d']:.2f}%")
-            output.append(f"7日波动率: {price_analysis['volatility_7d']:.2f}%")
-            output.append(f"30日波动率: {price_analysis['volatility_30d']:.2f}%")
+            if self.timeframe != "1d":
+                output.append(f"K线周期: {self.timeframe}")
+            output.append(f"{self._window_label(7)}均价: ${price_analysis['avg_7d']:,.2f}")
+            output.append(f"{self._window_label(30)}均价: ${price_analysis['avg_30d']:,.2f}")
+            if price_analysis.get("avg_90d") is not None:
+                output.append(f"{self._window_label(90)}均价: ${price_analysis['avg_90d']:,.2f}")
+            change_label = "24小时" if self.timeframe == "1d" else self._window_label(1)
+            output.append(f"{change_label}变化: {price_analysis['price_change_1d']:.2f}%")
+            output.append(f"{self._window_label(7)}变化: {price_analysis['price_change_7d']:.2f}%")
+            output.append(f"{self._window_label(30)}变化: {price_analysis['price_change_30d']:.2f}%")
+            output.append(f"{self._window_label(7)}波动率: {price_analysis['volatility_7d']:.2f}%")
+            output.append(f"{self._window_label(30)}波动率: {price_analysis['volatility_30d']:.2f}%")
             
             if price_analysis.get("rsi_14d") is not None:
-                output.append(f"14日RSI: {price_analysis['rsi_14d']:.2f}")
+                output.append(f"{self._window_label(14)}RSI: {price_analysis['rsi_14d']:.2f}")
             
             output.append(f"支撑位: ${price_analysis['support_level']:,.2f}")
             output.append(f"阻力位: ${price_analysis['resistance_level']:,.2f}")
-            output.append(f"当前价格处于{self.analysis_period}日区间的 {price_analysis['price_percentile']:.2f}% 百分位")
+            
+            indicators = price_analysis.get("ohlcv_indicators")
+            if indicators:
+                output.append(f"{self._window_label(indicators['atr_period'])}ATR: ${indicators['atr']:,.2f} ({indicators['atr_pct']:.2f}%)")
+                if indicators.get("vwap") is not None:
+                    output.append(f"{self._window_label(indicators['vwap_window'])}VWAP: ${indicators['vwap']:,.2f}")
+                if indicators.get("volume_support") is not None:
+                    output.append(f"成交密集支撑位: ${indicators['volume_support']:,.2f}")
+                if indicators.get("volume_resistance") is not None:
+                    output.append(f"成交密集阻力位: ${indicators['volume_resistance']:,.2f}")
+            output.append(f"当前价格处于{self._window_label(self.analysis_period)}区间的 {price_analysis['price_percentile']:.2f}% 百分位")
         else:
             output.append(f"无法获取价格信息: {price_analysis.get('message', '未知错误')}")
         output.append("")
@@ -586,7 +704,10 @@ class TrendAnalyzer:
             if "mvrv" in sentiment_analysis and sentiment_analysis["mvrv"]["status"] == "success":
                 mvrv = sentiment_analysis["mvrv"]
                 output.append("MVRV比率:")
-                output.append(f"  当前值: {mvrv['current_value']:.3f} ({mvrv['market_state']})")
+                state_text = mvrv['market_state']
+                if mvrv.get("state_days"):
+                    state_text += f", 已持续{mvrv['state_days']}天"
+                output.append(f"  当前值: {mvrv['current_value']:.3f} ({state_text})")
                 output.append(f"  7日均值: {mvrv['avg_7d']:.3f}")
                 output.append(f"  30日均值: {mvrv['avg_30d']:.3f}")
                 output.append(f"  7日趋势: {mvrv['trend_7d']} ({mvrv['change_7d']:.2f}%)")
@@ -598,18 +719,29 @@ class TrendAnalyzer:
             if "fear_greed" in sentiment_analysis and sentiment_analysis["fear_greed"]["status"] == "success":
                 fg = sentiment_analysis["fear_greed"]
                 output.append("恐惧与贪婪指数:")
-                output.append(f"  当前值: {fg['current_value']} ({fg['current_class']})")
+                class_text = fg['current_class']
+                if fg.get("class_days"):
+                    class_text += f", 已持续{fg['class_days']}天"
+                output.append(f"  当前值: {fg['current_value']} ({class_text})")
                 output.append(f"  7日均值: {fg['avg_7d']:.2f}")
                 output.append(f"  30日均值: {fg['avg_30d']:.2f}")
                 output.append(f"  7日趋势: {fg['trend_7d']} ({fg['change_7d']:.2f})")
                 output.append(f"  30日趋势: {fg['trend_30d']} ({fg['change_30d']:.2f})")
                 output.append(f"  市场情绪: {fg['market_mood']}")
                 output.append(f"  情绪变化: {fg['mood_change']}")
+                if fg.get("last_extreme_fear_exit"):
+                    output.append(f"  上次退出极度恐惧: {fg['last_extreme_fear_exit']}")
                 output.append("")
         else:
             output.append(f"无法获取市场情绪指标: {sentiment_analysis.get('message', '未知错误')}")
             output.append("")
         
+        # 历史相似行情部分
+        if "analogs" in advice:
+            output.append("【🔍 历史相似行情】")
+            output.append(self._get_analogs().format_analogs())
+            output.append("")
+        
         # 投资建议部分
         output.append("【💡 投资建议】")
         